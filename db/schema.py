@@ -1,5 +1,15 @@
 # src/db/schema.py
 
+import sqlite3
+
+# uniqlo_sku_state in table order: the order scraped rows are built in
+# (INSERT_SKU_STATE_SQL) and the order detect_rows() receives them in
+SKU_STATE_COLUMNS = (
+    "observed_at", "catalog", "product_id", "source_variant_id", "product_name", "sku_path",
+    "color_code", "color_label", "size_code", "size_label",
+    "sale_price", "original_price", "discount_pct", "is_available",
+)
+
 def init_db(conn):
     """
     Initialize Uniqlo SQLite schema.
@@ -11,7 +21,7 @@ def init_db(conn):
     - uniqlo_sku_state is the single source of truth
     """
     conn.execute("DROP TABLE IF EXISTS uniqlo_events")
-    conn.execute("DROP TABLE IF EXISTS uniqlo_notifications")
+    _drop_legacy_notifications(conn)
     # --------------------------------------------------
     # 1. Sale catalog (variant discovery only)
     # --------------------------------------------------
@@ -26,10 +36,17 @@ def init_db(conn):
             variant_url TEXT NOT NULL,
         
             name TEXT,
+
+            list_price REAL,              -- sale price shown on the tile
+            list_discount_pct REAL,       -- (scheduling hints; SKU pages are the truth)
         
             PRIMARY KEY (catalog, variant_id)
         )
         """)
+    ensure_columns(conn, "uniqlo_sale_variants", {
+        "list_price": "REAL",
+        "list_discount_pct": "REAL",
+    })
 
     # --------------------------------------------------
     # 2. Canonical SKU truth table
@@ -75,21 +92,279 @@ def init_db(conn):
     """)
 
     # --------------------------------------------------
-    # 4. Notification delivery log
+    # 4. Notification delivery log (persists across runs)
+    #    One row per notified SKU and destination, holding the last send
+    #    time; the key doubles as the cooldown lookup index. chat_id is the
+    #    channel address (Telegram chat id, webhook URL or email).
     # --------------------------------------------------
     conn.execute("""
-        CREATE TABLE uniqlo_notifications (
+        CREATE TABLE IF NOT EXISTS uniqlo_notifications (
             notified_at     TEXT    NOT NULL,
             chat_id         TEXT    NOT NULL,
             event_type      TEXT    NOT NULL,
-        
+
             sku_path        TEXT    NOT NULL,
-            size_code       TEXT    NOT NULL
+            color_code      TEXT    NOT NULL,
+            size_code       TEXT    NOT NULL,
+
+            PRIMARY KEY (chat_id, event_type, sku_path, color_code, size_code)
+        )
+    """)
+
+    # --------------------------------------------------
+    # 5. Notification outbox (delivered by src/notifiers/outbox.py)
+    #    status: pending -> sending -> sent | failed
+    # --------------------------------------------------
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS uniqlo_outbox (
+            id                INTEGER PRIMARY KEY AUTOINCREMENT,
+            idempotency_key   TEXT    NOT NULL UNIQUE,
+            created_at        TEXT    NOT NULL,
+
+            channel           TEXT    NOT NULL,   -- telegram | webhook | email
+            address           TEXT    NOT NULL,   -- chat id | URL | email address
+            text              TEXT    NOT NULL,
+            subject           TEXT,
+            payload           TEXT,               -- JSON, for webhooks
+
+            status            TEXT    NOT NULL DEFAULT 'pending',
+            attempts          INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at   TEXT    NOT NULL,
+            locked_until      TEXT,
+            sent_at           TEXT,
+            last_error        TEXT,
+            held_groups       TEXT                -- JSON: a digest held until its hours
         )
     """)
+    ensure_columns(conn, "uniqlo_outbox", {
+        "subject": "TEXT",
+        "payload": "TEXT",
+        "held_groups": "TEXT",
+    })
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_outbox_due
+        ON uniqlo_outbox (status, next_attempt_at)
+    """)
+
+    init_subscriptions(conn)
+    init_runs(conn)
+    init_history(conn)
 
     conn.commit()
 
+def init_subscriptions(conn):
+    """
+    Subscribers, their delivery channels and their rules.
+
+    List columns (sizes, colors, product_ids) hold JSON arrays; NULL means
+    "any". uniqlo_subscriptions_version is bumped by triggers on every
+    change so notifiers can reload their compiled matcher cheaply.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS uniqlo_users (
+            user_id         TEXT    PRIMARY KEY,
+            active          INTEGER NOT NULL DEFAULT 1,
+            cooldown_hours  TEXT,               -- JSON: number or {event_type: hours}
+            digest          TEXT,               -- JSON: true or {"rank_by", "hours", "max_messages"}
+            created_at      TEXT    NOT NULL DEFAULT (datetime('now'))
+        )
+    """)
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS uniqlo_channels (
+            user_id     TEXT    NOT NULL REFERENCES uniqlo_users(user_id),
+            kind        TEXT    NOT NULL,       -- telegram | webhook | email
+            address     TEXT    NOT NULL,       -- chat id | URL | email address
+            active      INTEGER NOT NULL DEFAULT 1,
+
+            PRIMARY KEY (user_id, kind, address)
+        )
+    """)
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS uniqlo_rules (
+            rule_id       INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id       TEXT    NOT NULL REFERENCES uniqlo_users(user_id),
+            event_type    TEXT    NOT NULL,
+            catalog       TEXT    NOT NULL,
+
+            sizes         TEXT,
+            colors        TEXT,
+            max_price     REAL,
+            min_discount  REAL,
+            product_ids   TEXT,
+
+            active        INTEGER NOT NULL DEFAULT 1
+        )
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_rules_user
+        ON uniqlo_rules (user_id)
+    """)
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS uniqlo_subscriptions_version (
+            version INTEGER NOT NULL
+        )
+    """)
+    if not conn.execute("SELECT 1 FROM uniqlo_subscriptions_version").fetchone():
+        conn.execute("INSERT INTO uniqlo_subscriptions_version VALUES (0)")
+
+    for table in ("uniqlo_users", "uniqlo_channels", "uniqlo_rules"):
+        for op in ("INSERT", "UPDATE", "DELETE"):
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_{op.lower()}_version
+                AFTER {op} ON {table}
+                BEGIN
+                    UPDATE uniqlo_subscriptions_version SET version = version + 1;
+                END
+            """)
+
+def init_runs(conn):
+    """
+    Run ledger (src/runs.py): one row per orchestrator / shard run, kept
+    across runs for trend and regression checks.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS uniqlo_runs (
+            run_id                TEXT    PRIMARY KEY,
+            stage                 TEXT    NOT NULL,   -- all | catalog | sku | merge
+            shard                 TEXT,               -- i/N for sku runs
+            status                TEXT    NOT NULL,   -- ok | failed
+            started_at            TEXT    NOT NULL,
+            finished_at           TEXT    NOT NULL,
+            wall_seconds          REAL    NOT NULL,
+            stage_seconds         TEXT,               -- JSON: {stage: seconds}
+
+            variants_attempted    INTEGER NOT NULL DEFAULT 0,
+            variants_ok           INTEGER NOT NULL DEFAULT 0,
+            variants_failed       INTEGER NOT NULL DEFAULT 0,
+            rows_written          INTEGER NOT NULL DEFAULT 0,
+            events_emitted        INTEGER NOT NULL DEFAULT 0,
+            messages_sent         INTEGER NOT NULL DEFAULT 0,
+            messages_failed       INTEGER NOT NULL DEFAULT 0,
+            peak_memory_mb        REAL,               -- this process
+            child_peak_memory_mb  REAL,               -- largest exited child (browser)
+
+            -- derived
+            seconds_per_variant   REAL,               -- mean over successful variants
+            variant_p95_seconds   REAL,
+            variants_per_minute   REAL,               -- successful variants / wall time
+            failure_rate          REAL,
+            cache_hit_ratio       REAL,               -- static assets served from the browser cache
+            static_kb_per_variant REAL                -- static asset KB fetched per variant
+        )
+    """)
+    ensure_columns(conn, "uniqlo_runs", {
+        "cache_hit_ratio": "REAL",
+        "static_kb_per_variant": "REAL",
+    })
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_runs_stage
+        ON uniqlo_runs (stage, started_at)
+    """)
+
+def init_history(conn):
+    """
+    Price-history queries (src/history.py): a covering index so a product's
+    or SKU's series is read from the index alone, and results cached per run.
+    """
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_sku_state_history
+        ON uniqlo_sku_state (
+            product_id, color_code, size_code, observed_at,
+            sale_price, discount_pct, is_available
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS uniqlo_history_cache (
+            run_id      TEXT NOT NULL,   -- latest uniqlo_runs row when computed
+            query       TEXT NOT NULL,   -- JSON: the query's parameters
+            created_at  TEXT NOT NULL,
+            result      TEXT NOT NULL,   -- JSON: the series
+
+            PRIMARY KEY (run_id, query)
+        )
+    """)
+
+def init_shard(conn):
+    """
+    Bookkeeping kept in a shard database (see src/scrapers/shards.py):
+    which slice of the catalog it was given and whether it finished.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS uniqlo_shard (
+            shard_index   INTEGER NOT NULL,
+            shard_count   INTEGER NOT NULL,
+            max_variants  INTEGER,
+            started_at    TEXT    NOT NULL,
+            completed_at  TEXT,
+            partial       INTEGER NOT NULL DEFAULT 0  -- stopped at its time budget
+        )
+    """)
+    ensure_columns(conn, "uniqlo_shard", {
+        "partial": "INTEGER NOT NULL DEFAULT 0",
+    })
+
+    # variants this shard was assigned, whether or not they produced rows
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS uniqlo_shard_variants (
+            catalog     TEXT NOT NULL,
+            variant_id  TEXT NOT NULL,
+
+            PRIMARY KEY (catalog, variant_id)
+        )
+    """)
+
+def ensure_columns(conn, table, columns):
+    """
+    Add columns introduced after a table was first created.
+    CREATE TABLE IF NOT EXISTS leaves existing tables untouched.
+    """
+    existing = {c[1] for c in conn.execute(f"PRAGMA table_info({table})")}
+    for name, decl in columns.items():
+        if name not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+
+def import_rows(conn, path, table, where="1", params=(), exclude=()):
+    """
+    Copy `table` rows matching `where` from the database at `path` (opened
+    read-only) into the same table in conn; rows already there are kept.
+    Columns the other table predates get their defaults. Returns the
+    number of rows added.
+    """
+    src = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        present = {c[1] for c in src.execute(f"PRAGMA table_info({table})")}
+        columns = [
+            c[1] for c in conn.execute(f"PRAGMA table_info({table})")
+            if c[1] in present and c[1] not in exclude
+        ]
+        rows = src.execute(
+            f"SELECT {', '.join(columns)} FROM {table} WHERE {where} ORDER BY rowid", params,
+        ).fetchall() if columns else []
+    finally:
+        src.close()
+    if not rows:
+        return 0
+
+    before = conn.total_changes
+    conn.executemany(f"""
+        INSERT OR IGNORE INTO {table} ({', '.join(columns)})
+        VALUES ({', '.join('?' * len(columns))})
+    """, rows)
+    conn.commit()
+    return conn.total_changes - before
+
+def _drop_legacy_notifications(conn):
+    """
+    The log used to be recreated on every run with size_code='MULTI' and no
+    color_code or key, so nothing in it can drive a cooldown. Drop it once.
+    """
+    cols = [c[1] for c in conn.execute("PRAGMA table_info(uniqlo_notifications)")]
+    if cols and "color_code" not in cols:
+        conn.execute("DROP TABLE uniqlo_notifications")
+
 def assert_schema(conn):
     cols = [c[1] for c in conn.execute("PRAGMA table_info(uniqlo_sku_state)")]
     expected = {
@@ -0,0 +1,330 @@
+"""
+Replay uniqlo_sku_state history through detectors and user rules.
+
+    python -m src.backtest --min-discount 50 60 70 --max-price 10 15 20 --workers 4
+
+Each (min_discount, max_price) combination is one variant of the
+RARE_DEEP_DISCOUNT detector; variants run in a process pool. Events are
+matched against the subscriptions stored in the database (sizes, colors,
+max price, min discount and product watchlists), the same rules
+notify_events applies.
+"""
+import argparse
+import itertools
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from src.events.rare_deep_discount import (
+    DeepDiscountDetector,
+    MAX_SALE_PRICE,
+    MIN_DISCOUNT_PCT,
+)
+from src.notifiers.matcher import compile_rules
+from src.notifiers.rules import DEFAULT_COOLDOWN_HOURS, EVENT_COOLDOWN_HOURS, USER_NOTIFICATION_RULES
+from src.notifiers.subscriptions import load_index
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+DB_PATH = BASE_DIR / "db" / "uniqlo.sqlite"
+
+HISTORY_COLUMNS = [
+    "observed_at",
+    "catalog",
+    "product_id",
+    "sku_path",
+    "color_code",
+    "color_label",
+    "size_label",
+    "sale_price",
+    "discount_pct",
+    "is_available",
+]
+
+# --------------------------------------------------
+# History
+# --------------------------------------------------
+
+def load_history(db_path, min_discount_pct=0, max_sale_price=None, since=None, until=None):
+    """
+    Load SKU history in time order.
+
+    Rows that no variant in a sweep could ever match (unavailable, or
+    outside the loosest thresholds) are dropped in SQL so only candidate
+    rows are materialised.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        df = pd.read_sql(
+            f"""
+            SELECT {", ".join(HISTORY_COLUMNS)}
+            FROM uniqlo_sku_state
+            WHERE is_available = 1
+              AND discount_pct >= ?
+              AND (? IS NULL OR sale_price < ?)
+              AND (? IS NULL OR observed_at >= ?)
+              AND (? IS NULL OR observed_at < ?)
+            ORDER BY observed_at
+            """,
+            conn,
+            params=(
+                min_discount_pct,
+                max_sale_price, max_sale_price,
+                since, since,
+                until, until,
+            ),
+        )
+    finally:
+        conn.close()
+
+    df["day"] = df["observed_at"].str.slice(0, 10)
+    return df
+
+
+# --------------------------------------------------
+# Rules
+# --------------------------------------------------
+
+RULE_COLUMNS = [
+    "user", "event_type", "catalog", "size_label", "color_label",
+    "max_price", "min_discount", "product_ids",
+]
+
+
+def rules_frame(index):
+    """
+    Flatten a RuleIndex to one row per
+    (user, event_type, catalog, size_label, color_label, conditions).
+
+    A missing size or color list is a wildcard and is stored as None, as
+    are unset max_price / min_discount / product_ids conditions.
+    """
+    rules = pd.DataFrame(
+        [
+            (user, event_type, catalog, size, color, *(signature or (None, None, None)))
+            for user, event_type, catalog, size, color, signature in index.rules()
+        ],
+        columns=RULE_COLUMNS,
+    )
+    rules["max_price"] = pd.to_numeric(rules["max_price"])
+    rules["min_discount"] = pd.to_numeric(rules["min_discount"])
+    return rules
+
+
+def load_rules(db_path):
+    """
+    rules_frame of the active subscriptions in db_path; rules.py's
+    USER_NOTIFICATION_RULES when it has none (not yet seeded by a run).
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        index = load_index(conn)
+    except sqlite3.OperationalError:
+        index = None
+    finally:
+        conn.close()
+
+    if not index:
+        index = compile_rules(USER_NOTIFICATION_RULES, DEFAULT_COOLDOWN_HOURS, EVENT_COOLDOWN_HOURS)
+    return rules_frame(index)
+
+
+def _conditions_pass(matched):
+    """The rule conditions the merge keys cannot express (matcher._passes)."""
+    price_ok = matched["max_price"].isna() | (matched["sale_price"] <= matched["max_price"])
+    discount_ok = matched["min_discount"].isna() | (matched["discount_pct"] >= matched["min_discount"])
+    watched = pd.Series(
+        [ids is None or product_id in ids for ids, product_id in zip(matched["product_ids"], matched["product_id"])],
+        index=matched.index, dtype=bool,
+    )
+    return matched[price_ok & discount_ok & watched]
+
+
+def match_rules(events, rules):
+    """
+    Join events to rules. Each wildcard combination is its own exact merge,
+    so the cost is linear in events + matches; price, discount and
+    watchlist conditions are then applied to the matches.
+    """
+    matched = []
+    for size_wild, color_wild in itertools.product((False, True), repeat=2):
+        part = rules[
+            (rules["size_label"].isna() == size_wild)
+            & (rules["color_label"].isna() == color_wild)
+        ]
+        if part.empty:
+            continue
+
+        keys = ["event_type", "catalog"]
+        if not size_wild:
+            keys.append("size_label")
+        if not color_wild:
+            keys.append("color_label")
+
+        conditions = ["max_price", "min_discount", "product_ids"]
+        matched.append(_conditions_pass(events.merge(part[["user"] + keys + conditions], on=keys)))
+
+    if not matched:
+        return events.iloc[0:0].assign(user=pd.Series(dtype=str))
+
+    # a user can match the same event through two rule rows
+    return pd.concat(matched, ignore_index=True).drop_duplicates(
+        ["user", "observed_at", "sku_path", "color_code", "size_label", "event_type"]
+    )
+
+
+# --------------------------------------------------
+# Replay
+# --------------------------------------------------
+
+def replay(history, detectors, rules):
+    """
+    Evaluate detectors over the whole history at once and join the result
+    to the rules. Returns (events, per user per day counts).
+
+    Notifications are counted as one message per (snapshot, user,
+    product, color) group, the way notify() groups them, but without its
+    cooldown or digest holding: an upper bound on what would be sent.
+    """
+    events = pd.concat(
+        [d.detect_frame(history).assign(event_type=d.event_type) for d in detectors],
+        ignore_index=True,
+    )
+
+    matched = match_rules(events, rules)
+
+    per_user = pd.concat(
+        [
+            matched.groupby(["user", "day"]).size().rename("events"),
+            matched.drop_duplicates(["user", "observed_at", "product_id", "color_code"])
+            .groupby(["user", "day"])
+            .size()
+            .rename("notifications"),
+        ],
+        axis=1,
+    ).reset_index()
+
+    return events, per_user
+
+
+def run_variant(db_path, min_discount_pct, max_sale_price, since=None, until=None, rules=None):
+    history = _history(db_path, since, until)
+    if rules is None:
+        rules = load_rules(db_path)
+    detectors = [DeepDiscountDetector(
+        price_threshold=max_sale_price,
+        min_discount_pct=min_discount_pct,
+    )]
+    events, per_user = replay(history, detectors, rules)
+
+    return {
+        "min_discount_pct": min_discount_pct,
+        "max_sale_price": max_sale_price,
+        "snapshots": history["observed_at"].nunique(),
+        "events": len(events),
+        "notifications": int(per_user["notifications"].sum()),
+        "per_user": per_user,
+    }
+
+
+# Each pool worker loads the (pre-filtered) history once and reuses it
+# for every variant it is handed. The sweep's bounds are part of the key:
+# a later sweep in the same process with looser bounds must not get a
+# frame filtered for an earlier one.
+_HISTORY = {}
+_SWEEP_BOUNDS = {"min_discount_pct": 0, "max_sale_price": None}
+
+
+def _init_worker(min_discount_pct, max_sale_price):
+    _SWEEP_BOUNDS["min_discount_pct"] = min_discount_pct
+    _SWEEP_BOUNDS["max_sale_price"] = max_sale_price
+
+
+def _history(db_path, since, until):
+    key = (str(db_path), since, until, _SWEEP_BOUNDS["min_discount_pct"], _SWEEP_BOUNDS["max_sale_price"])
+    if key not in _HISTORY:
+        _HISTORY[key] = load_history(
+            db_path,
+            min_discount_pct=_SWEEP_BOUNDS["min_discount_pct"],
+            max_sale_price=_SWEEP_BOUNDS["max_sale_price"],
+            since=since,
+            until=until,
+        )
+    return _HISTORY[key]
+
+
+def sweep(db_path, min_discounts, max_prices, since=None, until=None, workers=None):
+    grid = list(itertools.product(min_discounts, max_prices))
+    bounds = (min(min_discounts), max(max_prices))
+    rules = load_rules(db_path)
+
+    if workers == 1:
+        _init_worker(*bounds)
+        return [run_variant(db_path, d, p, since, until, rules) for d, p in grid]
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=bounds,
+    ) as pool:
+        futures = [
+            pool.submit(run_variant, db_path, d, p, since, until, rules)
+            for d, p in grid
+        ]
+        return [f.result() for f in futures]
+
+
+# --------------------------------------------------
+# CLI
+# --------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest detector thresholds and user rules")
+    parser.add_argument("--db", default=str(DB_PATH))
+    parser.add_argument("--since", help="ISO timestamp, inclusive")
+    parser.add_argument("--until", help="ISO timestamp, exclusive")
+    parser.add_argument("--min-discount", type=float, nargs="+", default=[MIN_DISCOUNT_PCT])
+    parser.add_argument("--max-price", type=float, nargs="+", default=[MAX_SALE_PRICE])
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--per-user", action="store_true", help="print per user per day breakdown")
+    parser.add_argument("--out", help="write per user per day results to this CSV")
+    args = parser.parse_args()
+
+    results = sweep(
+        args.db,
+        args.min_discount,
+        args.max_price,
+        since=args.since,
+        until=args.until,
+        workers=args.workers,
+    )
+
+    summary = pd.DataFrame([
+        {k: v for k, v in r.items() if k != "per_user"}
+        for r in results
+    ])
+    print(summary.to_string(index=False))
+
+    detail = pd.concat(
+        [
+            r["per_user"].assign(
+                min_discount_pct=r["min_discount_pct"],
+                max_sale_price=r["max_sale_price"],
+            )
+            for r in results
+        ],
+        ignore_index=True,
+    )
+
+    if args.per_user:
+        print()
+        print(detail.to_string(index=False))
+
+    if args.out:
+        detail.to_csv(args.out, index=False)
+        print(f"Wrote {len(detail)} rows to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""
+Database benchmark on generated SKU history.
+
+    python -m src.benchmarks.bench_db --rows 100000 1000000 10000000
+    python -m src.benchmarks.bench_db --baseline src/benchmarks/baselines/db.json
+
+For each size, src/benchmarks/gen_data.py fills a scratch database and
+the queries a run makes against history are timed there:
+
+    deep_discount_s    DeepDiscountDetector.detect over uniqlo_sku_state
+    item_count_s       ItemCountIncrease.detect, both catalogs
+    scheduler_s        VariantScheduler.from_db (history since HISTORY_DAYS)
+    notify_s           notify_events for the latest run's events, --users
+                       webhook subscribers
+    history_s          price_history of one product, daily buckets per SKU,
+                       uncached (src/history.py)
+    merge_s            merge_shards of the next run, split in SHARDS
+    db_mb              database file size
+
+With --baseline, timings and sizes worse than --ratio (and MIN_CHANGE_S)
+fail the run; --write-baseline saves this run as the baseline.
+
+Baselines are wall-clock times on one machine. The baseline records where
+it was made (host, CPUs, Python and SQLite versions) and a calibration
+time: a fixed in-memory query timed the same way. Baseline timings are
+scaled by this machine's calibration over the baseline's before they
+are compared, and a different environment is reported as a warning.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from db.schema import init_db, init_shard
+from src.benchmarks.bench_matcher import generate_subscribers
+from src.benchmarks.gen_data import CATALOGS, INTERVAL_HOURS, generate, run_rows
+from src.events.item_count import ItemCountIncrease
+from src.events.rare_deep_discount import DeepDiscountDetector
+from src.history import price_history
+from src.notifiers.notify_events import notify_events
+from src.notifiers.subscriptions import load_index
+from src.scrapers.scheduler import VariantScheduler
+from src.scrapers.scrape_sku_state import INSERT_SKU_STATE_SQL
+from src.scrapers.shards import finish_shard, merge_shards, shard_of, start_shard
+
+SIZES = (100_000, 1_000_000)
+SHARDS = 4
+USERS = 1000
+RATIO = 1.5
+MIN_CHANGE_S = 0.05
+
+# baseline key holding environment() of the machine that wrote it
+ENV_KEY = "_env"
+CALIBRATION_ROWS = 300_000
+
+
+def _quiet(m):
+    pass
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    value = fn()
+    return value, round(time.perf_counter() - start, 4)
+
+
+def calibrate(repeat=3):
+    """Best-of-`repeat` time of a fixed CPU-bound query, in a throwaway database."""
+    conn = sqlite3.connect(":memory:")
+    best = None
+    for _ in range(repeat):
+        _, seconds = _timed(lambda: conn.execute("""
+            WITH RECURSIVE n(i) AS (
+                SELECT 1
+                UNION ALL
+                SELECT i + 1 FROM n WHERE i < ?
+            )
+            SELECT i % 997, COUNT(*), SUM(i)
+            FROM n
+            GROUP BY 1
+        """, (CALIBRATION_ROWS,)).fetchall())
+        best = seconds if best is None else min(best, seconds)
+    conn.close()
+    return best
+
+
+def environment():
+    return {
+        "host": platform.node(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "calibration_s": calibrate(),
+    }
+
+
+def env_differences(env, baseline_env):
+    """Environment fields (other than the calibration) that differ from the baseline's."""
+    return [
+        f"{key} {env.get(key)} vs {baseline_env.get(key)}"
+        for key in env if key != "calibration_s" and env.get(key) != baseline_env.get(key)
+    ]
+
+
+def baseline_scale(env, baseline_env, log=print):
+    """
+    What baseline timings are multiplied by on this machine: its
+    calibration over the baseline's (1.0 for a baseline without an
+    environment record). Environment differences are logged.
+    """
+    if not baseline_env:
+        log("[BENCH][WARN] the baseline does not record its environment: comparing raw timings")
+        return 1.0
+    for d in env_differences(env, baseline_env):
+        log(f"[BENCH][WARN] baseline made elsewhere: {d}")
+    scale = env["calibration_s"] / baseline_env["calibration_s"]
+    log(f"baseline timings scaled by {scale:.2f} (calibration {env['calibration_s']}s "
+        f"vs {baseline_env['calibration_s']}s)")
+    return scale
+
+
+def _write_shards(directory, catalog, observed_at):
+    """SHARDS shard databases holding one more run of `catalog`."""
+    paths = []
+    for index in range(SHARDS):
+        mine = [(v, colors) for v, colors in catalog if shard_of(v["variant_id"], SHARDS) == index]
+        path = Path(directory) / f"shard-{index}.sqlite"
+        conn = sqlite3.connect(path)
+        init_db(conn)
+        init_shard(conn)
+        start_shard(conn, (index, SHARDS), [(v["catalog"], None, v["variant_id"]) for v, _ in mine])
+        conn.executemany(INSERT_SKU_STATE_SQL, run_rows(mine, observed_at))
+        finish_shard(conn)
+        conn.close()
+        paths.append(path)
+    return paths
+
+
+def run(rows, users=USERS, seed=0, log=print):
+    result = {"rows": rows}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.sqlite"
+        conn = sqlite3.connect(path)
+        catalog, result["generate_s"] = _timed(lambda: generate(conn, rows, seed, log=log))
+        generate_subscribers(conn, users, random.Random(seed), channel="webhook")
+        result["db_mb"] = round(os.path.getsize(path) / 1024 / 1024, 1)
+        result["variants"] = len(catalog)
+
+        events, result["deep_discount_s"] = _timed(lambda: DeepDiscountDetector().detect(conn))
+        result["deep_discount_events"] = len(events)
+
+        detector = ItemCountIncrease(window_minutes=INTERVAL_HOURS * 60)
+        _, result["item_count_s"] = _timed(lambda: [detector.detect(conn, c) for c in CATALOGS])
+
+        _, result["scheduler_s"] = _timed(lambda: VariantScheduler.from_db(conn))
+
+        (latest,) = conn.execute("SELECT MAX(observed_at) FROM uniqlo_sku_state").fetchone()
+        latest_rows = conn.execute("SELECT * FROM uniqlo_sku_state WHERE observed_at = ?", (latest,)).fetchall()
+        latest_events = DeepDiscountDetector().detect_rows(latest_rows)
+        index = load_index(conn)
+        _, result["notify_s"] = _timed(lambda: notify_events(conn, latest_events, _quiet, index=index))
+        result["notify_events"] = len(latest_events)
+
+        product_id = catalog[0][0]["product_id"]
+        history, result["history_s"] = _timed(lambda: price_history(conn, product_id, cache=False))
+        result["history_points"] = sum(len(s["points"]) for s in history["series"])
+
+        shards = _write_shards(tmp, catalog, datetime.utcnow().isoformat())
+        merged, result["merge_s"] = _timed(lambda: merge_shards(conn, shards, log=_quiet))
+        result["merge_rows"] = len(merged)
+
+        conn.close()
+    return result
+
+
+def compare(result, baseline, ratio=RATIO, scale=1.0):
+    """
+    Timings and sizes in `result` worse than `baseline` by more than ratio;
+    baseline timings are multiplied by `scale` (this machine's calibration
+    over the baseline's) first.
+    """
+    failures = []
+    for key, value in result.items():
+        base = baseline.get(key)
+        if not key.endswith(("_s", "_mb")) or key == "generate_s" or base is None:
+            continue
+        if key.endswith("_s"):
+            base = round(base * scale, 4)
+        if value > base * ratio and value - base >= MIN_CHANGE_S:
+            failures.append(f"{result['rows']} rows: {key} {value} vs {base} in the baseline")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark history queries on generated data")
+    parser.add_argument("--rows", type=int, nargs="+", default=list(SIZES))
+    parser.add_argument("--users", type=int, default=USERS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", help="JSON results to compare with")
+    parser.add_argument("--write-baseline", action="store_true", help="save these results as --baseline")
+    parser.add_argument("--ratio", type=float, default=RATIO)
+    args = parser.parse_args()
+
+    env = environment()
+    print(f"environment: {env}")
+    results = {}
+    for rows in args.rows:
+        result = run(rows, args.users, args.seed)
+        results[str(rows)] = result
+        for k, v in result.items():
+            print(f"{k:>22}: {v}")
+        print()
+
+    if not args.baseline:
+        return
+    baseline_path = Path(args.baseline)
+    if args.write_baseline:
+        baseline = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+        if env_differences(env, baseline.get(ENV_KEY, {})):
+            baseline = {}       # another machine's timings would be scaled by this one's calibration
+        baseline.update(results)
+        baseline[ENV_KEY] = env
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps(baseline, indent=2) + "\n")
+        print(f"baseline written to {baseline_path}")
+        return
+    if not baseline_path.exists():
+        print(f"no baseline at {baseline_path} yet: save one with --write-baseline")
+        return
+
+    baseline = json.loads(baseline_path.read_text())
+    scale = baseline_scale(env, baseline.get(ENV_KEY))
+
+    failures = [
+        f for rows, result in results.items() if rows in baseline
+        for f in compare(result, baseline[rows], args.ratio, scale)
+    ]
+    for f in failures:
+        print(f"FAIL: {f}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
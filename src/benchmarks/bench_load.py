@@ -0,0 +1,107 @@
+"""
+End-to-end load test against the mock site.
+
+    python -m src.benchmarks.bench_load --variants 10000 --latency-ms 150 --error-rate 0.01
+
+Starts src/benchmarks/mock_site.py, then runs `python -m src.orchestrator`
+(catalog, SKU workers, detection, notification) against it in a scratch
+database, with Telegram pointed at the mock too, so nothing reaches the
+real site or real chats. Prints throughput from the run ledger and the
+mock's request counts; the orchestrator's run report is written to
+--reports.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from src.benchmarks.mock_site import MockSite
+from src.metrics import METRICS_DIR
+from src.runs import load_runs
+
+
+def run(site, workers=2, reports=METRICS_DIR, extra_env=None, log=print):
+    server = site.serve()
+    log(f"[LOAD] mock site with {site.variants} variants on {server.url}")
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            db = Path(tmp) / "load.sqlite"
+            env = {
+                **os.environ,
+                "UNIQLO_BASE_URL": server.url,
+                "TELEGRAM_API_BASE": server.url,
+                "TELEGRAM_BOT_TOKEN": "mock",
+                "SMTP_HOST": "",
+                "APP_ENV": "prod",          # no MAX_VARIANTS_DEV cap
+                "SKU_WORKERS": str(workers),
+                "BROWSER_PROFILE_DIR": "",
+                "METRICS_DIR": str(reports),
+                **(extra_env or {}),
+            }
+
+            start = time.perf_counter()
+            proc = subprocess.run(
+                [sys.executable, "-m", "src.orchestrator", "--stage", "all", "--db", str(db)],
+                env=env,
+            )
+            wall = time.perf_counter() - start
+
+            conn = sqlite3.connect(db)
+            [ledger] = load_runs(conn, "all", limit=1) or [{}]
+            sku_rows = conn.execute("SELECT COUNT(*) FROM uniqlo_sku_state").fetchone()[0]
+            conn.close()
+    finally:
+        server.shutdown()
+
+    return {
+        "exit_code": proc.returncode,
+        "status": ledger.get("status"),
+        "variants": site.variants,
+        "variants_ok": ledger.get("variants_ok"),
+        "variants_failed": ledger.get("variants_failed"),
+        "sku_rows": sku_rows,
+        "events": ledger.get("events_emitted"),
+        "messages": site.messages,
+        "wall_s": round(wall, 1),
+        "variants_per_min": ledger.get("variants_per_minute") and round(ledger["variants_per_minute"], 1),
+        "variant_p95_s": ledger.get("variant_p95_seconds") and round(ledger["variant_p95_seconds"], 2),
+        "peak_memory_mb": ledger.get("peak_memory_mb") and round(ledger["peak_memory_mb"]),
+        "browser_memory_mb": ledger.get("child_peak_memory_mb") and round(ledger["child_peak_memory_mb"]),
+        "requests": json.dumps(site.requests, sort_keys=True),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the orchestrator against the mock site")
+    parser.add_argument("--variants", type=int, default=10_000)
+    parser.add_argument("--colors", type=int, default=3)
+    parser.add_argument("--sizes", type=int, default=5)
+    parser.add_argument("--page-size", type=int, default=240)
+    parser.add_argument("--latency-ms", type=float, default=100.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--block-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=2, help="SKU_WORKERS")
+    parser.add_argument("--reports", default=str(METRICS_DIR))
+    args = parser.parse_args()
+
+    site = MockSite(
+        variants=args.variants, colors=args.colors, sizes=args.sizes, page_size=args.page_size,
+        latency_ms=args.latency_ms, error_rate=args.error_rate, block_rate=args.block_rate, seed=args.seed,
+    )
+    result = run(site, args.workers, args.reports)
+    for k, v in result.items():
+        print(f"{k:>18}: {v}")
+
+    if result["exit_code"]:
+        sys.exit(result["exit_code"])
+
+
+if __name__ == "__main__":
+    main()
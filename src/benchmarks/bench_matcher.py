@@ -0,0 +1,162 @@
+"""
+Subscription matcher benchmark.
+
+    python -m src.benchmarks.bench_matcher --users 10000 --events 100000 --notify-events 500
+
+Generates random subscribers in the subscription tables (in memory) and
+a batch of synthetic events, then times
+
+    compile_s   load_index(): rules compiled into the RuleIndex
+    match_s     RuleIndex.match_sets() over every event: the index lookup
+                only, none of the work done per matched user
+    notify_s    notify_events() end to end over the first --notify-events
+                events: lookup, per-user grouping, channel fan-out, the
+                cooldown anti-join, rendering and queueing in the outbox
+
+Subscribers use webhook channels, so nothing needs a Telegram token and
+nothing is sent. Exits non-zero if compile_s + match_s exceeds
+--max-seconds or notify_s exceeds --max-notify-seconds.
+"""
+import argparse
+import json
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+from db.schema import init_db
+from src.notifiers.notify_events import notify_events
+from src.notifiers.subscriptions import add_rule, add_user, load_index
+
+EVENT_TYPE = "RARE_DEEP_DISCOUNT"
+CATALOGS = ["men", "women"]
+SIZES = ["XXS", "XS", "S", "M", "L", "XL", "XXL", "3XL", "28inch", "30inch", "32inch", "33inch", "34inch"]
+COLORS = ["BLACK", "WHITE", "NAVY", "GRAY", "BEIGE", "BROWN", "OLIVE", "RED", "BLUE", "PINK"]
+
+
+def generate_subscribers(conn, n_users, rng, channel="telegram"):
+    for i in range(n_users):
+        user = f"user{i}"
+        address = str(100000 + i) if channel == "telegram" else f"https://hooks.invalid/{i}"
+        add_user(conn, user, [(channel, address)])
+
+        for catalog in rng.sample(CATALOGS, rng.choice([1, 2])):
+            rule = {"sizes": rng.sample(SIZES, rng.randint(1, 3))}
+            if rng.random() < 0.2:
+                rule["colors"] = rng.sample(COLORS, rng.randint(1, 3))
+            if rng.random() < 0.3:
+                rule["max_price"] = rng.choice([10, 15, 20, 25])
+            if rng.random() < 0.3:
+                rule["min_discount"] = rng.choice([40, 50, 60, 70])
+            if rng.random() < 0.05:
+                rule["product_ids"] = [str(rng.randint(400000, 400999)) for _ in range(5)]
+            add_rule(conn, user, EVENT_TYPE, catalog, **rule)
+
+    conn.commit()
+
+
+def generate_events(n_events, rng):
+    return [
+        (
+            EVENT_TYPE,
+            rng.choice(CATALOGS),
+            rng.choice(SIZES),
+            rng.choice(COLORS),
+            str(rng.randint(400000, 400999)),
+            round(rng.uniform(3, 30), 2),
+            rng.choice([40, 50, 60, 70, 80]),
+        )
+        for _ in range(n_events)
+    ]
+
+
+def event_rows(events):
+    """generate_events() output as uniqlo_events rows, for notify_events."""
+    now = datetime.utcnow().isoformat()
+    return [
+        (
+            now, catalog, event_type, product_id, f"/uk/en/products/E{product_id}-000/00",
+            f"E{product_id}-000", f"{COLORS.index(color):02d}", color, size, size,
+            json.dumps({
+                "product_name": f"Item {product_id}",
+                "sale_price": sale_price,
+                "original_price": 39.9,
+                "discount_pct": discount_pct,
+            }),
+        )
+        for event_type, catalog, size, color, product_id, sale_price, discount_pct in events
+    ]
+
+
+def _quiet(m):
+    pass
+
+
+def run(n_users, n_events, notify_n=500, seed=0):
+    rng = random.Random(seed)
+
+    conn = sqlite3.connect(":memory:")
+    init_db(conn)
+    generate_subscribers(conn, n_users, rng, channel="webhook")
+    events = generate_events(n_events, rng)
+
+    start = time.perf_counter()
+    index = load_index(conn)
+    compile_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    matches = 0
+    for event in events:
+        for users in index.match_sets(*event):
+            matches += len(users)
+    match_s = time.perf_counter() - start
+
+    rows = event_rows(events[:notify_n])
+    start = time.perf_counter()
+    notify_events(conn, rows, _quiet, index=index)
+    notify_s = time.perf_counter() - start
+    queued = conn.execute("SELECT COUNT(*) FROM uniqlo_outbox").fetchone()[0]
+    conn.close()
+
+    return {
+        "users": n_users,
+        "events": n_events,
+        "matches": matches,
+        "compile_s": round(compile_s, 3),
+        "match_s": round(match_s, 3),
+        "lookups_per_s": round(n_events / match_s) if match_s else None,
+        "notify_events": len(rows),
+        "notify_s": round(notify_s, 3),
+        "messages_queued": queued,
+        "notify_events_per_s": round(len(rows) / notify_s) if notify_s else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the subscription matcher")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--notify-events", type=int, default=500, help="events run through notify_events")
+    parser.add_argument("--max-seconds", type=float, default=5.0, help="compile + lookup")
+    parser.add_argument("--max-notify-seconds", type=float, default=60.0)
+    args = parser.parse_args()
+
+    result = run(args.users, args.events, args.notify_events, args.seed)
+    for k, v in result.items():
+        print(f"{k:>20}: {v}")
+
+    failed = False
+    if result["compile_s"] + result["match_s"] > args.max_seconds:
+        print(f"FAIL: compile + lookup slower than {args.max_seconds}s")
+        failed = True
+    if result["notify_s"] > args.max_notify_seconds:
+        print(f"FAIL: notify_events slower than {args.max_notify_seconds}s")
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
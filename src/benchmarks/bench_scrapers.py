@@ -0,0 +1,208 @@
+"""
+Scraper benchmark against recorded pages.
+
+    python -m src.benchmarks.bench_scrapers --record --max-variants 40   # once, against the live site
+    python -m src.benchmarks.bench_scrapers                               # offline
+    python -m src.benchmarks.bench_scrapers --baseline src/benchmarks/baselines/scrapers.json
+
+    python -m src.benchmarks.bench_scrapers --write-mock-fixture                   # after changing the mock
+    python -m src.benchmarks.bench_scrapers --fixtures src/benchmarks/fixtures/mock \
+        --baseline src/benchmarks/baselines/scrapers-mock.json
+
+--record runs scrape_catalog and scrape_sku_state on the live site and
+saves every page they load as HARs under --fixtures (see
+src/scrapers/browser.py). Without it, the same two scrapers run in a
+scratch database with the network cut off, served from those HARs, and
+the run reports variants/s, rows produced and per-phase latency.
+
+With --baseline, the result is compared with a previous one: rows or
+variants that differ (the scrapers read the same pages differently) and
+timings worse than --ratio fail the run. --write-baseline saves the
+result as the new baseline.
+
+src/benchmarks/fixtures/mock holds a small committed fixture: the pages
+of a seeded MockSite (src/benchmarks/mock_site.py) written as a HAR at
+the real site's URLs, so the benchmark runs without recording anything.
+Its committed baseline (baselines/scrapers-mock.json) holds the counts,
+which any machine must reproduce exactly. Timings are only comparable on
+similar machines: a baseline written with --write-baseline or
+--save-baseline records the environment and calibration time of
+bench_db.py, and its timings are scaled by this machine's calibration
+before they are compared. CI saves one on every push to main and
+compares pull requests with it.
+"""
+import argparse
+import json
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from db.schema import init_db
+from src import metrics
+from src.benchmarks.bench_db import ENV_KEY, baseline_scale, environment
+from src.benchmarks.mock_site import MockSite
+from src.runs import counter_total, timers_named
+from src.scrapers.browser import SITE_URL, BrowserSession
+from src.scrapers.catalog_scraper import scrape_catalog
+from src.scrapers.scrape_sku_state import scrape_sku_state
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures" / "scrapers"
+MOCK_FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures" / "mock"
+# small enough to commit; two catalog scrolls per catalog, every variant scraped
+MOCK_SITE = dict(variants=12, colors=2, sizes=3, page_size=4, seed=0)
+MAX_VARIANTS = 40
+RATIO = 1.5
+MIN_CHANGE_S = 0.25     # timings closer than this to the baseline are noise
+
+# result key -> direction; +1 means higher is worse, 0 must match exactly
+COMPARED = {
+    "catalog_variants": 0,
+    "sku_variants": 0,
+    "sku_failed": 0,
+    "sku_rows": 0,
+    "catalog_seconds": +1,
+    "sku_seconds": +1,
+    "sku_variants_per_s": -1,
+}
+
+
+def run(fixtures=FIXTURES_DIR, max_variants=MAX_VARIANTS, record=False, log=print):
+    metrics.METRICS.reset()
+    session = BrowserSession(har_dir=fixtures, har_mode="record" if record else "replay", log=log)
+
+    with tempfile.TemporaryDirectory() as tmp, session:
+        conn = sqlite3.connect(Path(tmp) / "bench.sqlite")
+        init_db(conn)
+
+        start = time.perf_counter()
+        scrape_catalog(conn, log, session=session)
+        catalog_s = time.perf_counter() - start
+        catalog_variants = conn.execute("SELECT COUNT(*) FROM uniqlo_sale_variants").fetchone()[0]
+
+        start = time.perf_counter()
+        scrape_sku_state(conn, log, max_variants=max_variants, session=session)
+        sku_s = time.perf_counter() - start
+        sku_rows = conn.execute("SELECT COUNT(*) FROM uniqlo_sku_state").fetchone()[0]
+        conn.close()
+
+    summary = metrics.METRICS.summary()
+    variants = counter_total(summary, "variants_total", status="ok")
+    result = {
+        "mode": "record" if record else "replay",
+        "catalog_variants": catalog_variants,
+        "catalog_seconds": round(catalog_s, 3),
+        "sku_variants": variants,
+        "sku_failed": counter_total(summary, "variants_total") - variants,
+        "sku_rows": sku_rows,
+        "sku_seconds": round(sku_s, 3),
+        "sku_variants_per_s": round(variants / sku_s, 3) if sku_s else None,
+    }
+    for t in timers_named(summary, "phase_seconds"):
+        phase = t["labels"]["phase"]
+        result[f"{phase}_p50_s"] = round(t["p50"], 4)
+        result[f"{phase}_p95_s"] = round(t["p95"], 4)
+    return result
+
+
+def write_mock_fixture(fixtures=MOCK_FIXTURES_DIR, base_url=SITE_URL):
+    fixtures = Path(fixtures)
+    fixtures.mkdir(parents=True, exist_ok=True)
+    path = fixtures / "mock-site.har.zip"
+    MockSite(**MOCK_SITE).write_har(path, base_url)
+    return path
+
+
+def _direction(key):
+    return COMPARED.get(key, +1 if key.endswith("_p95_s") else None)
+
+
+def compare(result, baseline, ratio=RATIO, scale=1.0):
+    """
+    Differences from `baseline` that fail the benchmark, as messages.
+    Baseline timings are scaled by `scale` (bench_db.baseline_scale) first.
+    """
+    failures = []
+    for key, value in result.items():
+        direction = _direction(key)
+        base = baseline.get(key)
+        if direction is None or value is None or base is None:
+            continue
+
+        if direction == 0:
+            worse = value != base
+        elif direction > 0:
+            base = round(base * scale, 4)
+            worse = value > base * ratio and value - base >= MIN_CHANGE_S
+        else:
+            base = round(base / scale, 4)
+            worse = value * ratio < base
+        if worse:
+            failures.append(f"{key}: {value} vs {base} in the baseline")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the scrapers on recorded pages")
+    parser.add_argument("--fixtures", default=str(FIXTURES_DIR), help="directory of recorded HARs")
+    parser.add_argument("--max-variants", type=int, default=MAX_VARIANTS)
+    parser.add_argument("--record", action="store_true", help="record the fixtures from the live site")
+    parser.add_argument("--baseline", action="append", default=[],
+                        help="JSON result to compare with (repeatable)")
+    parser.add_argument("--write-baseline", action="store_true", help="save this result as --baseline")
+    parser.add_argument("--save-baseline", metavar="PATH",
+                        help="after comparing, save this result with its environment to PATH")
+    parser.add_argument("--ratio", type=float, default=RATIO)
+    parser.add_argument("--write-mock-fixture", action="store_true",
+                        help=f"write the mock site's pages to {MOCK_FIXTURES_DIR} and exit")
+    args = parser.parse_args()
+
+    if args.write_mock_fixture:
+        print(f"mock site written to {write_mock_fixture()}")
+        return
+
+    fixtures = Path(args.fixtures)
+    if args.record:
+        for old in fixtures.glob("*.har.zip"):
+            old.unlink()
+
+    result = run(fixtures, args.max_variants, args.record)
+    metrics.write_reports("bench-scrapers", **result)
+    for k, v in result.items():
+        print(f"{k:>28}: {v}")
+
+    env = environment()
+    saved = dict(result, **{ENV_KEY: env})
+    if args.write_baseline:
+        save_baseline(args.baseline[-1], saved)
+        return
+
+    failures = []
+    for path in map(Path, args.baseline):
+        if not path.exists():
+            print(f"no baseline at {path} yet: save one with --write-baseline")
+            continue
+        baseline = json.loads(path.read_text())
+        # a counts-only baseline needs no calibration
+        timed = any(_direction(k) in (+1, -1) for k in baseline)
+        scale = baseline_scale(env, baseline.get(ENV_KEY)) if timed else 1.0
+        failures += compare(result, baseline, args.ratio, scale)
+    for f in failures:
+        print(f"FAIL: {f}")
+
+    if args.save_baseline:
+        save_baseline(args.save_baseline, saved)
+    if failures:
+        sys.exit(1)
+
+
+def save_baseline(path, result):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(result, indent=2) + "\n")
+    print(f"baseline written to {path}")
+
+
+if __name__ == "__main__":
+    main()
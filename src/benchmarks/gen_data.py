@@ -0,0 +1,201 @@
+"""
+Synthetic SKU history at any scale, in the current schema.
+
+    python -m src.benchmarks.gen_data --rows 1000000 --db /tmp/uniqlo-1m.sqlite
+
+Fills uniqlo_sku_state with `rows` rows: a catalog of variants (men /
+women, 1-6 colors, 3-8 sizes each) observed once per --interval-hours,
+the latest run just before now. Between runs a few colors get marked
+down further or go back to full price and sizes sell out or come back,
+so prices and availability change the way they do on the site. Also
+writes uniqlo_sale_variants (the catalog) and one uniqlo_sale_observations
+row per variant and run (what ItemCountIncrease reads).
+
+The number of variants follows the size (RUNS runs of history), up to
+MAX_VARIANTS; past that, more rows mean a longer history.
+"""
+import argparse
+import math
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+from db.schema import init_db
+from src.benchmarks.mock_site import COLORS, SIZES
+from src.scrapers.scrape_sku_state import INSERT_SKU_STATE_SQL
+
+RUNS = 30
+MIN_VARIANTS = 100
+MAX_VARIANTS = 4000
+INTERVAL_HOURS = 24
+BATCH = 100_000
+
+FIRST_PRODUCT = 400000
+CATALOGS = ["men", "women"]
+# weights: most products come in a few colors and the core sizes
+COLOR_COUNTS = ([1, 2, 3, 4, 5, 6], [10, 25, 30, 20, 10, 5])
+ORIGINAL_PRICES = ([9.9, 14.9, 19.9, 24.9, 29.9, 39.9, 49.9, 59.9, 79.9], [5, 10, 20, 15, 20, 12, 8, 6, 4])
+DISCOUNTS = ([10, 20, 30, 40, 50, 60, 70], [5, 20, 25, 20, 15, 10, 5])
+
+MARKDOWN_RATE = 0.05        # per color and run: discount goes one step up
+RESTORE_RATE = 0.01         # per color and run: back to the first discount
+SELL_OUT_RATE = 0.04        # per size and run
+RESTOCK_RATE = 0.02
+
+OBSERVATIONS_SQL = """
+    CREATE TABLE IF NOT EXISTS uniqlo_sale_observations (
+        scrape_id       TEXT,
+        scraped_at      TEXT,
+        catalog         TEXT,
+        product_id      TEXT,
+        name            TEXT,
+        sale_price      REAL,
+        original_price  REAL
+    )
+"""
+
+
+def _choice(rng, weighted):
+    values, weights = weighted
+    return rng.choices(values, weights)[0]
+
+
+def make_catalog(n_variants, rng):
+    """[(variant row, [[color_code, color_label, discount step, [[size_code, size_label, available]]]])]"""
+    catalog = []
+    for i in range(n_variants):
+        product_id = f"{FIRST_PRODUCT + i:06d}"
+        variant_id = f"E{product_id}-000"
+        original = _choice(rng, ORIGINAL_PRICES)
+        sizes = SIZES[rng.randint(0, 2):][:rng.randint(3, 8)]
+        colors = [
+            [code, label, DISCOUNTS[0].index(_choice(rng, DISCOUNTS)),
+             [[s, lbl, int(rng.random() < 0.75)] for s, lbl in sizes]]
+            for code, label in rng.sample(COLORS, _choice(rng, COLOR_COUNTS))
+        ]
+        variant = {
+            "catalog": CATALOGS[i % len(CATALOGS)],
+            "product_id": product_id,
+            "variant_id": variant_id,
+            "name": f"Generated Item {i}",
+            "sku_path": f"/uk/en/products/{variant_id}/00",
+            "original": original,
+        }
+        catalog.append((variant, colors))
+    return catalog
+
+
+def plan_variants(rows):
+    """Catalog size for `rows` rows over about RUNS runs."""
+    skus = sum(c * w for c, w in zip(*COLOR_COUNTS)) / sum(COLOR_COUNTS[1]) * 5.5
+    return max(MIN_VARIANTS, min(MAX_VARIANTS, int(rows / (RUNS * skus))))
+
+
+def _step(colors, rng):
+    """One run's worth of markdowns, restores, sell-outs and restocks."""
+    for color in colors:
+        r = rng.random()
+        if r < MARKDOWN_RATE:
+            color[2] = min(color[2] + 1, len(DISCOUNTS[0]) - 1)
+        elif r < MARKDOWN_RATE + RESTORE_RATE:
+            color[2] = 0
+        for size in color[3]:
+            r = rng.random()
+            if size[2] and r < SELL_OUT_RATE:
+                size[2] = 0
+            elif not size[2] and r < RESTOCK_RATE:
+                size[2] = 1
+
+
+def run_rows(catalog, observed_at):
+    """uniqlo_sku_state rows for one run over the whole catalog."""
+    for variant, colors in catalog:
+        original = variant["original"]
+        for code, label, step, sizes in colors:
+            discount = DISCOUNTS[0][step]
+            sale = round(original * (100 - discount) / 100, 2)
+            for size_code, size_label, available in sizes:
+                yield (
+                    observed_at, variant["catalog"], variant["product_id"], variant["variant_id"],
+                    variant["name"], variant["sku_path"], code, label, size_code, size_label,
+                    sale, original, discount, available,
+                )
+
+
+def generate(conn, rows, seed=0, interval_hours=INTERVAL_HOURS, now=None, log=print):
+    """Write `rows` SKU rows of history into conn; returns the catalog (make_catalog)."""
+    rng = random.Random(seed)
+    catalog = make_catalog(plan_variants(rows), rng)
+    per_run = sum(len(sizes) for _, colors in catalog for *_, sizes in colors)
+    n_runs = math.ceil(rows / per_run)
+    now = now or datetime.utcnow()
+    first = now - timedelta(minutes=1) - timedelta(hours=interval_hours * (n_runs - 1))
+    log(f"[GEN] {rows} rows: {len(catalog)} variants x {n_runs} runs")
+
+    init_db(conn)
+    conn.execute(OBSERVATIONS_SQL)
+    conn.execute("PRAGMA synchronous = OFF")
+
+    start = time.perf_counter()
+    written = 0
+    batch = []
+    for run in range(n_runs):
+        observed_at = (first + timedelta(hours=interval_hours * run)).isoformat()
+        if run:
+            for _, colors in catalog:
+                _step(colors, rng)
+
+        for row in run_rows(catalog, observed_at):
+            batch.append(row)
+            written += 1
+            if len(batch) >= BATCH or written >= rows:
+                conn.executemany(INSERT_SKU_STATE_SQL, batch)
+                batch = []
+            if written >= rows:
+                break
+
+        conn.executemany(
+            "INSERT INTO uniqlo_sale_observations VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (f"run-{run}", observed_at, v["catalog"], v["product_id"], v["name"],
+                 round(v["original"] * (100 - DISCOUNTS[0][colors[0][2]]) / 100, 2), v["original"])
+                for v, colors in catalog
+            ],
+        )
+
+    if batch:
+        conn.executemany(INSERT_SKU_STATE_SQL, batch)
+    conn.executemany(
+        """
+        INSERT OR REPLACE INTO uniqlo_sale_variants
+        (scrape_id, scraped_at, catalog, product_id, variant_id, variant_url, name, list_price, list_discount_pct)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        [
+            ("gen", now.isoformat(), v["catalog"], v["product_id"], v["variant_id"],
+             f"https://www.uniqlo.com{v['sku_path']}", v["name"], None, None)
+            for v, _ in catalog
+        ],
+    )
+    conn.commit()
+    conn.execute("PRAGMA synchronous = FULL")
+    log(f"[GEN] wrote {written} rows in {time.perf_counter() - start:.1f}s")
+    return catalog
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic SKU history")
+    parser.add_argument("--db", required=True)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--interval-hours", type=float, default=INTERVAL_HOURS)
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    generate(conn, args.rows, args.seed, args.interval_hours)
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
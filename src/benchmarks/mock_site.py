@@ -0,0 +1,368 @@
+"""
+A local stand-in for the parts of uniqlo.com the scrapers read.
+
+    python -m src.benchmarks.mock_site --variants 10000 --colors 3 --latency-ms 150 --error-rate 0.01
+
+Serves on http://127.0.0.1:8765 by default; point the scrapers at it with
+UNIQLO_BASE_URL (see src/scrapers/browser.py). src/benchmarks/bench_load.py
+starts one and runs the whole orchestrator against it.
+
+- /uk/en/feature/sale/<men|women>: product tiles (a[href^="/uk/en/products/E"],
+  name in the tile's second ITOTypography node, sale and strike-through
+  prices); the next --page-size tiles are fetched on every mouse wheel,
+  until the catalog is exhausted
+- /uk/en/products/E<id>-000/00: ITOChip color chips with /chip/goods_
+  images; clicking one renders its promotional / strike-through price and
+  its size chips, unavailable sizes struck through
+- /bot<token>/sendMessage: accepts Telegram messages (TELEGRAM_API_BASE)
+
+Product data is derived from --seed and the variant number, so every run
+sees the same site. MockSite.write_har() writes every page as a HAR the
+scrapers can replay at another base URL (src/benchmarks/bench_scrapers.py). Each page and API request waits --latency-ms (+-50%);
+--error-rate of product pages answer 500 and --block-rate answer 429.
+"""
+import argparse
+import base64
+import html
+import json
+import random
+import re
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CATALOGS = ("men", "women")
+COLORS = [
+    ("00", "WHITE"), ("09", "BLACK"), ("69", "NAVY"), ("03", "GRAY"), ("32", "BEIGE"),
+    ("37", "BROWN"), ("56", "OLIVE"), ("15", "RED"), ("65", "BLUE"), ("12", "PINK"),
+]
+SIZES = [
+    ("001", "XXS"), ("002", "XS"), ("003", "S"), ("004", "M"),
+    ("005", "L"), ("006", "XL"), ("007", "XXL"), ("008", "3XL"),
+]
+ORIGINAL_PRICES = (14.90, 19.90, 29.90, 39.90, 49.90, 59.90)
+DISCOUNTS = (20, 30, 40, 50, 60, 70)
+
+FIRST_PRODUCT = 400000
+PRODUCT_RE = re.compile(r"^/uk/en/products/E(\d{6})-000(?:/\d+)?$")
+CATALOG_RE = re.compile(r"^/uk/en/feature/sale/(\w+)$")
+API_RE = re.compile(r"^/mock/catalog/(\w+)$")
+
+# 1x1 transparent GIF for the chip images
+PIXEL = bytes.fromhex("47494638396101000100800000000000ffffff21f90401000000002c00000000010001000002024401003b")
+
+CATALOG_PAGE = """<!doctype html>
+<html><head><title>Sale | {catalog}</title></head>
+<body>
+<div id="tiles">{tiles}</div>
+<script>
+let offset = {offset}, loading = false, done = {done};
+window.addEventListener("wheel", async () => {{
+    if (loading || done) return;
+    loading = true;
+    const resp = await fetch("/mock/catalog/{catalog}?offset=" + offset);
+    const page = await resp.json();
+    document.getElementById("tiles").insertAdjacentHTML("beforeend", page.html);
+    offset = page.next;
+    done = page.done;
+    loading = false;
+}});
+</script>
+</body></html>
+"""
+
+TILE = """<div class="product-tile">
+  <a href="/uk/en/products/E{product_id}-000/00?colorDisplayCode={color}">
+    <div class="product-tile__content-area">
+      <div data-testid="ITOTypography">{catalog}</div>
+      <div data-testid="ITOTypography">{name}</div>
+      <p class="fr-ec-price-text--color-promotional">&pound;{sale:.2f}</p>
+      <p class="fr-ec-price__strike-through">&pound;{original:.2f}</p>
+    </div>
+  </a>
+</div>"""
+
+PRODUCT_PAGE = """<!doctype html>
+<html><head><title>{name}</title></head>
+<body>
+<h1>{name}</h1>
+<ul class="collection-list-horizontal">{chips}</ul>
+<div id="price"></div>
+<div id="sizes"></div>
+<script>
+const COLORS = {colors};
+function pick(code) {{
+    const c = COLORS[code];
+    document.getElementById("price").innerHTML =
+        '<p class="fr-ec-price-text--color-promotional">&pound;' + c.sale.toFixed(2) + '</p>' +
+        '<p class="fr-ec-price__strike-through">&pound;' + c.original.toFixed(2) + '</p>';
+    document.getElementById("sizes").innerHTML = c.sizes.map(s =>
+        '<div class="size-chip-wrapper"><button value="' + s.code + '">' +
+        '<div data-testid="ITOTypography">' + s.label + '</div></button>' +
+        (s.available ? '' : '<div class="strike"></div>') + '</div>'
+    ).join("");
+}}
+document.querySelectorAll("button[data-testid='ITOChip']").forEach(b =>
+    b.addEventListener("click", () => pick(b.value)));
+</script>
+</body></html>
+"""
+
+CHIP = """<li><button data-testid="ITOChip" id="chip-{product_id}-{code}" value="{code}">
+  <img src="/chip/goods_{code}_{product_id}.gif" alt="{label}"></button></li>"""
+
+
+class MockSite:
+    def __init__(self, variants=1000, colors=3, sizes=5, page_size=120,
+                 latency_ms=0.0, error_rate=0.0, block_rate=0.0, seed=0):
+        self.variants = variants
+        self.colors = min(colors, len(COLORS))
+        self.sizes = min(sizes, len(SIZES))
+        self.page_size = page_size
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.block_rate = block_rate
+        self.seed = seed
+
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = {}      # kind -> count
+        self.messages = 0
+
+    # ---- data ----
+
+    def catalog(self, name):
+        """Variant numbers listed in catalog `name` (alternating men / women)."""
+        if name not in CATALOGS:
+            return None
+        return range(CATALOGS.index(name), self.variants, len(CATALOGS))
+
+    def product(self, n):
+        rng = random.Random(f"{self.seed}-{n}")
+        original = rng.choice(ORIGINAL_PRICES)
+        colors = {}
+        for code, label in rng.sample(COLORS, self.colors):
+            discount = rng.choice(DISCOUNTS)
+            colors[code] = {
+                "label": label,
+                "original": original,
+                "sale": round(original * (100 - discount) / 100, 2),
+                "sizes": [
+                    {"code": s, "label": lbl, "available": rng.random() < 0.7}
+                    for s, lbl in SIZES[:self.sizes]
+                ],
+            }
+        return {
+            "product_id": f"{FIRST_PRODUCT + n:06d}",
+            "catalog": CATALOGS[n % len(CATALOGS)],
+            "name": f"Mock Item {n}",
+            "colors": colors,
+        }
+
+    # ---- pages ----
+
+    def tiles(self, name, offset):
+        """(tiles html, next offset, done) for one page of catalog `name`."""
+        listed = self.catalog(name)
+        page = listed[offset:offset + self.page_size]
+        parts = []
+        for n in page:
+            p = self.product(n)
+            color = next(iter(p["colors"].values()))
+            parts.append(TILE.format(
+                product_id=p["product_id"], color=next(iter(p["colors"])), catalog=html.escape(name),
+                name=html.escape(p["name"]), sale=color["sale"], original=color["original"],
+            ))
+        end = offset + len(page)
+        return "".join(parts), end, end >= len(listed)
+
+    def catalog_page(self, name):
+        tiles, offset, done = self.tiles(name, 0)
+        return CATALOG_PAGE.format(catalog=name, tiles=tiles, offset=offset, done=json.dumps(done))
+
+    def product_page(self, product_id):
+        n = int(product_id) - FIRST_PRODUCT
+        if not 0 <= n < self.variants:
+            return None
+        p = self.product(n)
+        chips = "".join(
+            CHIP.format(product_id=p["product_id"], code=code, label=c["label"])
+            for code, c in p["colors"].items()
+        )
+        return PRODUCT_PAGE.format(name=html.escape(p["name"]), chips=chips, colors=json.dumps(p["colors"]))
+
+    # ---- HAR ----
+
+    def pages(self):
+        """(path, content type, body) for every GET the scrapers can make."""
+        for name in CATALOGS:
+            yield f"/uk/en/feature/sale/{name}", "text/html; charset=utf-8", self.catalog_page(name)
+            offset, done = self.tiles(name, 0)[1:]
+            while not done:
+                tiles, next_offset, done = self.tiles(name, offset)
+                body = json.dumps({"html": tiles, "next": next_offset, "done": done})
+                yield f"/mock/catalog/{name}?offset={offset}", "application/json", body
+                offset = next_offset
+
+        for n in range(self.variants):
+            p = self.product(n)
+            yield f"/uk/en/products/E{p['product_id']}-000/00", "text/html; charset=utf-8", \
+                self.product_page(p["product_id"])
+            for code in p["colors"]:
+                yield f"/chip/goods_{code}_{p['product_id']}.gif", "image/gif", PIXEL
+
+    def har(self, base_url):
+        """The site as a HAR log, as if recorded at `base_url`."""
+        entries = []
+        for path, content_type, body in self.pages():
+            if isinstance(body, bytes):
+                content = {"mimeType": content_type, "text": base64.b64encode(body).decode(), "encoding": "base64"}
+            else:
+                content = {"mimeType": content_type, "text": body}
+            entries.append({
+                "startedDateTime": "2026-01-01T00:00:00.000Z",
+                "time": 0,
+                "request": {
+                    "method": "GET", "url": base_url.rstrip("/") + path, "httpVersion": "HTTP/1.1",
+                    "headers": [], "queryString": [], "cookies": [], "headersSize": -1, "bodySize": 0,
+                },
+                "response": {
+                    "status": 200, "statusText": "OK", "httpVersion": "HTTP/1.1",
+                    "headers": [{"name": "Content-Type", "value": content_type}],
+                    "cookies": [], "content": content, "redirectURL": "", "headersSize": -1, "bodySize": -1,
+                },
+                "cache": {},
+                "timings": {"send": 0, "wait": 0, "receive": 0},
+            })
+        return {"log": {"version": "1.2", "creator": {"name": "mock_site", "version": "1"}, "entries": entries}}
+
+    def write_har(self, path, base_url):
+        """Write har(base_url) to a .har.zip, the format BrowserSession replays."""
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+            z.writestr("mock-site.har", json.dumps(self.har(base_url), indent=1))
+
+    # ---- behaviour ----
+
+    def count(self, kind):
+        with self.lock:
+            self.requests[kind] = self.requests.get(kind, 0) + 1
+
+    def delay(self):
+        if self.latency_ms:
+            with self.lock:
+                jitter = self.rng.uniform(0.5, 1.5)
+            time.sleep(self.latency_ms * jitter / 1000)
+
+    def failure(self):
+        """500, 429 or None for a product page request."""
+        with self.lock:
+            r = self.rng.random()
+        if r < self.error_rate:
+            return 500
+        if r < self.error_rate + self.block_rate:
+            return 429
+        return None
+
+    def serve(self, host="127.0.0.1", port=0):
+        """Start serving in a background thread; returns the server (server.url, shutdown())."""
+        server = ThreadingHTTPServer((host, port), _Handler)
+        server.daemon_threads = True
+        server.site = self
+        server.url = f"http://{host}:{server.server_address[1]}"
+        threading.Thread(target=server.serve_forever, name="mock-site", daemon=True).start()
+        return server
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=b"", content_type="text/html; charset=utf-8", cache=False):
+        if isinstance(body, str):
+            body = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if cache:
+            self.send_header("Cache-Control", "public, max-age=86400")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        site = self.server.site
+        path, _, query = self.path.partition("?")
+
+        if path.startswith("/chip/goods_"):
+            site.count("chip")
+            return self._send(200, PIXEL, "image/gif", cache=True)
+
+        m = PRODUCT_RE.match(path)
+        if m:
+            site.count("product")
+            site.delay()
+            status = site.failure()
+            if status:
+                return self._send(status, f"mock {status}")
+            page = site.product_page(m.group(1))
+            return self._send(200, page) if page else self._send(404, "not found")
+
+        m = CATALOG_RE.match(path)
+        if m and site.catalog(m.group(1)) is not None:
+            site.count("catalog")
+            site.delay()
+            return self._send(200, site.catalog_page(m.group(1)))
+
+        m = API_RE.match(path)
+        if m and site.catalog(m.group(1)) is not None:
+            site.count("catalog_api")
+            site.delay()
+            offset = int(dict(p.split("=", 1) for p in query.split("&") if "=" in p).get("offset", 0))
+            tiles, offset, done = site.tiles(m.group(1), offset)
+            return self._send(200, json.dumps({"html": tiles, "next": offset, "done": done}), "application/json")
+
+        self._send(404, "not found")
+
+    def do_POST(self):
+        site = self.server.site
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if re.match(r"^/bot[^/]+/sendMessage$", self.path):
+            with site.lock:
+                site.messages += 1
+                message_id = site.messages
+            return self._send(200, json.dumps({"ok": True, "result": {"message_id": message_id}}), "application/json")
+        self._send(404, "not found")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a mock Uniqlo site")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--variants", type=int, default=1000, help="across both catalogs")
+    parser.add_argument("--colors", type=int, default=3, help="colors per product")
+    parser.add_argument("--sizes", type=int, default=5, help="sizes per color")
+    parser.add_argument("--page-size", type=int, default=120, help="tiles per catalog scroll")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="product pages answering 500")
+    parser.add_argument("--block-rate", type=float, default=0.0, help="product pages answering 429")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    site = MockSite(
+        variants=args.variants, colors=args.colors, sizes=args.sizes, page_size=args.page_size,
+        latency_ms=args.latency_ms, error_rate=args.error_rate, block_rate=args.block_rate, seed=args.seed,
+    )
+    server = site.serve(args.host, args.port)
+    print(f"[MOCK] serving {args.variants} variants on {server.url} (UNIQLO_BASE_URL={server.url})")
+    try:
+        while True:
+            time.sleep(60)
+            print(f"[MOCK] requests: {site.requests}, messages: {site.messages}")
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+import argparse
+import os
+import signal
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+from datetime import datetime
+
+from db.schema import init_db, assert_schema
+from src import metrics
+from src.notifiers.outbox import OutboxWorker
+from src.notifiers.subscriptions import seed_from_rules
+from src.orchestrator import DB_PATH, DETECTORS, log
+from src.pipeline import EventStream, NotifierWorker
+from src.runs import record_run, run_row
+from src.scrapers.browser import BrowserSession
+from src.scrapers.catalog_scraper import INSERT_VARIANT_SQL, iter_catalog_variants
+from src.scrapers.politeness import PolitenessController
+from src.scrapers.scrape_sku_state import INSERT_SKU_STATE_SQL, PREFETCH, iter_sku_rows, load_variants
+
+# --------------------------------------------------
+# Daemon
+#
+# One process, one Chromium and one SQLite connection for as long as it
+# runs. Catalog refreshes and SKU sweeps are tasks on their own intervals;
+# a sweep takes the scheduler's best `sweep_variants` (staleness rotates
+# the rest in), so every few minutes the most wanted deals are re-checked
+# without paying browser / Python startup each time.
+#
+# SIGTERM / SIGINT stop the loop between variants: rows scraped so far are
+# written and committed, detected events are matched and queued in the
+# outbox, and the outbox worker finishes its current batch. Anything still
+# unsent stays in uniqlo_outbox for the next start. A second signal exits
+# at once.
+# --------------------------------------------------
+
+CATALOG_INTERVAL_SEC = 3600
+SWEEP_INTERVAL_SEC = 300
+SWEEP_VARIANTS = 200
+
+
+class Daemon:
+    def __init__(self, db_path=DB_PATH, catalog_interval=CATALOG_INTERVAL_SEC,
+                 sweep_interval=SWEEP_INTERVAL_SEC, sweep_variants=SWEEP_VARIANTS, log=log):
+        self.db_path = db_path
+        self.catalog_interval = catalog_interval
+        self.sweep_interval = sweep_interval
+        self.sweep_variants = sweep_variants
+        self.log = log
+        self.stop = threading.Event()
+        self.conn = None
+        self.controller = None
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        return cls(
+            catalog_interval=float(os.getenv("DAEMON_CATALOG_INTERVAL", CATALOG_INTERVAL_SEC)),
+            sweep_interval=float(os.getenv("DAEMON_SWEEP_INTERVAL", SWEEP_INTERVAL_SEC)),
+            sweep_variants=int(os.getenv("DAEMON_SWEEP_VARIANTS", SWEEP_VARIANTS)),
+            **kwargs,
+        )
+
+    def handle_signal(self, signum, frame):
+        if self.stop.is_set():
+            raise KeyboardInterrupt
+        self.log(f"[DAEMON] {signal.Signals(signum).name}: finishing the current variant, then stopping")
+        self.stop.set()
+
+    # ---- scheduling ----
+
+    def loop(self, tasks, clock=time.monotonic):
+        """
+        tasks: [(name, interval seconds, fn)]. Runs whichever task is due
+        first (list order breaks ties, so all run once at start) until
+        stop is set. Intervals count from the end of a task's last run.
+        """
+        due = {name: 0.0 for name, _, _ in tasks}
+        while not self.stop.is_set():
+            name, interval, fn = min(tasks, key=lambda t: due[t[0]])
+            wait = due[name] - clock()
+            if wait > 0:
+                self.stop.wait(wait)
+                continue
+            self.run_task(name, fn)
+            due[name] = clock() + interval
+
+    def run_task(self, name, fn):
+        """One ledger row and run report per task run; failures do not stop the daemon."""
+        metrics.METRICS.reset()
+        run_id = uuid.uuid4().hex
+        started_at = datetime.utcnow().isoformat()
+        status = "failed"
+        try:
+            fn()
+            status = "ok" if not self.stop.is_set() else "stopped"
+        except Exception as e:
+            self.log(f"[DAEMON][WARN] {name} failed: {e}")
+        finally:
+            stage = f"daemon-{name}"
+            record_run(self.conn, run_row(run_id, stage, started_at, datetime.utcnow().isoformat(), status))
+            metrics.write_reports(stage, run_id=run_id, stage=stage, status=status)
+
+    # ---- tasks ----
+
+    def refresh_catalog(self, session):
+        """Replace uniqlo_sale_variants, but only with a complete scroll."""
+        rows = []
+        with closing(iter_catalog_variants(self.log, self.controller, session)) as variants:
+            for row in variants:
+                if self.stop.is_set():
+                    self.log("[DAEMON] catalog refresh interrupted, keeping the previous catalog")
+                    return
+                rows.append(row)
+
+        if not rows:
+            self.log("[DAEMON] catalog refresh found no variants, keeping the previous catalog")
+            return
+
+        self.conn.execute("DELETE FROM uniqlo_sale_variants")
+        self.conn.executemany(INSERT_VARIANT_SQL, rows)
+        self.conn.commit()
+        self.log(f"[DAEMON] catalog refreshed: {len(rows)} variants")
+
+    def sweep(self, session):
+        """Scrape the best `sweep_variants` variants, detecting and notifying as rows arrive."""
+        variants = load_variants(self.conn, self.sweep_variants, log=self.log)
+        if not variants:
+            self.log("[DAEMON] no variants to sweep yet")
+            return
+
+        observed_at = datetime.utcnow().isoformat()
+        notifier = NotifierWorker(self.db_path, self.log)
+        notifier.start()
+        stream = EventStream(self.conn, DETECTORS, sink=notifier.submit, log=self.log)
+        scraped = 0
+
+        try:
+            with closing(iter_sku_rows(
+                variants, observed_at, self.log, total=len(variants),
+                controller=self.controller, session=session,
+            )) as batches:
+                for rows in batches:
+                    with metrics.timer("db_write_seconds", table="uniqlo_sku_state"):
+                        self.conn.executemany(INSERT_SKU_STATE_SQL, rows)
+                        self.conn.commit()
+                    stream(rows)
+                    scraped += 1
+                    if self.stop.is_set():
+                        break
+        finally:
+            # flush: everything detected this sweep is queued before returning
+            notifier.close()
+
+        self.log(f"[DAEMON] sweep done: {scraped}/{len(variants)} variants, {stream.emitted} events")
+
+    # ---- lifecycle ----
+
+    def serve(self):
+        signal.signal(signal.SIGTERM, self.handle_signal)
+        signal.signal(signal.SIGINT, self.handle_signal)
+
+        self.conn = sqlite3.connect(self.db_path)
+        init_db(self.conn)
+        assert_schema(self.conn)
+        seed_from_rules(self.conn, log=self.log)
+
+        self.controller = PolitenessController.from_env(max_concurrency=2 if PREFETCH else 1, log=self.log)
+        outbox = OutboxWorker(self.db_path, self.log)
+        outbox.start()
+
+        self.log(
+            f"[DAEMON] catalog every {self.catalog_interval:.0f}s, "
+            f"sweep of {self.sweep_variants} variants every {self.sweep_interval:.0f}s"
+        )
+        try:
+            with BrowserSession.from_env(log=self.log) as session:
+                self.loop([
+                    ("catalog", self.catalog_interval, lambda: self.refresh_catalog(session)),
+                    ("sweep", self.sweep_interval, lambda: self.sweep(session)),
+                ])
+        finally:
+            self.log("[DAEMON] flushing")
+            outbox.stop()
+            self.conn.commit()
+            self.conn.close()
+            self.log(f"[DAEMON] stopped ({self.controller.summary()})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep scraping with a warm browser")
+    parser.add_argument("--catalog-interval", type=float, help="seconds between catalog refreshes")
+    parser.add_argument("--sweep-interval", type=float, help="seconds between SKU sweeps")
+    parser.add_argument("--sweep-variants", type=int, help="variants per sweep")
+    args = parser.parse_args()
+
+    daemon = Daemon.from_env()
+    if args.catalog_interval:
+        daemon.catalog_interval = args.catalog_interval
+    if args.sweep_interval:
+        daemon.sweep_interval = args.sweep_interval
+    if args.sweep_variants:
+        daemon.sweep_variants = args.sweep_variants
+
+    log(f"USING DB FILE: {daemon.db_path.resolve()}")
+    daemon.serve()
+
+
+if __name__ == "__main__":
+    main()
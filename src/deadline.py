@@ -0,0 +1,96 @@
+import os
+import threading
+import time
+
+from src import metrics
+
+# --------------------------------------------------
+# Run deadline
+#
+# A run may get a time budget (--time-budget / TIME_BUDGET_MIN, minutes
+# from process start). Before taking each variant a worker asks the
+# deadline whether one more still fits: at the per-variant time seen so
+# far (EWMA) it must finish before the reserve kept for persisting,
+# detection and notification. Past that point the run takes no new work,
+# finishes what is in flight and is marked partial, instead of being
+# killed by the CI timeout with nothing saved and nobody notified.
+# --------------------------------------------------
+
+RESERVE_SEC = 300
+EWMA_ALPHA = 0.2
+INITIAL_VARIANT_SEC = 15.0
+
+_END = object()
+
+
+class Deadline:
+    def __init__(self, budget_sec=None, reserve_sec=RESERVE_SEC, alpha=EWMA_ALPHA,
+                 initial_estimate=INITIAL_VARIANT_SEC, clock=time.monotonic, log=print):
+        self.budget_sec = budget_sec
+        self.reserve_sec = reserve_sec
+        self.alpha = alpha
+        self.estimate = initial_estimate
+        self.clock = clock
+        self.log = log
+
+        self.started = clock()
+        self.observed = 0
+        self.cut = False        # work was turned away: the run is partial
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, minutes=None, log=print):
+        minutes = minutes if minutes is not None else os.getenv("TIME_BUDGET_MIN")
+        return cls(
+            budget_sec=float(minutes) * 60 if minutes else None,
+            reserve_sec=float(os.getenv("TIME_BUDGET_RESERVE_SEC", RESERVE_SEC)),
+            log=log,
+        )
+
+    def remaining(self):
+        if self.budget_sec is None:
+            return float("inf")
+        return self.budget_sec - (self.clock() - self.started)
+
+    def observe(self, seconds):
+        """Per-variant wall time of one worker."""
+        with self.lock:
+            if self.observed:
+                self.estimate = self.alpha * seconds + (1 - self.alpha) * self.estimate
+            else:
+                self.estimate = seconds
+            self.observed += 1
+
+    def allows(self, need=None):
+        """Whether work taking `need` seconds (default: one variant) fits before the reserve."""
+        need = self.estimate if need is None else need
+        left = self.remaining()
+        if left - self.reserve_sec >= need:
+            return True
+
+        with self.lock:
+            if not self.cut:
+                self.cut = True
+                metrics.incr("deadline_cuts_total")
+                self.log(
+                    f"[DEADLINE] {left:.0f}s left: taking no new work "
+                    f"(~{self.estimate:.1f}s per variant, {self.reserve_sec:.0f}s reserved)"
+                )
+        return False
+
+    def take(self, items, need=None):
+        """Iterate `items` while allows(need); checked before each item is pulled."""
+        it = iter(items)
+        try:
+            while self.allows(need):
+                item = next(it, _END)
+                if item is _END:
+                    return
+                yield item
+        finally:
+            if hasattr(it, "close"):
+                it.close()
+
+    @property
+    def status(self):
+        return "partial" if self.cut else "ok"
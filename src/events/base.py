@@ -9,4 +9,20 @@ class EventDetector(ABC):
         Returns a list of:
         (event_time, catalog, event_type, event_value)
         """
-        pass
\ No newline at end of file
+        pass
+
+    def detect_rows(self, rows):
+        """
+        Streaming hook: evaluate freshly scraped uniqlo_sku_state rows
+        (one variant at a time) without touching the DB.
+
+        Detectors that only make sense over history return nothing here.
+        """
+        return []
+
+    def detect_frame(self, df):
+        """
+        Backtest hook: vectorised detect_rows() over a DataFrame of
+        uniqlo_sku_state history. Returns the matching rows.
+        """
+        return df.iloc[0:0]
@@ -1,65 +1,118 @@
 import json
 from datetime import datetime
 
+from db.schema import SKU_STATE_COLUMNS
+from .base import EventDetector
+
 EVENT_TYPE = "RARE_DEEP_DISCOUNT"
 
+MIN_DISCOUNT_PCT = 60
+MAX_SALE_PRICE = 20
+
+SALE_PRICE = SKU_STATE_COLUMNS.index("sale_price")
+DISCOUNT_PCT = SKU_STATE_COLUMNS.index("discount_pct")
+IS_AVAILABLE = SKU_STATE_COLUMNS.index("is_available")
+
+
+def _event(now, row):
+    (
+        _observed_at,
+        catalog,
+        product_id,
+        source_variant_id,
+        product_name,
+        sku_path,
+        color_code,
+        color_label,
+        size_code,
+        size_label,
+        sale,
+        original,
+        discount,
+        _is_available,
+    ) = row
+
+    return (
+        now,
+        catalog,
+        EVENT_TYPE,
+        product_id,
+        sku_path,
+        source_variant_id,
+        color_code,
+        color_label,
+        size_code,
+        size_label,
+        json.dumps({
+            "product_name": product_name,
+            "sale_price": sale,
+            "original_price": original,
+            "discount_pct": discount
+        })
+    )
+
+
+class DeepDiscountDetector(EventDetector):
+    event_type = EVENT_TYPE
+
+    def __init__(self, price_threshold=MAX_SALE_PRICE, min_discount_pct=MIN_DISCOUNT_PCT):
+        self.price_threshold = price_threshold
+        self.min_discount_pct = min_discount_pct
+
+    def detect(self, conn, catalog: str | None = None):
+        now = datetime.utcnow().isoformat()
+
+        rows = conn.execute("""
+            SELECT
+                observed_at,
+                catalog,
+                product_id,
+                source_variant_id,
+                product_name,
+                sku_path,
+                color_code,
+                color_label,
+                size_code,
+                size_label,
+                sale_price,
+                original_price,
+                discount_pct,
+                is_available
+            FROM uniqlo_sku_state
+            WHERE
+                is_available = 1
+                AND discount_pct >= ?
+                AND sale_price < ?
+                AND (? IS NULL OR catalog = ?)
+        """, (self.min_discount_pct, self.price_threshold, catalog, catalog)).fetchall()
+
+        return [_event(now, r) for r in rows]
+
+    def detect_rows(self, rows):
+        """
+        Same predicate as detect(), applied to rows in uniqlo_sku_state
+        column order as they come out of the scraper.
+        """
+        now = datetime.utcnow().isoformat()
+
+        return [
+            _event(now, r)
+            for r in rows
+            if r[IS_AVAILABLE] == 1
+            and r[DISCOUNT_PCT] >= self.min_discount_pct
+            and r[SALE_PRICE] < self.price_threshold
+        ]
+
+    def detect_frame(self, df):
+        """
+        Vectorised predicate over a uniqlo_sku_state DataFrame (backtests).
+        """
+        return df[
+            (df["is_available"] == 1)
+            & (df["discount_pct"] >= self.min_discount_pct)
+            & (df["sale_price"] < self.price_threshold)
+        ]
+
+
 def detect(conn):
-    now = datetime.utcnow().isoformat()
-
-    rows = conn.execute("""
-        SELECT
-            catalog,
-            product_id,
-            source_variant_id,
-            sku_path,
-            product_name,
-            color_code,
-            color_label,
-            size_code,
-            size_label,
-            sale_price,
-            original_price,
-            discount_pct
-        FROM uniqlo_sku_state
-        WHERE
-            is_available = 1
-            AND discount_pct >= 60
-            AND sale_price < 20
-    """).fetchall()
-
-    events = []
-
-    for (
-            catalog,
-            product_id,
-            source_variant_id,
-            sku_path,
-            product_name,
-            color_code,
-            color_label,
-            size_code,
-            size_label,
-            sale,
-            original,
-            discount
-    ) in rows:
-        events.append((
-            now,
-            catalog,
-            EVENT_TYPE,
-            product_id,
-            sku_path,
-            source_variant_id,
-            color_code,
-            color_label,
-            size_code,
-            size_label,
-            json.dumps({
-                "product_name": product_name,
-                "sale_price": sale,
-                "original_price": original,
-                "discount_pct": discount
-            })
-        ))
-
-    return events
\ No newline at end of file
+    return DeepDiscountDetector().detect(conn)
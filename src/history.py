@@ -0,0 +1,260 @@
+import argparse
+import json
+import re
+import sqlite3
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from db.schema import init_history
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+DB_PATH = BASE_DIR / "db" / "uniqlo.sqlite"
+
+# --------------------------------------------------
+# Price history
+#
+# A product's or one SKU's sale price, discount and availability over
+# time, downsampled in SQL to hour / day / week buckets: per bucket the
+# min, max and last price and discount, the share of observations that
+# were available and, for a single SKU, whether it was available at the
+# bucket's last observation. The series is read from idx_sku_state_history
+# alone (db/schema.py), and results are cached in uniqlo_history_cache
+# under the latest run id, so the cache empties itself when a run lands.
+#
+#     python -m src.history E465185-000 --color 09 --size 004 --bucket week
+# --------------------------------------------------
+
+# bucket -> SQL for the bucket's start, from observed_at (ISO text)
+BUCKETS = {
+    "hour": "substr(observed_at, 1, 13) || ':00'",
+    "day": "substr(observed_at, 1, 10)",
+    "week": "date(substr(observed_at, 1, 10), '-6 days', 'weekday 1')",   # Monday
+}
+
+# grouping -> columns one series is keyed by
+GROUPS = {
+    "sku": ("color_code", "size_code"),
+    "color": ("color_code",),
+    "product": (),
+}
+
+# larger results (a year of hourly points) are recomputed rather than stored
+CACHE_MAX_POINTS = 10_000
+
+PRODUCT_RE = re.compile(r"^E?(\d{6})(?:-\d{3})?$")
+
+SERIES_COLUMNS = (
+    "bucket", "observations",
+    "price_min", "price_max", "price_last",
+    "discount_min", "discount_max", "discount_last",
+    "available_share", "available_last",
+)
+
+
+def product_id_of(value):
+    """'465185' from '465185', 'E465185' or 'E465185-000'."""
+    m = PRODUCT_RE.match(value.strip())
+    if not m:
+        raise ValueError(f"not a product or variant id: {value!r}")
+    return m.group(1)
+
+
+def current_run_id(conn):
+    """The latest run in the ledger, or None (no ledger: nothing is cached)."""
+    try:
+        row = conn.execute("""
+            SELECT run_id FROM uniqlo_runs
+            ORDER BY finished_at DESC
+            LIMIT 1
+        """).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row and row[0]
+
+
+def query_series(conn, product_id, color_code=None, size_code=None,
+                 bucket="day", by="sku", since=None, until=None):
+    """
+    {"series": [{key columns, product_name, labels, "points": [...]}]}, one
+    series per GROUPS[by] key; points are dicts of SERIES_COLUMNS.
+    """
+    if bucket not in BUCKETS:
+        raise ValueError(f"bucket must be one of {', '.join(BUCKETS)}")
+    if by not in GROUPS:
+        raise ValueError(f"by must be one of {', '.join(GROUPS)}")
+
+    # conditions in index order, so the range scan is over one product / SKU
+    where, params = ["product_id = ?"], [product_id_of(product_id)]
+    for column, value in (("color_code", color_code), ("size_code", size_code)):
+        if value is not None:
+            where.append(f"{column} = ?")
+            params.append(value)
+    if since:
+        where.append("observed_at >= ?")
+        params.append(since)
+    if until:
+        where.append("observed_at < ?")
+        params.append(until)
+
+    keys = GROUPS[by]
+    key_sql = "".join(f"{k}, " for k in keys)
+    # the "last" values are read from the rows at the bucket's latest
+    # observed_at; when several SKUs share it (by color / product) that is
+    # the lowest price and the highest discount among them
+    rows = conn.execute(f"""
+        SELECT {key_sql}
+               bucket,
+               COUNT(*),
+               MIN(sale_price), MAX(sale_price),
+               MIN(discount_pct), MAX(discount_pct),
+               AVG(is_available),
+               MAX(observed_at),
+               MIN(CASE WHEN observed_at = last_at THEN sale_price END),
+               MAX(CASE WHEN observed_at = last_at THEN discount_pct END),
+               MIN(CASE WHEN observed_at = last_at THEN is_available END)
+        FROM (
+            SELECT {key_sql}
+                   {BUCKETS[bucket]} AS bucket,
+                   observed_at, sale_price, discount_pct, is_available,
+                   MAX(observed_at) OVER (PARTITION BY {key_sql}{BUCKETS[bucket]}) AS last_at
+            FROM uniqlo_sku_state
+            WHERE {' AND '.join(where)}
+        )
+        GROUP BY {key_sql}bucket
+        ORDER BY {key_sql}bucket
+    """, params).fetchall()
+
+    series, latest = {}, None
+    for row in rows:
+        key = row[:len(keys)]
+        (bucket_start, count, pmin, pmax, dmin, dmax, share,
+         last_at, price, discount, available) = row[len(keys):]
+        latest = max(latest or last_at, last_at)
+        if key not in series:
+            series[key] = {**dict(zip(keys, key)), "points": []}
+        series[key]["points"].append(dict(zip(SERIES_COLUMNS, (
+            bucket_start, count, pmin, pmax, price, dmin, dmax, discount,
+            round(share, 3),
+            # several SKUs share a bucket's last observation: no single answer
+            bool(available) if by == "sku" else None,
+        ))))
+
+    if latest:
+        _add_labels(conn, params[0], latest, list(series.values()))
+    return {"series": list(series.values())}
+
+
+def _add_labels(conn, product_id, observed_at, series):
+    """Product name and color / size labels, from the series' latest observation."""
+    rows = conn.execute("""
+        SELECT product_name, color_code, color_label, size_code, size_label
+        FROM uniqlo_sku_state
+        WHERE product_id = ? AND observed_at = ?
+    """, (product_id, observed_at)).fetchall()
+    colors = {r[1]: r[2] for r in rows}
+    sizes = {r[3]: r[4] for r in rows}
+    for s in series:
+        s["product_name"] = rows[0][0] if rows else None
+        if "color_code" in s:
+            s["color_label"] = colors.get(s["color_code"])
+        if "size_code" in s:
+            s["size_label"] = sizes.get(s["size_code"])
+
+
+def price_history(conn, product_id, color_code=None, size_code=None,
+                  bucket="day", by="sku", since=None, until=None, cache=True):
+    """query_series, served from uniqlo_history_cache while no new run has landed."""
+    query = json.dumps({
+        "product_id": product_id_of(product_id), "color_code": color_code, "size_code": size_code,
+        "bucket": bucket, "by": by, "since": since, "until": until,
+    }, sort_keys=True)
+    run_id = current_run_id(conn) if cache else None
+
+    if run_id:
+        try:
+            row = conn.execute("""
+                SELECT result FROM uniqlo_history_cache
+                WHERE run_id = ? AND query = ?
+            """, (run_id, query)).fetchone()
+        except sqlite3.OperationalError:
+            row = None      # a database from before the cache
+        if row:
+            return {**json.loads(row[0]), "run_id": run_id, "cached": True}
+
+    result = query_series(conn, product_id, color_code, size_code, bucket, by, since, until)
+
+    points = sum(len(s["points"]) for s in result["series"])
+    if run_id and points <= CACHE_MAX_POINTS:
+        try:
+            conn.execute("DELETE FROM uniqlo_history_cache WHERE run_id != ?", (run_id,))
+            conn.execute("""
+                INSERT OR REPLACE INTO uniqlo_history_cache (run_id, query, created_at, result)
+                VALUES (?, ?, ?, ?)
+            """, (run_id, query, datetime.utcnow().isoformat(), json.dumps(result)))
+            conn.commit()
+        except sqlite3.OperationalError:
+            pass            # read-only snapshot: serve uncached
+    return {**result, "run_id": run_id, "cached": False}
+
+
+def print_history(result):
+    for s in result["series"]:
+        title = " / ".join(
+            str(s[k]) for k in ("product_name", "color_label", "size_label") if s.get(k)
+        ) or "(no name)"
+        codes = " ".join(f"{k}={s[k]}" for k in ("color_code", "size_code") if k in s)
+        print(f"{title}  {codes}")
+        print(f"  {'bucket':<16} {'obs':>5} {'price min/max/last':>24} {'discount min/max/last':>22} {'avail':>6}")
+        for p in s["points"]:
+            last = "" if p["available_last"] is None else (" yes" if p["available_last"] else " no")
+            print(
+                f"  {p['bucket']:<16} {p['observations']:>5} "
+                f"{p['price_min']:>8.2f}{p['price_max']:>8.2f}{p['price_last']:>8.2f} "
+                f"{p['discount_min']:>7.0f}%{p['discount_max']:>6.0f}%{p['discount_last']:>6.0f}%  "
+                f"{p['available_share']:>5.0%}{last}"
+            )
+        print()
+    if not result["series"]:
+        print("[HISTORY] no observations")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Price, discount and availability history")
+    parser.add_argument("product", help="product or variant id (465185, E465185-000)")
+    parser.add_argument("--color", help="color code (09)")
+    parser.add_argument("--size", help="size code (004)")
+    parser.add_argument("--bucket", choices=list(BUCKETS), default="day")
+    parser.add_argument("--by", choices=list(GROUPS), default="sku", help="one series per ...")
+    parser.add_argument("--since", help="ISO date or time, inclusive")
+    parser.add_argument("--until", help="ISO date or time, exclusive")
+    parser.add_argument("--json", action="store_true", help="print JSON")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--db", default=str(DB_PATH))
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    try:
+        init_history(conn)
+        conn.commit()
+    except sqlite3.OperationalError as e:
+        print(f"[HISTORY][WARN] cannot create the history index: {e}", file=sys.stderr)
+
+    try:
+        result = price_history(
+            conn, args.product, args.color, args.size, args.bucket, args.by,
+            args.since, args.until, cache=not args.no_cache,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    finally:
+        conn.close()
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_history(result)
+
+
+if __name__ == "__main__":
+    main()
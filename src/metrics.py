@@ -0,0 +1,178 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# --------------------------------------------------
+# Run metrics
+#
+# Timers keep every observation, so quantiles are exact; a run produces a
+# few thousand variants x a handful of phases, which is small.
+#
+#   with timer("phase_seconds", phase="goto"): ...
+#   incr("variants_total", status="ok")
+#
+# METRICS is the process-wide registry; threads share it.
+# --------------------------------------------------
+
+QUANTILES = (0.5, 0.95, 0.99)
+PROM_PREFIX = "uniqlo_"
+METRICS_DIR = Path(os.getenv("METRICS_DIR", Path(__file__).resolve().parents[1] / "reports"))
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def _quantile(ordered, q):
+    """Nearest-rank quantile of a sorted list."""
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))]
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counters = {}
+            self.timers = {}
+            self.started = time.time()
+
+    # ---- recording ----
+
+    def incr(self, name, n=1, **labels):
+        key = _key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    def observe(self, name, seconds, **labels):
+        key = _key(name, labels)
+        with self.lock:
+            self.timers.setdefault(key, []).append(seconds)
+        for captured in getattr(self.local, "captures", ()):
+            captured[key] = captured.get(key, 0.0) + seconds
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    @contextmanager
+    def capture(self):
+        """
+        Also total what this thread observes inside the block, by
+        (name, labels): one variant's time by phase, say.
+        """
+        captured = {}
+        captures = self.local.__dict__.setdefault("captures", [])
+        captures.append(captured)
+        try:
+            yield captured
+        finally:
+            captures.pop()
+
+    # ---- reporting ----
+
+    def summary(self):
+        """{"counters": [...], "timers": [...]} with quantiles per timer."""
+        with self.lock:
+            counters = dict(self.counters)
+            timers = {k: sorted(v) for k, v in self.timers.items()}
+
+        return {
+            "counters": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(counters.items())
+            ],
+            "timers": [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": len(values),
+                    "sum": sum(values),
+                    "min": values[0],
+                    "max": values[-1],
+                    **{f"p{int(q * 100)}": _quantile(values, q) for q in QUANTILES},
+                }
+                for (name, labels), values in sorted(timers.items())
+            ],
+        }
+
+    def write_json(self, path, **extra):
+        """Run report: wall time, counters and timer quantiles, plus extra fields."""
+        report = {
+            "started_at": self.started,
+            "wall_seconds": time.time() - self.started,
+            **extra,
+            **self.summary(),
+        }
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(report, indent=2))
+        return report
+
+    def prometheus(self):
+        """Prometheus text exposition format (timers as summaries)."""
+        summary = self.summary()
+        lines = []
+
+        def labels_text(labels, **more):
+            items = {**labels, **more}
+            if not items:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in sorted(items.items())) + "}"
+
+        seen = set()
+        for c in summary["counters"]:
+            name = PROM_PREFIX + c["name"]
+            if name not in seen:
+                lines.append(f"# TYPE {name} counter")
+                seen.add(name)
+            lines.append(f"{name}{labels_text(c['labels'])} {c['value']}")
+
+        for t in summary["timers"]:
+            name = PROM_PREFIX + t["name"]
+            if name not in seen:
+                lines.append(f"# TYPE {name} summary")
+                seen.add(name)
+            for q in QUANTILES:
+                value = t[f"p{int(q * 100)}"]
+                lines.append(f"{name}{labels_text(t['labels'], quantile=q)} {value:.6f}")
+            lines.append(f"{name}_sum{labels_text(t['labels'])} {t['sum']:.6f}")
+            lines.append(f"{name}_count{labels_text(t['labels'])} {t['count']}")
+
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(self.prometheus())
+
+
+METRICS = Metrics()
+
+incr = METRICS.incr
+observe = METRICS.observe
+timer = METRICS.timer
+capture = METRICS.capture
+
+
+def write_reports(name, directory=None, **extra):
+    """
+    <name>.json run report and <name>.prom (for a Prometheus textfile
+    collector) in METRICS_DIR. Returns the report.
+    """
+    directory = Path(directory or METRICS_DIR)
+    report = METRICS.write_json(directory / f"{name}.json", **extra)
+    METRICS.write_prometheus(directory / f"{name}.prom")
+    return report
@@ -0,0 +1,196 @@
+import os
+import smtplib
+from concurrent.futures import ThreadPoolExecutor
+from email.message import EmailMessage
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.notifiers.messages import SendFailure
+from src.notifiers.telegram import TelegramSender
+
+# --------------------------------------------------
+# Delivery backends
+#
+# Each backend takes [(address, Message)] and returns True or a (falsy)
+# SendFailure with the reason per delivery, never raising. Concurrency is per backend, so a slow SMTP
+# server does not hold up Telegram.
+# --------------------------------------------------
+
+class TelegramChannel:
+    """One TelegramSender for the channel's life, so its rate limits span batches."""
+
+    kind = "telegram"
+
+    def __init__(self, bot_token, api_base=None, concurrency=16, log=print):
+        self.sender = TelegramSender(
+            bot_token,
+            api_base=api_base,
+            pool_size=concurrency,
+            log=log,
+        )
+
+    def send_all(self, deliveries):
+        return self.sender.send_all((address, m.text) for address, m in deliveries)
+
+    def close(self):
+        self.sender.close()
+
+
+class WebhookChannel:
+    """POSTs the message as JSON to the subscriber's URL."""
+
+    kind = "webhook"
+
+    def __init__(self, concurrency=8, timeout=10, log=print):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.log = log
+
+    def send_all(self, deliveries):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=self.concurrency)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+
+        def post(delivery):
+            url, m = delivery
+            try:
+                resp = session.post(
+                    url,
+                    json={"subject": m.subject, "text": m.text, **m.data},
+                    timeout=self.timeout,
+                )
+            except requests.RequestException as e:
+                self.log(f"[WEBHOOK][FAIL] {url}: {e}")
+                return SendFailure(str(e))
+            if not resp.ok:
+                self.log(f"[WEBHOOK][FAIL] {url}: HTTP {resp.status_code}")
+                return SendFailure(f"HTTP {resp.status_code}: {resp.text[:200]}")
+            return True
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                return list(pool.map(post, deliveries))
+        finally:
+            session.close()
+
+
+class EmailChannel:
+    """
+    Plain-text email over SMTP. Deliveries are split across `concurrency`
+    connections, each reused for its whole share.
+    """
+
+    kind = "email"
+
+    def __init__(self, host, port=25, sender="uniqlo-alerts@localhost", user=None,
+                 password=None, starttls=False, concurrency=2, timeout=30, log=print):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.user = user
+        self.password = password
+        self.starttls = starttls
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.log = log
+
+    def _send_share(self, share):
+        results = []
+        try:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        except (OSError, smtplib.SMTPException) as e:
+            self.log(f"[EMAIL][FAIL] connect {self.host}:{self.port}: {e}")
+            return [SendFailure(f"connect {self.host}:{self.port}: {e}")] * len(share)
+
+        try:
+            if self.starttls:
+                smtp.starttls()
+            if self.user:
+                smtp.login(self.user, self.password)
+
+            for address, m in share:
+                msg = EmailMessage()
+                msg["From"] = self.sender
+                msg["To"] = address
+                msg["Subject"] = m.subject
+                msg.set_content(m.text)
+                try:
+                    smtp.send_message(msg)
+                    results.append(True)
+                except smtplib.SMTPException as e:
+                    self.log(f"[EMAIL][FAIL] {address}: {e}")
+                    results.append(SendFailure(str(e)))
+        except (OSError, smtplib.SMTPException) as e:
+            self.log(f"[EMAIL][FAIL] session {self.host}:{self.port}: {e}")
+            results.extend([SendFailure(f"session {self.host}:{self.port}: {e}")] * (len(share) - len(results)))
+        finally:
+            try:
+                smtp.quit()
+            except (OSError, smtplib.SMTPException):
+                pass
+
+        return results
+
+    def send_all(self, deliveries):
+        deliveries = list(deliveries)
+        if not deliveries:
+            return []
+
+        n = min(self.concurrency, len(deliveries))
+        shares = [deliveries[i::n] for i in range(n)]
+
+        with ThreadPoolExecutor(max_workers=n) as pool:
+            share_results = list(pool.map(self._send_share, shares))
+
+        # undo the round-robin split
+        results = [None] * len(deliveries)
+        for i, share in enumerate(share_results):
+            for j, ok in enumerate(share):
+                results[i + j * n] = ok
+        return results
+
+
+# --------------------------------------------------
+# Registry
+# --------------------------------------------------
+
+def configured_kinds():
+    """Channel kinds this process can deliver to, from the environment."""
+    kinds = {"webhook"}
+    if os.getenv("TELEGRAM_BOT_TOKEN"):
+        kinds.add("telegram")
+    if os.getenv("SMTP_HOST"):
+        kinds.add("email")
+    return kinds
+
+
+def build_channels(log=print):
+    channels = {
+        "webhook": WebhookChannel(
+            concurrency=int(os.getenv("WEBHOOK_CONCURRENCY", 8)),
+            log=log,
+        ),
+    }
+
+    if os.getenv("TELEGRAM_BOT_TOKEN"):
+        channels["telegram"] = TelegramChannel(
+            os.getenv("TELEGRAM_BOT_TOKEN"),
+            concurrency=int(os.getenv("TELEGRAM_CONCURRENCY", 16)),
+            log=log,
+        )
+
+    if os.getenv("SMTP_HOST"):
+        channels["email"] = EmailChannel(
+            os.getenv("SMTP_HOST"),
+            port=int(os.getenv("SMTP_PORT", 25)),
+            sender=os.getenv("SMTP_FROM", "uniqlo-alerts@localhost"),
+            user=os.getenv("SMTP_USER"),
+            password=os.getenv("SMTP_PASSWORD"),
+            starttls=os.getenv("SMTP_STARTTLS", "0") == "1",
+            concurrency=int(os.getenv("SMTP_CONCURRENCY", 2)),
+            log=log,
+        )
+
+    return channels
@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+
+from db.schema import import_rows
+from src import metrics
+
+# --------------------------------------------------
+# Cooldown against uniqlo_notifications
+# --------------------------------------------------
+
+def filter_cooled_down(conn, candidates, now=None):
+    """
+    candidates: iterable of
+        (chat_id, event_type, sku_path, color_code, size_code, cooldown_hours)
+
+    Returns the set of (chat_id, event_type, sku_path, color_code, size_code)
+    keys that were NOT notified within their cooldown window.
+
+    All candidates are checked with one anti-join on the notification log's
+    primary key instead of a query per message.
+    """
+    now = now or datetime.utcnow()
+
+    conn.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS notify_candidates (
+            chat_id     TEXT NOT NULL,
+            event_type  TEXT NOT NULL,
+            sku_path    TEXT NOT NULL,
+            color_code  TEXT NOT NULL,
+            size_code   TEXT NOT NULL,
+            cutoff      TEXT NOT NULL
+        )
+    """)
+    conn.execute("DELETE FROM notify_candidates")
+
+    conn.executemany(
+        "INSERT INTO notify_candidates VALUES (?, ?, ?, ?, ?, ?)",
+        [
+            (chat_id, event_type, sku_path, color_code, size_code,
+             (now - timedelta(hours=hours)).isoformat())
+            for chat_id, event_type, sku_path, color_code, size_code, hours in candidates
+        ],
+    )
+
+    fresh = conn.execute("""
+        SELECT DISTINCT
+            c.chat_id,
+            c.event_type,
+            c.sku_path,
+            c.color_code,
+            c.size_code
+        FROM notify_candidates c
+        LEFT JOIN uniqlo_notifications n
+            ON  n.chat_id    = c.chat_id
+            AND n.event_type = c.event_type
+            AND n.sku_path   = c.sku_path
+            AND n.color_code = c.color_code
+            AND n.size_code  = c.size_code
+            AND n.notified_at >= c.cutoff
+        WHERE n.chat_id IS NULL
+    """).fetchall()
+
+    conn.execute("DELETE FROM notify_candidates")
+
+    return set(fresh)
+
+
+def record_notifications(conn, keys, notified_at=None):
+    """Mark (chat_id, event_type, sku_path, color_code, size_code) keys as sent."""
+    notified_at = notified_at or datetime.utcnow().isoformat()
+
+    with metrics.timer("db_write_seconds", table="uniqlo_notifications"):
+        conn.executemany(
+            """
+            INSERT OR REPLACE INTO uniqlo_notifications
+            (notified_at, chat_id, event_type, sku_path, color_code, size_code)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            [(notified_at, *key) for key in keys],
+        )
+        conn.commit()
+
+
+def import_notifications(conn, path, hours, now=None):
+    """
+    Copy the notification log of another database (the previous run's
+    snapshot) into conn, back to `hours` ago: older entries can no longer
+    suppress anything.
+    """
+    cutoff = ((now or datetime.utcnow()) - timedelta(hours=hours)).isoformat()
+    return import_rows(conn, path, "uniqlo_notifications", "notified_at >= ?", (cutoff,))
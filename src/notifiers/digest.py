@@ -0,0 +1,127 @@
+from datetime import datetime, timedelta
+
+from src.scrapers.browser import SITE_URL
+
+# Telegram rejects sendMessage text longer than this
+TELEGRAM_MAX_CHARS = 4096
+
+DEFAULT_RANK_BY = "discount"
+DEFAULT_MAX_MESSAGES = 3
+
+
+# --------------------------------------------------
+# Config
+# --------------------------------------------------
+
+def digest_config(cfg):
+    """
+    Normalise a user's "digest" rule entry.
+
+    "digest": True                          -> every run, ranked by discount
+    "digest": {"rank_by": "price",          -> cheapest first
+               "hours": [8, 20],            -> only on runs in these UTC hours
+               "max_messages": 2}
+
+    Returns None for users who get one message per deal.
+    """
+    digest = cfg.get("digest")
+    if not digest:
+        return None
+    if digest is True:
+        digest = {}
+
+    return {
+        "rank_by": digest.get("rank_by", DEFAULT_RANK_BY),
+        "hours": set(digest["hours"]) if digest.get("hours") is not None else None,
+        "max_messages": digest.get("max_messages", DEFAULT_MAX_MESSAGES),
+    }
+
+
+def is_due(config, now=None):
+    now = now or datetime.utcnow()
+    return config["hours"] is None or now.hour in config["hours"]
+
+
+def next_due(config, now=None):
+    """Start of the next hour a digest may go out in (now if it is due)."""
+    now = now or datetime.utcnow()
+    if is_due(config, now) or not config["hours"]:
+        return now
+    hour = now.replace(minute=0, second=0, microsecond=0)
+    return next(
+        hour + timedelta(hours=h) for h in range(1, 25)
+        if (hour + timedelta(hours=h)).hour in config["hours"]
+    )
+
+
+# --------------------------------------------------
+# Rendering
+# --------------------------------------------------
+
+def deal_url(g):
+    """The deal on the site the scrapers read (UNIQLO_BASE_URL)."""
+    return f"{SITE_URL}{g['sku_path']}?colorDisplayCode={g['color_code']}"
+
+
+def rank(groups, rank_by=DEFAULT_RANK_BY):
+    if rank_by == "price":
+        return sorted(groups, key=lambda g: (g["sale"], -g["discount"]))
+    return sorted(groups, key=lambda g: (-g["discount"], g["sale"]))
+
+
+def render_entry(g):
+    sizes_text = ", ".join(sorted(g["sizes"]))
+    return (
+        f"• {g['product_name']} ({g['catalog'].upper()})\n"
+        f"  {g['color_label']} · {sizes_text}\n"
+        f"  £{g['sale']} (was £{g['original']}, -{g['discount']}%)\n"
+        f"  {deal_url(g)}"
+    )
+
+
+def render_digest(groups, rank_by=DEFAULT_RANK_BY, max_messages=DEFAULT_MAX_MESSAGES,
+                  limit=TELEGRAM_MAX_CHARS):
+    """
+    Pack (product, color) groups into as few messages as fit `limit` chars.
+
+    Deals are ranked first, so if they do not all fit in `max_messages`
+    the tail is dropped and the last message says how many were left out.
+
+    Returns [(text, groups in that message)] so callers only mark the
+    deals that were actually sent.
+    """
+    ranked = rank(groups, rank_by)
+    if not ranked:
+        return []
+
+    # leave room for the "(i/n)" header and the "…and N more" footer
+    header_room = 48
+    footer_room = 48
+    budget = limit - header_room - footer_room
+
+    chunks = [[]]
+    size = 0
+    for g in ranked:
+        entry = render_entry(g)[:budget]
+        extra = len(entry) + 2
+        if chunks[-1] and size + extra > budget:
+            if max_messages and len(chunks) == max_messages:
+                break
+            chunks.append([])
+            size = 0
+        chunks[-1].append((entry, g))
+        size += extra
+
+    shown = sum(len(c) for c in chunks)
+    messages = []
+    for i, chunk in enumerate(chunks, 1):
+        part = f" ({i}/{len(chunks)})" if len(chunks) > 1 else ""
+        text = (
+            f"🔥 UNIQLO DEALS — {len(ranked)} matches{part}\n\n"
+            + "\n\n".join(entry for entry, _ in chunk)
+        )
+        if i == len(chunks) and shown < len(ranked):
+            text += f"\n\n…and {len(ranked) - shown} more"
+        messages.append((text, [g for _, g in chunk]))
+
+    return messages
@@ -0,0 +1,162 @@
+from collections import defaultdict
+
+from src.notifiers.digest import digest_config
+
+# --------------------------------------------------
+# Inverted rule index
+# --------------------------------------------------
+
+def rule_signature(rule):
+    """
+    The residual conditions of a rule that the index keys cannot express.
+    None when the rule is unconditional (the common case).
+    """
+    product_ids = rule.get("product_ids")
+    signature = (
+        rule.get("max_price"),
+        rule.get("min_discount"),
+        frozenset(product_ids) if product_ids else None,
+    )
+    return None if signature == (None, None, None) else signature
+
+
+def _passes(signature, product_id, sale_price, discount_pct):
+    max_price, min_discount, product_ids = signature
+    if max_price is not None and (sale_price is None or sale_price > max_price):
+        return False
+    if min_discount is not None and (discount_pct is None or discount_pct < min_discount):
+        return False
+    if product_ids is not None and product_id not in product_ids:
+        return False
+    return True
+
+
+class RuleIndex:
+    """
+    Subscription rules compiled for lookup by event.
+
+    (event_type, catalog, size_label) -> color_label -> signature -> {users}
+
+    A rule without a sizes / colors list is stored under None. Users are
+    grouped by rule signature (max price, min discount, product watchlist),
+    so an event is checked once per distinct signature in its buckets, not
+    once per user, and the matching user sets are returned as-is instead
+    of being copied into a union.
+    """
+
+    def __init__(self, default_cooldown_hours=24, event_cooldown_hours=None):
+        self._index = defaultdict(lambda: defaultdict(lambda: defaultdict(set)))
+        self.channels = {}
+        self.default_cooldown_hours = default_cooldown_hours
+        self.event_cooldown_hours = event_cooldown_hours or {}
+        self.user_cooldown_hours = {}
+        self.digests = {}
+
+    def add_user(self, user, channels, cooldown_hours=None, digest=None):
+        """channels: [(kind, address)], e.g. [("telegram", "12345")]"""
+        self.channels[user] = list(channels)
+        if cooldown_hours is not None:
+            self.user_cooldown_hours[user] = cooldown_hours
+        if digest:
+            self.digests[user] = digest
+
+    def add(self, user, event_type, catalog, rule):
+        signature = rule_signature(rule)
+        for size in rule.get("sizes") or [None]:
+            bucket = self._index[(event_type, catalog, size)]
+            for color in rule.get("colors") or [None]:
+                bucket[color][signature].add(user)
+
+    def freeze(self):
+        """Drop the defaultdicts so lookups can never grow the index."""
+        self._index = {
+            key: {
+                color: {sig: frozenset(users) for sig, users in sigs.items()}
+                for color, sigs in bucket.items()
+            }
+            for key, bucket in self._index.items()
+        }
+        return self
+
+    def match_sets(self, event_type, catalog, size_label, color_label,
+                   product_id=None, sale_price=None, discount_pct=None):
+        """
+        Returns a list of user sets matching the event. A user may appear in
+        more than one set if two of their rules match; callers that need a
+        single set use match().
+        """
+        out = []
+        for size in (size_label, None):
+            bucket = self._index.get((event_type, catalog, size))
+            if not bucket:
+                continue
+            for color in (color_label, None):
+                sigs = bucket.get(color)
+                if not sigs:
+                    continue
+                for signature, users in sigs.items():
+                    if signature is None or _passes(signature, product_id, sale_price, discount_pct):
+                        out.append(users)
+        return out
+
+    def match(self, event_type, catalog, size_label, color_label,
+              product_id=None, sale_price=None, discount_pct=None):
+        return set().union(*self.match_sets(
+            event_type, catalog, size_label, color_label,
+            product_id, sale_price, discount_pct,
+        ))
+
+    def rules(self):
+        """
+        (user, event_type, catalog, size_label, color_label, signature) for
+        every indexed entry; None labels and signature are wildcards.
+        """
+        for (event_type, catalog, size), bucket in self._index.items():
+            for color, sigs in bucket.items():
+                for signature, users in sigs.items():
+                    for user in users:
+                        yield user, event_type, catalog, size, color, signature
+
+    def cooldown_hours(self, user, event_type):
+        """user per-event > user-wide > per-event default > global default"""
+        override = self.user_cooldown_hours.get(user)
+        if isinstance(override, dict) and event_type in override:
+            return override[event_type]
+        if isinstance(override, (int, float)):
+            return override
+        return self.event_cooldown_hours.get(event_type, self.default_cooldown_hours)
+
+    def longest_cooldown_hours(self):
+        """How far back the notification log can still suppress a message."""
+        hours = [self.default_cooldown_hours, *self.event_cooldown_hours.values()]
+        for override in self.user_cooldown_hours.values():
+            hours.extend(override.values() if isinstance(override, dict) else [override])
+        return max(hours)
+
+    def __len__(self):
+        return len(self.channels)
+
+
+def compile_rules(rules, default_cooldown_hours=24, event_cooldown_hours=None):
+    """
+    Build a RuleIndex from a USER_NOTIFICATION_RULES-shaped dict.
+
+    A user's destinations are "channels": [(kind, address)], or just their
+    Telegram "chat_id". Users with neither can never be notified and are
+    left out.
+    """
+    index = RuleIndex(default_cooldown_hours, event_cooldown_hours)
+
+    for user, cfg in rules.items():
+        channels = list(cfg.get("channels") or [])
+        if cfg.get("chat_id"):
+            channels.append(("telegram", cfg["chat_id"]))
+        if not channels:
+            continue
+
+        index.add_user(user, channels, cfg.get("cooldown_hours"), digest_config(cfg))
+        for event_type, catalogs in cfg.get("events", {}).items():
+            for catalog, rule in catalogs.items():
+                index.add(user, event_type, catalog, rule)
+
+    return index.freeze()
@@ -0,0 +1,123 @@
+from src.notifiers.digest import deal_url, render_digest
+
+# --------------------------------------------------
+# Rendered messages
+# --------------------------------------------------
+
+class Message:
+    """
+    One rendered notification, shared by every recipient and channel.
+
+    text    - Telegram body / plain-text email body
+    subject - email subject line
+    data    - structured form for webhooks
+    """
+
+    __slots__ = ("subject", "text", "data")
+
+    def __init__(self, subject, text, data):
+        self.subject = subject
+        self.text = text
+        self.data = data
+
+
+class SendFailure:
+    """
+    A failed delivery as returned by a channel's send_all(): falsy, with
+    the reason (exception text, HTTP status) kept for the outbox row.
+    """
+
+    __slots__ = ("error",)
+
+    def __init__(self, error):
+        self.error = error
+
+    def __bool__(self):
+        return False
+
+    def __repr__(self):
+        return f"SendFailure({self.error!r})"
+
+
+def _deal_data(g):
+    return {
+        "catalog": g["catalog"],
+        "event_type": g["event_type"],
+        "product_id": g["product_id"],
+        "product_name": g["product_name"],
+        "color_code": g["color_code"],
+        "color_label": g["color_label"],
+        "sizes": sorted(g["sizes"]),
+        "sale_price": g["sale"],
+        "original_price": g["original"],
+        "discount_pct": g["discount"],
+        "url": deal_url(g),
+    }
+
+
+def render_deal(g):
+    sizes_text = ", ".join(sorted(g["sizes"]))
+
+    text = (
+        "🔥 UNIQLO RARE DEEP DISCOUNT\n\n"
+        f"{g['catalog'].upper()}\n"
+        f"{g['product_name']}\n"
+        f"Color: {g['color_label']}\n"
+        f"Sizes: {sizes_text}\n\n"
+        f"£{g['sale']} (was £{g['original']}, -{g['discount']}%)\n\n"
+        f"{deal_url(g)}"
+    )
+
+    return Message(
+        subject=f"Uniqlo: {g['product_name']} -{g['discount']}% (£{g['sale']})",
+        text=text,
+        data={"type": "deal", "deals": [_deal_data(g)]},
+    )
+
+
+def group_key(g):
+    """Identity of a group as rendered: the deal plus the sizes in it."""
+    return (
+        g["catalog"],
+        g["event_type"],
+        g["product_id"],
+        g["color_code"],
+        g["sku_path"],
+        tuple(sorted(g["sizes"].items())),
+    )
+
+
+class MessageCache:
+    """
+    Renders each distinct deal (or digest) once per notify batch, however
+    many subscribers and channels it goes to.
+    """
+
+    def __init__(self):
+        self.messages = {}
+        self.renders = 0
+
+    def deal(self, g):
+        key = group_key(g)
+        if key not in self.messages:
+            self.messages[key] = render_deal(g)
+            self.renders += 1
+        return self.messages[key]
+
+    def digest(self, groups, rank_by, max_messages):
+        """Returns [(Message, groups in it)]."""
+        key = ("digest", rank_by, max_messages, tuple(sorted(group_key(g) for g in groups)))
+        if key not in self.messages:
+            self.messages[key] = [
+                (
+                    Message(
+                        subject=f"Uniqlo: {len(chunk)} deals",
+                        text=text,
+                        data={"type": "digest", "deals": [_deal_data(g) for g in chunk]},
+                    ),
+                    chunk,
+                )
+                for text, chunk in render_digest(groups, rank_by=rank_by, max_messages=max_messages)
+            ]
+            self.renders += 1
+        return self.messages[key]
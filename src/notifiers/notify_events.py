@@ -1,39 +1,22 @@
-import os
 import json
-import requests
 from collections import defaultdict
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
-from src.notifiers.rules import USER_NOTIFICATION_RULES
+from src.notifiers.cooldown import filter_cooled_down, record_notifications
+from src.notifiers.channels import configured_kinds
+from src.notifiers.digest import is_due, next_due
+from src.notifiers.messages import MessageCache
+from src.notifiers.outbox import enqueue, idempotency_key, take_held
+from src.notifiers.subscriptions import SubscriptionStore
 
 load_dotenv()
 
-BASE_DOMAIN = "https://www.uniqlo.com"
+SUBSCRIPTIONS = SubscriptionStore()
 
 
-def send_telegram_message(bot_token, chat_id: str, text: str):
-    requests.post(
-        f"https://api.telegram.org/bot{bot_token}/sendMessage",
-        json={
-            "chat_id": chat_id,
-            "text": text,
-            "disable_web_page_preview": True,
-        },
-        timeout=10,
-    ).raise_for_status()
-
-
-def notify(conn, log=print):
-    bot_token = os.getenv("TELEGRAM_BOT_TOKEN")
-    if not bot_token:
-        log("[NOTIFY] No TELEGRAM_BOT_TOKEN — skipping")
-        return
-
-    LOOKBACK_MINUTES = 60
-    since = (datetime.utcnow() - timedelta(minutes=LOOKBACK_MINUTES)).isoformat()
-
-    rows = conn.execute("""
+def load_events(conn, since):
+    return conn.execute("""
         SELECT
             event_time,
             catalog,
@@ -43,58 +26,118 @@ def notify(conn, log=print):
             source_variant_id,
             color_code,
             color_label,
+            size_code,
             size_label,
             event_value
         FROM uniqlo_events
         WHERE event_time >= ?
     """, (since,)).fetchall()
 
+
+def notify(conn, log=print):
+    LOOKBACK_MINUTES = 60
+    since = (datetime.utcnow() - timedelta(minutes=LOOKBACK_MINUTES)).isoformat()
+
+    rows = load_events(conn, since)
+
     log(f"[NOTIFY] Loaded {len(rows)} raw events")
 
-    for user, cfg in USER_NOTIFICATION_RULES.items():
-        chat_id = cfg.get("chat_id")
-        if not chat_id:
+    notify_events(conn, rows, log)
+
+    log("[NOTIFY] Notifications sent")
+
+
+def _queued(kind, address, groups, message):
+    """enqueue() entry for a message covering `groups`."""
+    key = idempotency_key(kind, address, [
+        (g["event_time"], g["event_type"], g["sku_path"], g["color_code"], size_code)
+        for g in groups
+        for size_code in g["sizes"].values()
+    ])
+    return key, kind, address, message
+
+
+def _merge_groups(groups):
+    """One group per deal; later groups win, their sizes are added."""
+    merged = {}
+    for g in groups:
+        key = (g["event_type"], g["sku_path"], g["color_code"])
+        if key in merged:
+            g = dict(g, sizes={**merged[key]["sizes"], **g["sizes"]})
+        merged[key] = g
+    return list(merged.values())
+
+
+def notify_events(conn, rows, log=print, index=None, mode="all"):
+    """
+    Match event rows (uniqlo_events column order) against user rules
+    and queue one message per (product, color) group and user channel
+    in uniqlo_outbox; delivery is src/notifiers/outbox.py's job.
+
+    Each distinct group is rendered once (MessageCache) and the same
+    Message is queued for every subscriber and channel it goes to.
+
+    Used both by the end-of-run notify() and by the inline pipeline,
+    which calls it with each variant's events as they are detected.
+
+    Rules come from the subscription tables through the compiled RuleIndex
+    (reloaded when they change) and each payload is decoded once, however
+    many users it matches.
+
+    Users with a "digest" rule get all their deals packed into a few
+    messages instead. mode="instant" skips them (the pipeline's per-variant
+    batches), mode="digest" handles only them (once at the end of a run).
+    A digest outside the user's hours is queued for the start of the next
+    one; later deals to the same address are folded into it until then.
+    """
+    # channels this process cannot deliver to (no TELEGRAM_BOT_TOKEN /
+    # SMTP_HOST) are skipped rather than queued forever
+    kinds = configured_kinds()
+
+    if index is None:
+        index = SUBSCRIPTIONS.get(conn)
+
+    # user -> (product, color) group -> group
+    grouped = defaultdict(lambda: defaultdict(lambda: {"sizes": {}}))
+
+    for (
+        event_time,
+        catalog,
+        event_type,
+        product_id,
+        sku_path,
+        _source_variant_id,
+        color_code,
+        color_label,
+        size_code,
+        size_label,
+        event_value
+    ) in rows:
+        payload = json.loads(event_value)
+
+        matches = index.match_sets(
+            event_type, catalog, size_label, color_label,
+            product_id, payload.get("sale_price"), payload.get("discount_pct"),
+        )
+        if not matches:
             continue
 
-        grouped = defaultdict(lambda: {"sizes": set()})
-
-        for (
-            _event_time,
+        key = (
             catalog,
             event_type,
             product_id,
-            sku_path,
-            _source_variant_id,
+            payload["product_name"],
             color_code,
             color_label,
-            size_label,
-            event_value
-        ) in rows:
-            rule = cfg.get("events", {}).get(event_type, {}).get(catalog)
-            if not rule:
-                continue
-
-            # size filter
-            if rule.get("sizes") and size_label not in rule["sizes"]:
-                continue
+            sku_path,
+        )
 
-            # color filter
-            if rule.get("colors") and color_label not in rule["colors"]:
+        for user in (u for users in matches for u in users):
+            is_digest = user in index.digests
+            if (mode == "instant" and is_digest) or (mode == "digest" and not is_digest):
                 continue
 
-            payload = json.loads(event_value)
-
-            key = (
-                catalog,
-                event_type,
-                product_id,
-                payload["product_name"],
-                color_code,
-                color_label,
-                sku_path,
-            )
-
-            g = grouped[key]
+            g = grouped[user][key]
             g.update({
                 "catalog": catalog,
                 "event_type": event_type,
@@ -106,51 +149,77 @@ def notify(conn, log=print):
                 "sale": payload["sale_price"],
                 "original": payload["original_price"],
                 "discount": payload["discount_pct"],
+                "event_time": max(event_time, g.get("event_time", event_time)),
             })
-            g["sizes"].add(size_label)
+            g["sizes"][size_label] = size_code
+
+    # fan out to every channel of every user: (user, kind, address, group)
+    targets = [
+        (user, kind, address, g)
+        for user, user_groups in grouped.items()
+        for kind, address in index.channels[user]
+        if kind in kinds
+        for g in user_groups.values()
+    ]
+
+    # cooldown: drop sizes already sent to this address within its window
+    fresh = filter_cooled_down(conn, (
+        (address, g["event_type"], g["sku_path"], g["color_code"], size_code,
+         index.cooldown_hours(user, g["event_type"]))
+        for user, _kind, address, g in targets
+        for size_code in g["sizes"].values()
+    ))
+
+    pending = defaultdict(list)
+    for user, kind, address, g in targets:
+        sizes = {
+            label: code
+            for label, code in g["sizes"].items()
+            if (address, g["event_type"], g["sku_path"], g["color_code"], code) in fresh
+        }
+        if sizes:
+            pending[(user, kind, address)].append(dict(g, sizes=sizes))
+
+    outgoing = []
+    held = []       # (not_before, (kind, address, groups, message))
+    cache = MessageCache()
+    now = datetime.utcnow()
+
+    for (user, kind, address), groups in pending.items():
+        digest = index.digests.get(user)
+        if digest:
+            groups = _merge_groups(take_held(conn, kind, address, now) + groups)
+            messages = cache.digest(groups, digest["rank_by"], digest["max_messages"])
+
+            if not is_due(digest, now):
+                not_before = next_due(digest, now)
+                log(f"[NOTIFY] {user}/{kind}: digest not due, holding {len(groups)} deals until {not_before:%H:00} UTC")
+                held.extend((not_before, (kind, address, chunk, m)) for m, chunk in messages)
+                continue
 
-        log(f"[NOTIFY] {user}: {len(grouped)} messages")
+            log(f"[NOTIFY] {user}/{kind}: {len(groups)} deals in {len(messages)} digest messages")
+            outgoing.extend((kind, address, chunk, m) for m, chunk in messages)
+            continue
 
-        for g in grouped.values():
-            if not g["sizes"]:
-                continue
+        log(f"[NOTIFY] {user}/{kind}: {len(groups)} messages")
+        outgoing.extend((kind, address, [g], cache.deal(g)) for g in groups)
+
+    if not outgoing and not held:
+        return
 
-            sizes_text = ", ".join(sorted(g["sizes"]))
-
-            url = (
-                f"{BASE_DOMAIN}{g['sku_path']}"
-                f"?colorDisplayCode={g['color_code']}"
-            )
-
-            text = (
-                "🔥 UNIQLO RARE DEEP DISCOUNT\n\n"
-                f"{g['catalog'].upper()}\n"
-                f"{g['product_name']}\n"
-                f"Color: {g['color_label']}\n"
-                f"Sizes: {sizes_text}\n\n"
-                f"£{g['sale']} (was £{g['original']}, -{g['discount']}%)\n\n"
-                f"{url}"
-            )
-
-            log(f"[NOTIFY] SENDING → {user} chat_id={chat_id}")
-            send_telegram_message(bot_token, chat_id, text)
-            log(f"[NOTIFY] SENT OK → {user}")
-
-            conn.execute(
-                """
-                INSERT OR REPLACE INTO uniqlo_notifications
-                (notified_at, chat_id, event_type, sku_path, size_code)
-                VALUES (?, ?, ?, ?, ?)
-                """,
-                (
-                    datetime.utcnow().isoformat(),
-                    chat_id,
-                    g["event_type"],
-                    g["sku_path"],
-                    "MULTI",
-                ),
-            )
-
-        conn.commit()
-
-    log("[NOTIFY] Notifications sent")
\ No newline at end of file
+    queued = enqueue(conn, [_queued(*o) for o in outgoing])
+    for not_before, message in held:
+        queued += enqueue(conn, [_queued(*message)], not_before=not_before, held_groups=message[2])
+    outgoing += [message for _, message in held]
+    log(
+        f"[NOTIFY] QUEUED {queued}/{len(outgoing)} messages "
+        f"({cache.renders} rendered{f', {len(held)} held' if held else ''})"
+    )
+
+    # the outbox guarantees delivery from here, so the cooldown starts now
+    record_notifications(conn, [
+        (address, g["event_type"], g["sku_path"], g["color_code"], size_code)
+        for _, address, groups, _ in outgoing
+        for g in groups
+        for size_code in g["sizes"].values()
+    ])
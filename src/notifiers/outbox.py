@@ -0,0 +1,327 @@
+import argparse
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from db.schema import import_rows
+from src import metrics
+from src.notifiers.channels import build_channels
+from src.notifiers.messages import Message, SendFailure
+
+load_dotenv()
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+DB_PATH = BASE_DIR / "db" / "uniqlo.sqlite"
+
+BATCH_SIZE = 200
+LEASE_SECONDS = 120
+MAX_ATTEMPTS = 8
+MAX_ERROR_CHARS = 500
+RETRY_BASE_SEC = 30
+RETRY_MAX_SEC = 3600
+
+
+# --------------------------------------------------
+# Enqueue (producers: notify_events)
+# --------------------------------------------------
+
+def idempotency_key(channel, address, event_keys):
+    """
+    Stable key for one message: the channel, the recipient and the
+    detected events it covers (event_time identifies the detection run).
+    Re-enqueueing the same detection is a no-op; the next run's detection
+    has a new event_time and is left to the cooldown to suppress.
+    """
+    h = hashlib.sha256(f"{channel}|{address}".encode())
+    for key in sorted(event_keys):
+        h.update(("|" + ":".join(map(str, key))).encode())
+    return h.hexdigest()
+
+
+def enqueue(conn, messages, not_before=None, held_groups=None):
+    """
+    messages: iterable of (idempotency_key, channel, address, Message).
+    Returns how many were new.
+
+    not_before delays delivery (a digest outside its hours); held_groups,
+    the digest's deals, lets take_held() fold it into a later digest to
+    the same address while it is still waiting.
+    """
+    now = datetime.utcnow().isoformat()
+    due = not_before.isoformat() if not_before else now
+    held = json.dumps(held_groups) if held_groups is not None else None
+    before = conn.total_changes
+
+    with metrics.timer("db_write_seconds", table="uniqlo_outbox"):
+        conn.executemany(
+            """
+            INSERT OR IGNORE INTO uniqlo_outbox
+            (idempotency_key, created_at, channel, address, text, subject, payload, next_attempt_at, held_groups)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            [
+                (key, now, channel, address, m.text, m.subject, json.dumps(m.data), due, held)
+                for key, channel, address, m in messages
+            ],
+        )
+        conn.commit()
+
+    return conn.total_changes - before
+
+
+def take_held(conn, channel, address, now=None):
+    """
+    Remove the digests still held for (channel, address) and return their
+    deals, so the next digest to that address goes out as one.
+    """
+    now = (now or datetime.utcnow()).isoformat()
+    rows = conn.execute("""
+        SELECT id, held_groups
+        FROM uniqlo_outbox
+        WHERE channel = ? AND address = ? AND status = 'pending'
+          AND held_groups IS NOT NULL AND next_attempt_at > ?
+    """, (channel, address, now)).fetchall()
+    if not rows:
+        return []
+
+    conn.executemany("DELETE FROM uniqlo_outbox WHERE id = ?", [(r[0],) for r in rows])
+    return [g for _, held in rows for g in json.loads(held)]
+
+
+def import_undelivered(conn, path):
+    """
+    Copy the messages another database (the previous run's snapshot) has
+    not delivered yet: pending ones, those waiting for a retry or for a
+    digest's hours, and 'sending' ones whose worker died (claim() takes
+    them again once the lease runs out). They get new ids here; the
+    idempotency key keeps a second import from duplicating them.
+    """
+    return import_rows(
+        conn, path, "uniqlo_outbox", "status IN ('pending', 'sending')", exclude=("id",),
+    )
+
+
+# --------------------------------------------------
+# Delivery (consumer)
+# --------------------------------------------------
+
+def claim(conn, limit=BATCH_SIZE, lease_seconds=LEASE_SECONDS, channels=None):
+    """
+    Lease up to `limit` due messages, optionally only for some channels.
+    A 'sending' row whose lease ran out (worker crashed mid-send) is due
+    again, which is what makes delivery at-least-once.
+    """
+    channels = sorted(channels) if channels is not None else None
+    channel_filter = (
+        f"AND channel IN ({', '.join('?' * len(channels))})" if channels is not None else ""
+    )
+    now = datetime.utcnow()
+    locked_until = (now + timedelta(seconds=lease_seconds)).isoformat()
+    now = now.isoformat()
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        rows = conn.execute(f"""
+            SELECT id, channel, address, text, subject, payload, attempts
+            FROM uniqlo_outbox
+            WHERE ((status = 'pending' AND next_attempt_at <= ?)
+                OR (status = 'sending' AND locked_until < ?))
+              {channel_filter}
+            ORDER BY id
+            LIMIT ?
+        """, (now, now, *(channels or ()), limit)).fetchall()
+
+        conn.executemany(
+            "UPDATE uniqlo_outbox SET status = 'sending', locked_until = ? WHERE id = ?",
+            [(locked_until, r[0]) for r in rows],
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    return rows
+
+
+def _error_text(result):
+    """last_error for a failed send: the channel's reason when it gave one."""
+    return str(getattr(result, "error", None) or "send failed")[:MAX_ERROR_CHARS]
+
+
+def _mark(conn, rows, results):
+    now = datetime.utcnow()
+    sent, retry, failed = [], [], []
+
+    for (msg_id, *_, attempts), ok in zip(rows, results):
+        attempts += 1
+        if ok:
+            sent.append((attempts, now.isoformat(), msg_id))
+        elif attempts >= MAX_ATTEMPTS:
+            failed.append((attempts, _error_text(ok), msg_id))
+        else:
+            delay = min(RETRY_MAX_SEC, RETRY_BASE_SEC * 2 ** (attempts - 1))
+            retry.append((attempts, (now + timedelta(seconds=delay)).isoformat(), _error_text(ok), msg_id))
+
+    conn.executemany("""
+        UPDATE uniqlo_outbox
+        SET status = 'sent', attempts = ?, sent_at = ?, locked_until = NULL, last_error = NULL
+        WHERE id = ?
+    """, sent)
+    conn.executemany("""
+        UPDATE uniqlo_outbox
+        SET status = 'pending', attempts = ?, next_attempt_at = ?, locked_until = NULL,
+            last_error = ?
+        WHERE id = ?
+    """, retry)
+    conn.executemany("""
+        UPDATE uniqlo_outbox
+        SET status = 'failed', attempts = ?, locked_until = NULL, last_error = ?
+        WHERE id = ?
+    """, failed)
+    conn.commit()
+
+    return len(sent), len(retry), len(failed)
+
+
+def _send(kind, channel, deliveries):
+    with metrics.timer("send_seconds", channel=kind):
+        return channel.send_all(deliveries)
+
+
+def deliver(conn, log=print, limit=BATCH_SIZE, channels=None):
+    """
+    Claim and send one batch. Returns the number of messages claimed.
+
+    Rows are grouped by channel and each backend sends its share in
+    parallel with the others, within its own concurrency limit. Rows for
+    channels this process is not configured for stay queued.
+    """
+    channels = channels if channels is not None else build_channels(log)
+
+    rows = claim(conn, limit, channels=channels.keys())
+    if not rows:
+        return 0
+
+    by_channel = {}
+    for i, (_id, channel, address, text, subject, payload, _attempts) in enumerate(rows):
+        message = Message(subject, text, json.loads(payload) if payload else {})
+        by_channel.setdefault(channel, []).append((i, address, message))
+
+    results = [SendFailure("not sent")] * len(rows)
+    with ThreadPoolExecutor(max_workers=len(by_channel)) as pool:
+        futures = {
+            kind: pool.submit(_send, kind, channels[kind], [(a, m) for _, a, m in items])
+            for kind, items in by_channel.items()
+        }
+        for kind, future in futures.items():
+            try:
+                sent = future.result()
+            except Exception as e:
+                log(f"[OUTBOX][WARN] {kind} backend failed: {e}")
+                for i, _, _ in by_channel[kind]:
+                    results[i] = SendFailure(f"{kind} backend failed: {e}")
+                continue
+            for (i, _, _), ok in zip(by_channel[kind], sent):
+                results[i] = ok
+
+    for (_id, channel, *_), ok in zip(rows, results):
+        metrics.incr("messages_total", channel=channel, status="sent" if ok else "failed")
+
+    ok, retry, failed = _mark(conn, rows, results)
+    log(f"[OUTBOX] delivered {ok}/{len(rows)} (retry {retry}, failed {failed})")
+
+    return len(rows)
+
+
+def drain(conn, log=print, channels=None):
+    """Deliver until nothing is due right now."""
+    channels = channels if channels is not None else build_channels(log)
+    total = 0
+    while True:
+        n = deliver(conn, log, channels=channels)
+        if not n:
+            return total
+        total += n
+
+
+def status(conn):
+    return conn.execute("""
+        SELECT status, COUNT(*), MIN(created_at), MAX(created_at)
+        FROM uniqlo_outbox
+        GROUP BY status
+        ORDER BY status
+    """).fetchall()
+
+
+class OutboxWorker(threading.Thread):
+    """
+    Background delivery loop on its own connection, so the scrape run can
+    enqueue and move on. Whatever it has not sent when stopped stays in
+    the outbox for the next worker.
+    """
+
+    def __init__(self, db_path, log=print, poll_interval=2.0):
+        super().__init__(name="outbox", daemon=True)
+        self.db_path = db_path
+        self.log = log
+        self.poll_interval = poll_interval
+        self.stopping = threading.Event()
+
+    def run(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        channels = build_channels(self.log)
+        try:
+            while not self.stopping.is_set():
+                try:
+                    n = deliver(conn, self.log, channels=channels)
+                except Exception as e:
+                    self.log(f"[OUTBOX][WARN] delivery loop error: {e}")
+                    n = 0
+                if not n:
+                    self.stopping.wait(self.poll_interval)
+        finally:
+            conn.close()
+
+    def stop(self, timeout=None):
+        self.stopping.set()
+        self.join(timeout)
+
+
+# --------------------------------------------------
+# CLI
+# --------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Deliver queued notifications")
+    parser.add_argument("--db", default=str(DB_PATH))
+    parser.add_argument("--loop", action="store_true", help="keep polling instead of draining once")
+    parser.add_argument("--poll-interval", type=float, default=5.0)
+    parser.add_argument("--status", action="store_true", help="print outbox counts and exit")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db, timeout=30)
+
+    if args.status:
+        for row in status(conn):
+            print(row)
+        return
+
+    if not args.loop:
+        print(f"[OUTBOX] drained {drain(conn)} messages")
+        return
+
+    channels = build_channels()
+    while True:
+        if not deliver(conn, channels=channels):
+            time.sleep(args.poll_interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,22 @@ import os
 from dotenv import load_dotenv
 load_dotenv()
 
+# Hours before the same SKU is sent to the same chat again.
+# A user can override with "cooldown_hours": <hours> or
+# "cooldown_hours": {"<EVENT_TYPE>": <hours>}.
+DEFAULT_COOLDOWN_HOURS = 24
+EVENT_COOLDOWN_HOURS = {
+    "RARE_DEEP_DISCOUNT": 24,
+}
+
+# Seed data: on a DB with no subscribers these are imported into
+# uniqlo_users / uniqlo_channels / uniqlo_rules, which are the source of
+# truth from then on (python -m src.notifiers.subscriptions).
+#
+# A user with "digest": True (or {"rank_by": "price", "hours": [8, 20]})
+# gets all matching deals of a run packed into a few messages instead of
+# one message per deal. See src/notifiers/digest.py.
+
 USER_NOTIFICATION_RULES = {
     "burak": {
         "chat_id": os.getenv("TELEGRAM_CHAT_ID_BURAK"),
@@ -0,0 +1,249 @@
+import argparse
+import json
+import sqlite3
+from pathlib import Path
+
+from db.schema import import_rows
+from src.notifiers.digest import digest_config
+from src.notifiers.matcher import RuleIndex
+from src.notifiers.rules import (
+    DEFAULT_COOLDOWN_HOURS,
+    EVENT_COOLDOWN_HOURS,
+    USER_NOTIFICATION_RULES,
+)
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+DB_PATH = BASE_DIR / "db" / "uniqlo.sqlite"
+
+
+def _json(value):
+    return None if value is None else json.dumps(value)
+
+
+def _load(value):
+    return None if value is None else json.loads(value)
+
+
+# --------------------------------------------------
+# Writing
+# --------------------------------------------------
+
+def add_user(conn, user_id, channels=(), cooldown_hours=None, digest=None):
+    """channels: iterable of (kind, address)"""
+    conn.execute(
+        """
+        INSERT OR REPLACE INTO uniqlo_users (user_id, cooldown_hours, digest)
+        VALUES (?, ?, ?)
+        """,
+        (user_id, _json(cooldown_hours), _json(digest)),
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO uniqlo_channels (user_id, kind, address) VALUES (?, ?, ?)",
+        [(user_id, kind, address) for kind, address in channels],
+    )
+
+
+def add_rule(conn, user_id, event_type, catalog, sizes=None, colors=None,
+             max_price=None, min_discount=None, product_ids=None):
+    conn.execute(
+        """
+        INSERT INTO uniqlo_rules
+        (user_id, event_type, catalog, sizes, colors, max_price, min_discount, product_ids)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (user_id, event_type, catalog, _json(sizes), _json(colors),
+         max_price, min_discount, _json(product_ids)),
+    )
+
+
+def seed_from_rules(conn, rules=USER_NOTIFICATION_RULES, log=print):
+    """
+    One-time import of the hard-coded rules.py dict. Does nothing once
+    uniqlo_users has any rows; from then on the tables are the source.
+    """
+    if conn.execute("SELECT 1 FROM uniqlo_users LIMIT 1").fetchone():
+        return 0
+
+    for user, cfg in rules.items():
+        channels = list(cfg.get("channels") or [])
+        if cfg.get("chat_id"):
+            channels.append(("telegram", cfg["chat_id"]))
+        add_user(conn, user, channels, cfg.get("cooldown_hours"), cfg.get("digest"))
+
+        for event_type, catalogs in cfg.get("events", {}).items():
+            for catalog, rule in catalogs.items():
+                add_rule(
+                    conn, user, event_type, catalog,
+                    sizes=rule.get("sizes"),
+                    colors=rule.get("colors"),
+                    max_price=rule.get("max_price"),
+                    min_discount=rule.get("min_discount"),
+                    product_ids=rule.get("product_ids"),
+                )
+
+    conn.commit()
+    log(f"[SUBS] Seeded {len(rules)} users from rules.py")
+    return len(rules)
+
+
+def import_subscriptions(conn, path, log=print):
+    """
+    Copy users, channels and rules from another database (the previous
+    run's snapshot), so changes made through the CLI outlive a rebuilt
+    database. Skipped when conn already has users: they are the source.
+    """
+    if conn.execute("SELECT 1 FROM uniqlo_users LIMIT 1").fetchone():
+        log("[SUBS] users already present, not importing")
+        return 0
+
+    users = import_rows(conn, path, "uniqlo_users")
+    import_rows(conn, path, "uniqlo_channels")
+    import_rows(conn, path, "uniqlo_rules")
+    return users
+
+
+# --------------------------------------------------
+# Loading
+# --------------------------------------------------
+
+def subscriptions_version(conn):
+    return conn.execute("SELECT version FROM uniqlo_subscriptions_version").fetchone()[0]
+
+
+def load_index(conn):
+    """Compile all active users, channels and rules into a RuleIndex."""
+    index = RuleIndex(DEFAULT_COOLDOWN_HOURS, EVENT_COOLDOWN_HOURS)
+
+    channels = {}
+    for user_id, kind, address in conn.execute("""
+        SELECT user_id, kind, address
+        FROM uniqlo_channels
+        WHERE active = 1
+        ORDER BY user_id, kind, address
+    """):
+        channels.setdefault(user_id, []).append((kind, address))
+
+    for user_id, cooldown_hours, digest in conn.execute("""
+        SELECT user_id, cooldown_hours, digest
+        FROM uniqlo_users
+        WHERE active = 1
+    """):
+        if user_id not in channels:
+            continue
+        index.add_user(
+            user_id,
+            channels[user_id],
+            _load(cooldown_hours),
+            digest_config({"digest": _load(digest)}),
+        )
+
+    for user_id, event_type, catalog, sizes, colors, max_price, min_discount, product_ids in conn.execute("""
+        SELECT user_id, event_type, catalog, sizes, colors, max_price, min_discount, product_ids
+        FROM uniqlo_rules
+        WHERE active = 1
+    """):
+        if user_id not in index.channels:
+            continue
+        index.add(user_id, event_type, catalog, {
+            "sizes": _load(sizes),
+            "colors": _load(colors),
+            "max_price": max_price,
+            "min_discount": min_discount,
+            "product_ids": _load(product_ids),
+        })
+
+    return index.freeze()
+
+
+class SubscriptionStore:
+    """
+    Keeps the compiled matcher and rebuilds it when the subscription tables
+    change. The check is a single-row read of uniqlo_subscriptions_version,
+    cheap enough to do on every notify batch.
+    """
+
+    def __init__(self, log=print):
+        self.log = log
+        self.version = None
+        self.index = None
+
+    def get(self, conn):
+        version = subscriptions_version(conn)
+        if version != self.version:
+            self.index = load_index(conn)
+            self.version = version
+            self.log(f"[SUBS] Loaded {len(self.index)} subscribers (version {version})")
+        return self.index
+
+
+# --------------------------------------------------
+# CLI
+# --------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage notification subscriptions")
+    parser.add_argument("--db", default=str(DB_PATH))
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    sub.add_parser("seed", help="import rules.py if no users exist yet")
+    sub.add_parser("list", help="print users and rules")
+
+    user = sub.add_parser("add-user")
+    user.add_argument("user_id")
+    user.add_argument("--telegram", help="chat id")
+    user.add_argument("--webhook", help="URL")
+    user.add_argument("--email", help="address")
+    user.add_argument("--cooldown-hours", type=float)
+    user.add_argument("--digest", action="store_true")
+
+    rule = sub.add_parser("add-rule")
+    rule.add_argument("user_id")
+    rule.add_argument("catalog")
+    rule.add_argument("--event-type", default="RARE_DEEP_DISCOUNT")
+    rule.add_argument("--sizes", nargs="+")
+    rule.add_argument("--colors", nargs="+")
+    rule.add_argument("--max-price", type=float)
+    rule.add_argument("--min-discount", type=float)
+    rule.add_argument("--products", nargs="+", help="product ids to watch")
+
+    args = parser.parse_args()
+
+    from db.schema import init_subscriptions
+
+    conn = sqlite3.connect(args.db)
+    init_subscriptions(conn)
+
+    if args.cmd == "seed":
+        seed_from_rules(conn)
+    elif args.cmd == "list":
+        for row in conn.execute("SELECT * FROM uniqlo_users"):
+            print(row)
+        for row in conn.execute("SELECT * FROM uniqlo_rules"):
+            print(row)
+    elif args.cmd == "add-user":
+        channels = [
+            (kind, address)
+            for kind, address in (
+                ("telegram", args.telegram),
+                ("webhook", args.webhook),
+                ("email", args.email),
+            )
+            if address
+        ]
+        add_user(conn, args.user_id, channels, args.cooldown_hours, True if args.digest else None)
+    elif args.cmd == "add-rule":
+        add_rule(
+            conn, args.user_id, args.event_type, args.catalog,
+            sizes=args.sizes,
+            colors=args.colors,
+            max_price=args.max_price,
+            min_discount=args.min_discount,
+            product_ids=args.products,
+        )
+
+    conn.commit()
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.notifiers.messages import SendFailure
+
+# Overridable so tests can point the sender at a local stand-in server
+TELEGRAM_API_BASE = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org")
+
+# Telegram: ~30 msg/s per bot overall, ~1 msg/s per chat
+GLOBAL_RATE_PER_SEC = 30
+PER_CHAT_INTERVAL_SEC = 1.0
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE_SEC = 0.5
+BACKOFF_MAX_SEC = 30
+
+
+# --------------------------------------------------
+# Rate limiting
+# --------------------------------------------------
+
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity,
+                    self.tokens + (now - self.updated) * self.rate,
+                )
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class ChatLimiter:
+    """Spaces consecutive messages to the same chat by `interval` seconds."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.locks = {}
+        self.last_sent = {}
+
+    async def acquire(self, chat_id):
+        lock = self.locks.setdefault(chat_id, asyncio.Lock())
+        await lock.acquire()
+
+        wait = self.last_sent.get(chat_id, 0) + self.interval - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def release(self, chat_id):
+        self.last_sent[chat_id] = time.monotonic()
+        self.locks[chat_id].release()
+
+
+# --------------------------------------------------
+# Sender
+# --------------------------------------------------
+
+class TelegramSender:
+    """
+    Concurrent sendMessage client.
+
+    - one pooled requests.Session shared by a bounded thread pool
+    - a global token bucket plus per-chat spacing
+    - retries with exponential backoff; 429s wait for the server's retry_after
+
+    send() never raises: a failed message is logged and reported as a
+    (falsy) SendFailure so one bad chat cannot abort a fan-out.
+
+    The limits hold across send_all() calls: keep one sender for as long
+    as messages go out, not one per batch.
+    """
+
+    def __init__(
+        self,
+        bot_token,
+        api_base=None,
+        rate=GLOBAL_RATE_PER_SEC,
+        per_chat_interval=PER_CHAT_INTERVAL_SEC,
+        max_attempts=MAX_ATTEMPTS,
+        pool_size=16,
+        log=print,
+    ):
+        self.url = f"{api_base or TELEGRAM_API_BASE}/bot{bot_token}/sendMessage"
+        self.rate = rate
+        self.per_chat_interval = per_chat_interval
+        self.max_attempts = max_attempts
+        self.pool_size = pool_size
+        self.log = log
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="telegram")
+
+        # the limiters' locks belong to one event loop, so every batch runs on this one
+        self.loop = asyncio.new_event_loop()
+        self.running = threading.Lock()
+        self.bucket = TokenBucket(rate)
+        self.chats = ChatLimiter(per_chat_interval)
+
+    def _post(self, chat_id, text):
+        return self.session.post(
+            self.url,
+            json={
+                "chat_id": chat_id,
+                "text": text,
+                "disable_web_page_preview": True,
+            },
+            timeout=10,
+        )
+
+    async def send(self, chat_id, text, bucket, chats):
+        loop = asyncio.get_running_loop()
+
+        for attempt in range(1, self.max_attempts + 1):
+            await chats.acquire(chat_id)
+            try:
+                await bucket.acquire()
+                resp = await loop.run_in_executor(self.executor, self._post, chat_id, text)
+            except requests.RequestException as e:
+                resp, error = None, str(e)
+            finally:
+                chats.release(chat_id)
+
+            if resp is not None:
+                if resp.ok:
+                    return True
+
+                error = f"HTTP {resp.status_code}: {resp.text[:200]}"
+
+                if resp.status_code == 429:
+                    try:
+                        retry_after = resp.json()["parameters"]["retry_after"]
+                    except (ValueError, KeyError, TypeError):
+                        retry_after = None
+                    if retry_after is not None:
+                        self.log(f"[TELEGRAM] 429 for chat_id={chat_id}, retry after {retry_after}s")
+                        await asyncio.sleep(retry_after)
+                        continue
+                elif resp.status_code < 500:
+                    # bad request, blocked bot, unknown chat: retrying will not help
+                    break
+
+            if attempt < self.max_attempts:
+                delay = min(BACKOFF_MAX_SEC, BACKOFF_BASE_SEC * 2 ** (attempt - 1))
+                await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+
+        self.log(f"[TELEGRAM][FAIL] chat_id={chat_id}: {error}")
+        return SendFailure(error)
+
+    async def send_many(self, messages):
+        """
+        messages: iterable of (chat_id, text).
+        Returns True or a SendFailure per message, in order.
+        """
+        return await asyncio.gather(*(
+            self.send(chat_id, text, self.bucket, self.chats)
+            for chat_id, text in messages
+        ))
+
+    def send_all(self, messages):
+        """Blocking wrapper around send_many() for synchronous callers."""
+        messages = list(messages)
+        if not messages:
+            return []
+        with self.running:
+            return self.loop.run_until_complete(self.send_many(messages))
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.session.close()
+        self.loop.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
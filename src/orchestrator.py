@@ -1,13 +1,23 @@
+import argparse
+import os
 import sqlite3
 import uuid
 from pathlib import Path
 from datetime import datetime
 
 from db.schema import init_db, assert_schema
-from src.scrapers.scrape_sku_state import scrape_sku_state
-from src.events.rare_deep_discount import detect
-from src.notifiers.notify_events import notify
-from src.scrapers.catalog_scraper import scrape_catalog
+from src import metrics
+from src.deadline import Deadline
+from src.scrapers.scrape_sku_state import INSERT_SKU_STATE_SQL, PREFETCH, iter_sku_rows
+from src.events.rare_deep_discount import DeepDiscountDetector
+from src.runs import import_runs, record_run, run_row
+from src.pipeline import EventStream, NotifierWorker, run_pipeline
+from src.notifiers.outbox import OutboxWorker
+from src.notifiers.subscriptions import seed_from_rules
+from src.scrapers.catalog_scraper import INSERT_VARIANT_SQL, iter_catalog_variants, scrape_catalog
+from src.scrapers.politeness import PolitenessController
+from src.scrapers.scheduler import VariantScheduler
+from src.scrapers.shards import merge_shards
 from dotenv import load_dotenv
 load_dotenv()
 from db.schema import reset_events_table
@@ -15,6 +25,10 @@ from db.schema import reset_events_table
 BASE_DIR = Path(__file__).resolve().parents[1]
 DB_PATH = BASE_DIR / "db" / "uniqlo.sqlite"
 
+DETECTORS = [
+    DeepDiscountDetector(),
+]
+
 def log(msg: str):
     print(f"[{datetime.utcnow().isoformat()}] {msg}", flush=True)
 
@@ -29,79 +43,166 @@ def persist_catalog(df, conn):
         index=False,
     )
 
+def get_max_variants():
+    if os.getenv("APP_ENV", "dev").lower() == "prod":
+        return None
+    return int(os.getenv("MAX_VARIANTS_DEV", 2000))
+
+def scrape_pipelined(conn, stream, deadline=None):
+    """Catalog discovery feeds SKU workers through a bounded queue;
+    rows are persisted, detected and notified here as they arrive.
+    Past the deadline workers take no new variants and discovery stops."""
+    deadline = deadline or Deadline()
+    conn.execute("DELETE FROM uniqlo_sale_variants")
+    conn.commit()
+    observed_at = datetime.utcnow().isoformat()
+
+    def on_variant(row):
+        conn.execute(INSERT_VARIANT_SQL, row)
+
+    def on_rows(rows):
+        with metrics.timer("db_write_seconds", table="uniqlo_sku_state"):
+            conn.executemany(INSERT_SKU_STATE_SQL, rows)
+            conn.commit()
+        stream(rows)
+
+    # variants stream in discovery order; the scheduler lets workers pick
+    # the most valuable one waiting in the queue. Under a budget the whole
+    # catalog is discovered first and the budget goes to the planned
+    # variants, as in the sharded sku stage (scrape_sku_state.load_variants)
+    scheduler = VariantScheduler.from_db(conn)
+
+    def plan(rows, budget):
+        planned = scheduler.plan([row[2:] for row in rows], budget)
+        log(f"[SCHED] {len(planned)}/{len(rows)} variants scheduled")
+        return planned
+
+    # SKU_WORKERS is the ceiling; the controller decides how many of them
+    # may have a request in flight, and how far apart requests start
+    # (with SKU_PREFETCH a worker can have two)
+    workers = int(os.getenv("SKU_WORKERS", 2))
+    controller = PolitenessController.from_env(max_concurrency=workers * (2 if PREFETCH else 1), log=log)
+
+    run_pipeline(
+        # discovery only needs to stop at the reserve itself
+        discover=lambda: deadline.take(iter_catalog_variants(log, controller), need=0),
+        scrape=lambda variants: iter_sku_rows(variants, observed_at, log, controller=controller, deadline=deadline),
+        on_variant=on_variant,
+        on_rows=on_rows,
+        workers=workers,
+        queue_size=int(os.getenv("PIPELINE_QUEUE_SIZE", 32)),
+        max_variants=get_max_variants(),
+        priority=lambda row: scheduler.score(row[2:]),
+        plan=plan,
+        log=log,
+    )
+    log(f"[POLITE] final: {controller.summary()}")
+    metrics.incr("polite_adjustments_total", controller.decisions)
+    conn.commit()
+    log(
+        conn.execute("""
+            SELECT catalog, COUNT(*)
+            FROM uniqlo_sale_variants
+            GROUP BY catalog
+        """).fetchall()
+    )
+
 def main():
-    log(f"USING DB FILE: {DB_PATH.resolve()}")
-    log("START orchestrator")
-
-    conn = sqlite3.connect(DB_PATH)
-    init_db(conn)
-    assert_schema(conn)
-    log("Resetting events table")
-    reset_events_table(conn)
+    parser = argparse.ArgumentParser(description="Scrape, detect and notify")
+    parser.add_argument(
+        "--stage",
+        choices=["all", "catalog", "merge"],
+        default="all",
+        help=(
+            "all: one process does everything; "
+            "catalog: only discover variants (sharded runs then use "
+            "`python -m src.scrapers.scrape_sku_state --shard i/N`); "
+            "merge: combine shard databases, then detect and notify"
+        ),
+    )
+    parser.add_argument("--shards", nargs="+", default=[], help="shard databases for --stage merge")
+    parser.add_argument(
+        "--allow-missing", action="store_true",
+        help="merge what the shards that finished scraped when one is missing or did not finish, with a warning",
+    )
+    parser.add_argument("--db", type=Path, default=DB_PATH)
+    parser.add_argument(
+        "--time-budget", type=float, metavar="MINUTES",
+        help="stop scraping in time to detect and notify within this (default TIME_BUDGET_MIN)",
+    )
+    args = parser.parse_args()
+    deadline = Deadline.from_env(args.time_budget, log=log)
+
+    log(f"USING DB FILE: {args.db.resolve()}")
+    log(f"START orchestrator ({args.stage})")
+    metrics.METRICS.reset()
+    run_id = uuid.uuid4().hex
+    started_at = datetime.utcnow().isoformat()
+    status = "failed"
+
+    try:
+        run(args, deadline)
+        status = deadline.status
+    finally:
+        report = metrics.write_reports(f"run-{args.stage}", run_id=run_id, stage=args.stage, status=status)
+        log(f"Run report written to {metrics.METRICS_DIR} ({report['wall_seconds']:.1f}s)")
+
+        conn = sqlite3.connect(args.db)
+        record_run(conn, run_row(run_id, args.stage, started_at, datetime.utcnow().isoformat(), status))
+        conn.close()
+        log("END orchestrator")
+
+def run(args, deadline=None):
+    with metrics.timer("stage_seconds", stage="init"):
+        conn = sqlite3.connect(args.db)
+        init_db(conn)
+        assert_schema(conn)
+        log("Resetting events table")
+        reset_events_table(conn)
+        seed_from_rules(conn, log=log)
     log("DB initialized")
 
-    # 1. Scrape catalog (PURE)
-    log("Scraping catalog")
-    scrape_catalog(conn, log)
-
-    # 2. Scrape SKU availability
-    log("Scraping SKU availability")
-    import os
-    def get_max_variants():
-        if os.getenv("APP_ENV", "dev").lower() == "prod":
-            return None
-        return int(os.getenv("MAX_VARIANTS_DEV", 2000))
-
-    scrape_sku_state(conn, log, max_variants=get_max_variants())
-    log("SKU availability scraped")
-
-    # 3. Detect events
-    log("Detecting events")
-    events = detect(conn)
-    # events = [(
-    #     datetime.utcnow().isoformat(),
-    #     "men",
-    #     "RARE_DEEP_DISCOUNT",
-    #     "TEST123",
-    #     "/uk/en/products/E000000-000/00",
-    #     "VARIANT123",
-    #     "09",
-    #     "BLACK",
-    #     "XL",
-    #     "XL",
-    #     '{"product_name":"Test Product","sale_price":9.99,"original_price":39.99,"discount_pct":75}'
-    # )]
-    log(f"Events detected: {len(events)}")
-
-    if events:
-        conn.executemany("""
-                         INSERT INTO uniqlo_events (event_time,
-                                                    catalog,
-                                                    event_type,
-                                                    product_id,
-                                                    sku_path,
-                                                    source_variant_id,
-                                                    color_code,
-                                                    color_label,
-                                                    size_code,
-                                                    size_label,
-                                                    event_value)
-                         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                         """, events)
-
-        print(
-            "rows_on_disk:",
-            conn.execute("SELECT COUNT(*) FROM uniqlo_events").fetchone()
-        )
-        conn.commit()
-
-    # 4. Notify
-    log("Notifying")
-    notify(conn)
-    log("Notifications done")
+    if args.stage == "catalog":
+        log("Scraping catalog")
+        with metrics.timer("stage_seconds", stage="catalog"):
+            scrape_catalog(conn, log)
+        conn.close()
+        return
+
+    notifier = NotifierWorker(args.db, log)
+    notifier.start()
+    outbox = OutboxWorker(args.db, log)
+    outbox.start()
+    stream = EventStream(conn, DETECTORS, sink=notifier.submit, log=log)
+
+    try:
+        if args.stage == "merge":
+            # 1+2. Shards were scraped by separate jobs; detect on the merged rows
+            log(f"Merging {len(args.shards)} shards")
+            with metrics.timer("stage_seconds", stage="merge"):
+                rows = merge_shards(conn, args.shards, log=log, allow_missing=args.allow_missing)
+            for path in args.shards:
+                import_runs(conn, path)
+            with metrics.timer("stage_seconds", stage="detect"):
+                if rows:
+                    stream(rows)
+        else:
+            # 1+2. Scrape catalog and SKU availability, detecting per variant
+            log("Scraping catalog and SKU availability")
+            with metrics.timer("stage_seconds", stage="scrape"):
+                scrape_pipelined(conn, stream, deadline)
+        log("SKU availability scraped")
+        log(f"Events detected: {stream.emitted}")
+    finally:
+        # 3. Queue whatever the notifier has not matched yet; anything the
+        #    outbox worker has not delivered is left for `python -m src.notifiers.outbox`
+        log("Notifying")
+        with metrics.timer("stage_seconds", stage="notify"):
+            notifier.close()
+            outbox.stop()
+        log("Notifications queued")
 
     conn.close()
-    log("END orchestrator")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
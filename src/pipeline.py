@@ -0,0 +1,374 @@
+import queue
+import sqlite3
+import threading
+import time
+
+from db.schema import SKU_STATE_COLUMNS
+from src import metrics
+from src.notifiers.notify_events import notify_events
+
+# --------------------------------------------------
+# Inline detection
+# --------------------------------------------------
+
+VARIANT_ID = SKU_STATE_COLUMNS.index("source_variant_id")
+
+INSERT_EVENTS_SQL = """
+    INSERT INTO uniqlo_events (event_time,
+                               catalog,
+                               event_type,
+                               product_id,
+                               sku_path,
+                               source_variant_id,
+                               color_code,
+                               color_label,
+                               size_code,
+                               size_label,
+                               event_value)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+class EventStream:
+    """
+    Subscribes detectors to the SKU scraper's row stream.
+
+    Pass an instance as scrape_sku_state(on_rows=...): every variant's rows
+    go through each detector's detect_rows(), resulting events are written
+    to uniqlo_events and handed to sink (typically NotifierWorker.submit).
+    """
+
+    def __init__(self, conn, detectors, sink=None, log=print):
+        self.conn = conn
+        self.detectors = detectors
+        self.sink = sink
+        self.log = log
+        self.emitted = 0
+
+    def __call__(self, rows):
+        events = []
+        for detector in self.detectors:
+            try:
+                with metrics.timer("detect_seconds", event_type=detector.event_type):
+                    events.extend(detector.detect_rows(rows))
+            except Exception as e:
+                self.log(f"[DETECT][WARN] {detector.event_type} failed: {e}")
+
+        if not events:
+            return []
+
+        with metrics.timer("db_write_seconds", table="uniqlo_events"):
+            self.conn.executemany(INSERT_EVENTS_SQL, events)
+            self.conn.commit()
+        self.emitted += len(events)
+        metrics.incr("events_total", len(events))
+        self.log(f"[DETECT] {len(events)} events from {rows[0][VARIANT_ID]}")
+
+        if self.sink:
+            self.sink(events)
+
+        return events
+
+
+# --------------------------------------------------
+# Continuous notification
+# --------------------------------------------------
+
+_STOP = object()
+
+
+class NotifierWorker(threading.Thread):
+    """
+    Drains detected events and notifies users while scraping continues.
+
+    Runs on its own SQLite connection (sqlite3 connections are not shared
+    across threads). Events that arrive while a send is in flight are
+    batched into the next notify_events() call.
+
+    Digest subscribers are skipped per batch and sent one digest covering
+    the whole run when the worker is closed.
+    """
+
+    def __init__(self, db_path, log=print):
+        super().__init__(name="notifier", daemon=True)
+        self.db_path = db_path
+        self.log = log
+        self.queue = queue.Queue()
+        self.seen = []
+
+    def submit(self, events):
+        self.queue.put(events)
+
+    def run(self):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            while True:
+                item = self.queue.get()
+                if item is _STOP:
+                    break
+
+                batch = list(item)
+                stop = False
+                while True:
+                    try:
+                        more = self.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if more is _STOP:
+                        stop = True
+                        break
+                    batch.extend(more)
+
+                self.seen.extend(batch)
+                try:
+                    with metrics.timer("notify_seconds", mode="instant"):
+                        notify_events(conn, batch, self.log, mode="instant")
+                except Exception as e:
+                    self.log(f"[NOTIFY][WARN] batch of {len(batch)} events failed: {e}")
+
+                if stop:
+                    break
+
+            if self.seen:
+                try:
+                    with metrics.timer("notify_seconds", mode="digest"):
+                        notify_events(conn, self.seen, self.log, mode="digest")
+                except Exception as e:
+                    self.log(f"[NOTIFY][WARN] digest of {len(self.seen)} events failed: {e}")
+        finally:
+            conn.close()
+
+    def close(self):
+        """Send everything still queued, then stop."""
+        self.queue.put(_STOP)
+        self.join()
+
+
+# --------------------------------------------------
+# Pipelined scrape
+#
+#   catalog producer --variants--> SKU workers --rows--> writer (caller)
+#
+# Both queues are bounded: a fast catalog scroll blocks once SKU workers
+# fall `queue_size` variants behind, and workers block if the writer
+# (SQLite + detection) cannot keep up. Each stage owns its own browser;
+# only the writer touches the caller's connection.
+# --------------------------------------------------
+
+class StageStats:
+    """
+    busy    - seconds spent doing the stage's own work (for SKU workers
+              this includes handing rows to the writer)
+    blocked - seconds waiting to hand items downstream (backpressure)
+    starved - seconds waiting for input from upstream
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0
+        self.blocked = 0.0
+        self.starved = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, items=0, busy=0.0, blocked=0.0, starved=0.0):
+        with self.lock:
+            self.items += items
+            self.busy += busy
+            self.blocked += blocked
+            self.starved += starved
+
+    def summary(self, wall):
+        rate = self.items / wall if wall else 0.0
+        return (
+            f"{self.name}: {self.items} items in {wall:.1f}s ({rate:.2f}/s), "
+            f"busy {self.busy:.1f}s, blocked {self.blocked:.1f}s, "
+            f"starved {self.starved:.1f}s"
+        )
+
+
+_DONE = object()
+
+
+class _Aborted(Exception):
+    pass
+
+
+def _put(q, item, stats, abort):
+    """Blocking put that gives up once the pipeline is aborted."""
+    start = time.perf_counter()
+    try:
+        while True:
+            if abort.is_set():
+                raise _Aborted()
+            try:
+                q.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                pass
+    finally:
+        stats.add(blocked=time.perf_counter() - start)
+
+
+def _drain(q, stats, abort):
+    """
+    Iterate a (priority, seq, item) queue until _DONE, timing each item's
+    work as busy.
+    """
+    while True:
+        start = time.perf_counter()
+        while True:
+            if abort.is_set():
+                return
+            try:
+                _, _, item = q.get(timeout=0.5)
+                break
+            except queue.Empty:
+                pass
+        stats.add(starved=time.perf_counter() - start)
+
+        if item is _DONE:
+            return
+
+        start = time.perf_counter()
+        yield item
+        stats.add(items=1, busy=time.perf_counter() - start)
+
+
+def run_pipeline(discover, scrape, on_variant, on_rows,
+                 workers=2, queue_size=32, max_variants=None, priority=None, plan=None, log=print):
+    """
+    Overlap catalog discovery, SKU scraping and persistence.
+
+    discover()          - iterable of uniqlo_sale_variants rows (producer)
+    scrape(variants)    - iterable of per-variant SKU row lists; called once
+                          per worker thread with that worker's share
+    on_variant(row)     - writer callback per discovered variant
+    on_rows(rows)       - writer callback per scraped variant
+    priority(row)       - optional score; workers take the best variant
+                          waiting in the queue first (within queue_size)
+    plan(rows, budget)  - optional; with max_variants set, the whole
+                          catalog is discovered first and the variants
+                          plan() returns (row[2:]-shaped, in scrape
+                          order) are the ones scraped, instead of the
+                          first max_variants discovered; it runs on
+                          the discovery thread
+
+    Callbacks run on the calling thread, in arrival order. Returns the
+    StageStats of each stage.
+    """
+    variants = queue.PriorityQueue(maxsize=queue_size)
+    results = queue.Queue(maxsize=queue_size)
+    abort = threading.Event()
+
+    catalog_stats = StageStats("catalog")
+    sku_stats = StageStats("sku")
+    writer_stats = StageStats("writer")
+
+    planned = plan is not None and max_variants is not None
+
+    def produce():
+        n = 0
+        it = None
+        discovered = []
+        try:
+            it = iter(discover())
+            while planned or max_variants is None or n < max_variants:
+                start = time.perf_counter()
+                row = next(it, _DONE)
+                catalog_stats.add(busy=time.perf_counter() - start)
+                if row is _DONE:
+                    break
+
+                # the writer records it; the workers only need the SKU fields
+                _put(results, ("variant", row), catalog_stats, abort)
+                catalog_stats.add(items=1)
+                n += 1
+                if planned:
+                    discovered.append(row)
+                    continue
+                key = -priority(row) if priority else 0
+                _put(variants, (key, n, row[2:7]), catalog_stats, abort)
+
+            if planned:
+                start = time.perf_counter()
+                order = plan(discovered, max_variants)
+                catalog_stats.add(busy=time.perf_counter() - start)
+                for i, variant in enumerate(order):
+                    _put(variants, (i, i, tuple(variant[:5])), catalog_stats, abort)
+        except _Aborted:
+            return
+        except Exception as e:
+            log(f"[PIPE][WARN] catalog stage failed after {n} variants: {e}")
+        finally:
+            # close here: the browser belongs to this thread
+            if hasattr(it, "close"):
+                it.close()
+            for i in range(workers):
+                try:
+                    _put(variants, (float("inf"), n + i, _DONE), catalog_stats, abort)
+                except _Aborted:
+                    break
+
+    def work():
+        try:
+            for rows in scrape(_drain(variants, sku_stats, abort)):
+                _put(results, ("rows", rows), sku_stats, abort)
+        except _Aborted:
+            return
+        except Exception as e:
+            log(f"[PIPE][WARN] SKU worker failed: {e}")
+        finally:
+            try:
+                _put(results, _DONE, sku_stats, abort)
+            except _Aborted:
+                pass
+
+    threads = [threading.Thread(target=produce, name="catalog", daemon=True)]
+    threads += [
+        threading.Thread(target=work, name=f"sku-{i}", daemon=True)
+        for i in range(workers)
+    ]
+
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+
+    try:
+        finished = 0
+        while finished < workers:
+            start = time.perf_counter()
+            item = results.get()
+            writer_stats.add(starved=time.perf_counter() - start)
+
+            if item is _DONE:
+                finished += 1
+                continue
+
+            start = time.perf_counter()
+            kind, payload = item
+            if kind == "variant":
+                on_variant(payload)
+            else:
+                on_rows(payload)
+                writer_stats.add(items=1)
+            writer_stats.add(busy=time.perf_counter() - start)
+    finally:
+        # normally a no-op; releases stages still blocked if the writer
+        # failed or every SKU worker died before the catalog was done
+        abort.set()
+        for t in threads:
+            t.join()
+
+    wall = time.perf_counter() - started
+    stats = [catalog_stats, sku_stats, writer_stats]
+    for s in stats:
+        log(f"[PIPE] {s.summary(wall)}")
+        metrics.incr("pipeline_items_total", s.items, stage=s.name)
+        for state in ("busy", "blocked", "starved"):
+            metrics.observe("pipeline_stage_seconds", getattr(s, state), stage=s.name, state=state)
+    log(
+        f"[PIPE] wall {wall:.1f}s vs {sum(s.busy for s in stats):.1f}s "
+        f"of stage work ({workers} SKU workers)"
+    )
+    return stats
@@ -0,0 +1,63 @@
+import argparse
+import sqlite3
+from pathlib import Path
+
+from db.schema import init_db
+from src.notifiers.cooldown import import_notifications
+from src.notifiers.outbox import import_undelivered
+from src.notifiers.subscriptions import import_subscriptions, load_index, seed_from_rules
+from src.runs import import_runs
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+DB_PATH = BASE_DIR / "db" / "uniqlo.sqlite"
+
+# --------------------------------------------------
+# State carried between runs
+#
+# CI starts every run from an empty database and publishes the merged one
+# as a release snapshot. Before the next run scrapes anything, the state
+# that has to outlive a run is copied back from that snapshot:
+#
+# - uniqlo_runs: the run ledger, for trend and regression checks
+# - uniqlo_notifications: the log the cooldown anti-join reads, back to
+#   the longest cooldown anyone has
+# - uniqlo_outbox: messages not delivered yet (pending, in retry backoff,
+#   held for a digest's hours), so delivery stays at-least-once
+#
+# - uniqlo_users / _channels / _rules: the subscriptions, so users and
+#   rules added with `python -m src.notifiers.subscriptions` reach the
+#   next run; rules.py only seeds a database that has none
+#
+#     python -m src.restore previous/uniqlo.sqlite
+# --------------------------------------------------
+
+
+def restore(conn, path, log=print):
+    init_db(conn)
+    users = import_subscriptions(conn, path, log=log)
+    seed_from_rules(conn, log=log)
+    hours = load_index(conn).longest_cooldown_hours()
+
+    counts = {
+        "users": users,
+        "runs": import_runs(conn, path),
+        "notifications": import_notifications(conn, path, hours),
+        "outbox": import_undelivered(conn, path),
+    }
+    log(f"[RESTORE] from {path}: " + ", ".join(f"{n} {what}" for what, n in counts.items()))
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Carry state over from the previous run's database")
+    parser.add_argument("previous", help="the previous run's database (release snapshot)")
+    parser.add_argument("--db", default=str(DB_PATH))
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    restore(conn, args.previous)
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
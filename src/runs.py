@@ -0,0 +1,247 @@
+import argparse
+import json
+import resource
+import sqlite3
+import statistics
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from db.schema import import_rows, init_runs
+from src import metrics
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+DB_PATH = BASE_DIR / "db" / "uniqlo.sqlite"
+
+# --------------------------------------------------
+# Run ledger
+#
+# Every orchestrator stage and every shard job appends one uniqlo_runs row
+# built from the run's metrics (src/metrics.py). `python -m src.runs`
+# compares the latest run of each stage with the median of the runs before
+# it, so a slow site or a scraper change that doubles per-variant time
+# shows up the day it happens.
+# --------------------------------------------------
+
+BASELINE_RUNS = 7
+REGRESSION_RATIO = 1.5
+
+# metric -> (direction, minimum absolute change worth reporting);
+# direction +1 means higher is worse
+WATCHED = {
+    "seconds_per_variant": (+1, 0.5),
+    "variant_p95_seconds": (+1, 1.0),
+    "variants_per_minute": (-1, 1.0),
+    "failure_rate": (+1, 0.05),
+    "wall_seconds": (+1, 60.0),
+    "peak_memory_mb": (+1, 50.0),
+    "static_kb_per_variant": (+1, 100.0),
+}
+
+RUN_COLUMNS = (
+    "run_id", "stage", "shard", "status", "started_at", "finished_at",
+    "wall_seconds", "stage_seconds",
+    "variants_attempted", "variants_ok", "variants_failed", "rows_written",
+    "events_emitted", "messages_sent", "messages_failed",
+    "peak_memory_mb", "child_peak_memory_mb",
+    "seconds_per_variant", "variant_p95_seconds", "variants_per_minute", "failure_rate",
+    "cache_hit_ratio", "static_kb_per_variant",
+)
+
+
+def peak_memory_mb(who=resource.RUSAGE_SELF):
+    rss = resource.getrusage(who).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss / 1024 / (1024 if sys.platform == "darwin" else 1)
+
+
+def counter_total(summary, name, **labels):
+    return sum(
+        c["value"] for c in summary["counters"]
+        if c["name"] == name and labels.items() <= c["labels"].items()
+    )
+
+
+def timers_named(summary, name, **labels):
+    return [
+        t for t in summary["timers"]
+        if t["name"] == name and labels.items() <= t["labels"].items()
+    ]
+
+
+def run_row(run_id, stage, started_at, finished_at, status, summary=None, shard=None):
+    """A uniqlo_runs row (dict) from a metrics summary (default: this process')."""
+    summary = summary or metrics.METRICS.summary()
+    wall = (datetime.fromisoformat(finished_at) - datetime.fromisoformat(started_at)).total_seconds()
+
+    attempted = counter_total(summary, "variants_total")
+    ok = counter_total(summary, "variants_total", status="ok")
+    ok_timer = next(iter(timers_named(summary, "variant_seconds", status="ok")), None)
+    static_hits = counter_total(summary, "http_responses_total", type="static", cache="hit")
+    static_total = counter_total(summary, "http_responses_total", type="static")
+    static_bytes = counter_total(summary, "http_bytes_total", type="static")
+
+    return {
+        "run_id": run_id,
+        "stage": stage,
+        "shard": shard,
+        "status": status,
+        "started_at": started_at,
+        "finished_at": finished_at,
+        "wall_seconds": wall,
+        "stage_seconds": json.dumps({
+            t["labels"]["stage"]: round(t["sum"], 3)
+            for t in timers_named(summary, "stage_seconds")
+        }),
+        "variants_attempted": attempted,
+        "variants_ok": ok,
+        "variants_failed": attempted - ok,
+        "rows_written": counter_total(summary, "sku_rows_total"),
+        "events_emitted": counter_total(summary, "events_total"),
+        "messages_sent": counter_total(summary, "messages_total", status="sent"),
+        "messages_failed": counter_total(summary, "messages_total", status="failed"),
+        "peak_memory_mb": peak_memory_mb(),
+        "child_peak_memory_mb": peak_memory_mb(resource.RUSAGE_CHILDREN),
+        "seconds_per_variant": ok_timer["sum"] / ok_timer["count"] if ok_timer else None,
+        "variant_p95_seconds": ok_timer["p95"] if ok_timer else None,
+        "variants_per_minute": ok / wall * 60 if attempted and wall > 0 else None,
+        "failure_rate": (attempted - ok) / attempted if attempted else None,
+        "cache_hit_ratio": static_hits / static_total if static_total else None,
+        "static_kb_per_variant": static_bytes / 1024 / attempted if attempted and static_total else None,
+    }
+
+
+def record_run(conn, row):
+    init_runs(conn)
+    conn.execute(f"""
+        INSERT OR REPLACE INTO uniqlo_runs ({', '.join(RUN_COLUMNS)})
+        VALUES ({', '.join(':' + c for c in RUN_COLUMNS)})
+    """, row)
+    conn.commit()
+
+
+def import_runs(conn, path):
+    """
+    Copy another database's ledger (a shard, yesterday's snapshot) into
+    conn. Columns the other ledger predates are left NULL.
+    """
+    init_runs(conn)
+    return import_rows(conn, path, "uniqlo_runs")
+
+
+# --------------------------------------------------
+# Regressions
+# --------------------------------------------------
+
+def load_runs(conn, stage=None, limit=None):
+    """Runs as dicts, newest first."""
+    conn.row_factory = sqlite3.Row
+    try:
+        rows = conn.execute(f"""
+            SELECT {', '.join(RUN_COLUMNS)}
+            FROM uniqlo_runs
+            WHERE (? IS NULL OR stage = ?)
+            ORDER BY started_at DESC
+            LIMIT ?
+        """, (stage, stage, limit or -1)).fetchall()
+    finally:
+        conn.row_factory = None
+    return [dict(r) for r in rows]
+
+
+def regressions(latest, previous, ratio=REGRESSION_RATIO):
+    """
+    [(metric, latest value, baseline median)] where `latest` is worse than
+    the median of `previous` by more than `ratio` and the metric's
+    minimum change.
+    """
+    found = []
+    for metric, (direction, min_change) in WATCHED.items():
+        value = latest.get(metric)
+        history = [r[metric] for r in previous if r.get(metric) is not None]
+        if value is None or not history:
+            continue
+        baseline = statistics.median(history)
+
+        if direction > 0:
+            worse = value > baseline * ratio and value - baseline >= min_change
+        else:
+            worse = value * ratio < baseline and baseline - value >= min_change
+        if worse:
+            found.append((metric, value, baseline))
+    return found
+
+
+def check(conn, baseline_runs=BASELINE_RUNS, ratio=REGRESSION_RATIO, log=print):
+    """Compare the latest successful run of each stage with its baseline."""
+    found = []
+    stages = [s for (s,) in conn.execute("SELECT DISTINCT stage FROM uniqlo_runs ORDER BY stage")]
+
+    for stage in stages:
+        runs = [r for r in load_runs(conn, stage) if r["status"] == "ok"]
+        if len(runs) < 2:
+            continue
+        latest, previous = runs[0], runs[1:baseline_runs + 1]
+        for metric, value, baseline in regressions(latest, previous, ratio):
+            log(
+                f"[RUNS][REGRESSION] {stage} {latest['run_id']}: {metric} "
+                f"{value:.2f} vs median {baseline:.2f} of {len(previous)} runs"
+            )
+            found.append((stage, metric, value, baseline))
+
+    if not found:
+        log("[RUNS] no regressions")
+    return found
+
+
+# --------------------------------------------------
+# CLI
+# --------------------------------------------------
+
+def _fmt(value, spec=".1f"):
+    return "-" if value is None else format(value, spec)
+
+
+def print_runs(runs):
+    print(f"{'started_at':<20} {'stage':<8} {'shard':<6} {'status':<7} {'wall':>8} "
+          f"{'ok/att':>10} {'s/var':>6} {'p95':>6} {'var/min':>8} {'events':>7} {'sent':>5} {'MB':>7} "
+          f"{'hit%':>5} {'KB/var':>7}")
+    for r in runs:
+        print(
+            f"{r['started_at'][:19]:<20} {r['stage']:<8} {r['shard'] or '':<6} {r['status']:<7} "
+            f"{_fmt(r['wall_seconds']):>8} {r['variants_ok']:>5}/{r['variants_attempted']:<4} "
+            f"{_fmt(r['seconds_per_variant']):>6} {_fmt(r['variant_p95_seconds']):>6} "
+            f"{_fmt(r['variants_per_minute']):>8} {r['events_emitted']:>7} {r['messages_sent']:>5} "
+            f"{_fmt(r['peak_memory_mb'], '.0f'):>7} "
+            f"{_fmt(r['cache_hit_ratio'] and r['cache_hit_ratio'] * 100, '.0f'):>5} "
+            f"{_fmt(r['static_kb_per_variant'], '.0f'):>7}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show the run ledger and flag regressions")
+    parser.add_argument("--db", default=str(DB_PATH))
+    parser.add_argument("--stage", help="only show this stage")
+    parser.add_argument("--last", type=int, default=20, help="runs to show")
+    parser.add_argument("--baseline", type=int, default=BASELINE_RUNS, help="runs the latest is compared with")
+    parser.add_argument("--ratio", type=float, default=REGRESSION_RATIO)
+    parser.add_argument("--check", action="store_true", help="exit 1 when a regression is found")
+    parser.add_argument("--import-from", metavar="DB", help="copy the ledger of another database first")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    init_runs(conn)
+
+    if args.import_from:
+        print(f"[RUNS] imported {import_runs(conn, args.import_from)} runs from {args.import_from}")
+
+    print_runs(load_runs(conn, args.stage, args.last))
+    found = check(conn, args.baseline, args.ratio)
+    conn.close()
+
+    if args.check and found:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
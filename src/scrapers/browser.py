@@ -0,0 +1,365 @@
+import json
+import os
+import re
+import shutil
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import quote, urlparse
+
+from playwright.sync_api import sync_playwright
+
+from src import metrics
+
+# --------------------------------------------------
+# Browser session
+#
+# One Playwright driver and one Chromium per run (or per daemon), shared by
+# the catalog and SKU scrapers. Contexts come pre-configured:
+#
+#   - OVERLAY_CSS is injected by an init script before the site's own
+#     scripts run, so the cookie banner, sticky footer and marketing
+#     iframes never cover a chip (no add_style_tag per page)
+#   - OneTrust's consent cookies are seeded (strictly necessary only), so
+#     the banner is never shown and nothing waits to click it
+#
+# Playwright's sync API is bound to the thread that started it: a session
+# must only be used from that thread. The pipelined scrape therefore gives
+# each stage its own session.
+#
+# With BROWSER_PROFILE_DIR set, sessions launch a persistent context in
+# <dir>/<thread name> instead, so Chromium's HTTP disk cache (JS bundles,
+# CSS, chip images) survives between runs. Chromium keeps the cache under
+# BROWSER_CACHE_MB itself; prune_profiles() keeps the whole directory under
+# BROWSER_PROFILE_MAX_MB by dropping the least recently used profiles.
+#
+# With BROWSER_HAR_DIR set, every context's traffic is recorded to
+# <dir>/context-<n>.har.zip (BROWSER_HAR_MODE=record), or served from the
+# HARs in <dir> with the network cut off (replay): a request that was not
+# recorded fails instead of reaching the site. Replay matches on method
+# and URL, so a run replays the pages it recorded. See
+# src/benchmarks/bench_scrapers.py.
+#
+# UNIQLO_BASE_URL points every scraper at another copy of the site, e.g.
+# the mock in src/benchmarks/mock_site.py.
+# --------------------------------------------------
+
+SITE_URL = os.getenv("UNIQLO_BASE_URL", "https://www.uniqlo.com").rstrip("/")
+
+
+def cookie_domain(url):
+    """'.uniqlo.com' for https://www.uniqlo.com; the bare host otherwise (localhost, IPs)."""
+    host = urlparse(url).hostname
+    return "." + host[len("www."):] if host.startswith("www.") else host
+
+
+COOKIE_DOMAIN = cookie_domain(SITE_URL)
+
+CACHE_MB = 300
+PROFILE_MAX_MB = 500
+
+HAR_MODES = ("record", "replay")
+
+# CDP resource types counted as static assets
+STATIC_TYPES = {"Script", "Stylesheet", "Image", "Font", "Media"}
+
+OVERLAY_CSS = """
+    #onetrust-consent-sdk,
+    .template-base-sticky-container,
+    #attentive_overlay,
+    iframe {
+        display: none !important;
+        visibility: hidden !important;
+        pointer-events: none !important;
+    }
+"""
+
+OVERLAY_SCRIPT = """
+    (css) => {
+        if (window.top !== window) return;
+        const inject = () => {
+            const style = document.createElement("style");
+            style.dataset.scraper = "overlays";
+            style.textContent = css;
+            (document.head || document.documentElement).appendChild(style);
+        };
+        if (document.documentElement) inject();
+        else document.addEventListener("DOMContentLoaded", inject);
+    }
+"""
+
+
+def consent_cookies(now=None):
+    """OneTrust cookies recording that the banner was answered: necessary cookies only."""
+    stamp = (now or datetime.utcnow()).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+    consent = "&".join([
+        "isGpcEnabled=0",
+        f"datestamp={quote(stamp)}",
+        "isIABGlobal=false",
+        "interactionCount=1",
+        "landingPath=NotLandingPage",
+        "groups=" + quote("C0001:1,C0002:0,C0003:0,C0004:0"),
+        "AwaitingReconsent=false",
+    ])
+    return [
+        {"name": "OptanonAlertBoxClosed", "value": stamp, "domain": COOKIE_DOMAIN, "path": "/"},
+        {"name": "OptanonConsent", "value": consent, "domain": COOKIE_DOMAIN, "path": "/"},
+    ]
+
+
+def kill_overlays(page):
+    """For pages that did not come from a BrowserSession context."""
+    page.add_style_tag(content=OVERLAY_CSS)
+
+
+# --------------------------------------------------
+# Profiles
+# --------------------------------------------------
+
+def dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def prune_profiles(base, max_mb=PROFILE_MAX_MB, keep=None, log=print):
+    """
+    Delete least recently used profiles under `base` until it fits in
+    max_mb. Profiles in use (Chromium's SingletonLock) and `keep` are
+    never touched. Returns the names removed.
+    """
+    base = Path(base)
+    if not base.is_dir():
+        return []
+
+    profiles = []
+    for p in base.iterdir():
+        if p.is_dir() and p.name != keep and not os.path.lexists(p / "SingletonLock"):
+            profiles.append((p.stat().st_mtime, p))
+    profiles.sort()
+
+    total = dir_size(base)
+    removed = []
+    for _, p in profiles:
+        if total <= max_mb * 1024 * 1024:
+            break
+        size = dir_size(p)
+        shutil.rmtree(p, ignore_errors=True)
+        total -= size
+        removed.append(p.name)
+        log(f"[BROWSER] evicted profile {p.name} ({size / 1024 / 1024:.0f} MB)")
+    return removed
+
+
+class CacheStats:
+    """
+    Counts responses served from Chromium's cache vs the network, and the
+    bytes fetched, per page through a CDP session:
+
+        http_responses_total{type=static|other, cache=hit|miss}
+        http_bytes_total{type=static|other}
+    """
+
+    def __init__(self):
+        self.requests = {}
+        self.served = set()
+
+    def attach(self, page):
+        try:
+            cdp = page.context.new_cdp_session(page)
+            cdp.send("Network.enable")
+        except Exception:
+            return  # not Chromium, or the page is already gone
+        cdp.on("Network.requestServedFromCache", self.on_served)
+        cdp.on("Network.responseReceived", self.on_response)
+        cdp.on("Network.loadingFinished", self.on_finished)
+        cdp.on("Network.loadingFailed", self.on_failed)
+
+    def on_served(self, params):
+        self.served.add(params["requestId"])
+
+    def on_response(self, params):
+        rid = params["requestId"]
+        response = params["response"]
+        cached = (
+            rid in self.served
+            or response.get("fromDiskCache")
+            or response.get("fromPrefetchCache")
+        )
+        kind = "static" if params.get("type") in STATIC_TYPES else "other"
+        self.requests[rid] = (kind, bool(cached))
+
+    def on_finished(self, params):
+        rid = params["requestId"]
+        self.served.discard(rid)
+        kind, cached = self.requests.pop(rid, (None, None))
+        if kind is None:
+            return
+        metrics.incr("http_responses_total", type=kind, cache="hit" if cached else "miss")
+        if not cached:
+            metrics.incr("http_bytes_total", params.get("encodedDataLength", 0), type=kind)
+
+    def on_failed(self, params):
+        self.served.discard(params["requestId"])
+        self.requests.pop(params["requestId"], None)
+
+
+class _ProfileContext:
+    """
+    What new_context() returns for a persistent session: pages share the
+    profile's single context, close() closes only the pages opened here.
+    """
+
+    def __init__(self, context):
+        self.context = context
+        self.pages = []
+
+    def new_page(self):
+        page = self.context.new_page()
+        self.pages.append(page)
+        return page
+
+    def close(self):
+        for page in self.pages:
+            page.close()
+        self.pages = []
+
+
+class BrowserSession:
+    """
+    with BrowserSession() as session:
+        context = session.new_context()
+        ...
+        context.close()
+    """
+
+    def __init__(self, headless=True, profile_dir=None, cache_mb=CACHE_MB,
+                 profile_max_mb=PROFILE_MAX_MB, har_dir=None, har_mode="replay", log=print):
+        if har_mode not in HAR_MODES:
+            raise ValueError(f"har_mode must be one of {HAR_MODES}, got {har_mode!r}")
+        self.headless = headless
+        self.profile_dir = Path(profile_dir) if profile_dir else None
+        self.cache_mb = cache_mb
+        self.profile_max_mb = profile_max_mb
+        self.har_dir = Path(har_dir) if har_dir else None
+        self.har_mode = har_mode
+        self.log = log
+        self.playwright = None
+        self.browser = None
+        self.profile = None     # persistent context, when profile_dir is set
+        self.cache = CacheStats()
+        self.contexts = 0
+
+    @classmethod
+    def from_env(cls, log=print):
+        return cls(
+            profile_dir=os.getenv("BROWSER_PROFILE_DIR") or None,
+            cache_mb=int(os.getenv("BROWSER_CACHE_MB", CACHE_MB)),
+            profile_max_mb=int(os.getenv("BROWSER_PROFILE_MAX_MB", PROFILE_MAX_MB)),
+            har_dir=os.getenv("BROWSER_HAR_DIR") or None,
+            har_mode=os.getenv("BROWSER_HAR_MODE", "replay"),
+            log=log,
+        )
+
+    def profile_path(self):
+        """One profile per thread: Chromium locks a profile to one process."""
+        return self.profile_dir / re.sub(r"[^A-Za-z0-9_.-]", "_", threading.current_thread().name)
+
+    def start(self):
+        with metrics.timer("phase_seconds", phase="browser_launch"):
+            self.playwright = sync_playwright().start()
+            if self.profile_dir:
+                self._launch_profile()
+            else:
+                self.browser = self.playwright.chromium.launch(headless=self.headless)
+        metrics.incr("browser_launches_total")
+        return self
+
+    def _launch_profile(self):
+        path = self.profile_path()
+        prune_profiles(self.profile_dir, self.profile_max_mb, keep=path.name, log=self.log)
+        path.mkdir(parents=True, exist_ok=True)
+        os.utime(path)
+        self.log(f"[BROWSER] profile {path} ({dir_size(path) / 1024 / 1024:.0f} MB cached)")
+
+        self.profile = self.playwright.chromium.launch_persistent_context(
+            str(path),
+            headless=self.headless,
+            args=[f"--disk-cache-size={self.cache_mb * 1024 * 1024}"],
+        )
+        self._configure(self.profile)
+        # the persistent context opens with a blank page of its own
+        for page in self.profile.pages:
+            page.close()
+
+    def close(self):
+        if self.profile:
+            self.profile.close()
+            self.profile = None
+            prune_profiles(self.profile_dir, self.profile_max_mb, log=self.log)
+        if self.browser:
+            self.browser.close()
+            self.browser = None
+        if self.playwright:
+            self.playwright.stop()
+            self.playwright = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def _configure(self, context):
+        context.add_init_script(script=f"({OVERLAY_SCRIPT})({json.dumps(OVERLAY_CSS)})")
+        context.add_cookies(consent_cookies())
+        context.on("page", self.cache.attach)
+        if self.har_dir:
+            self._route_har(context)
+
+    def _route_har(self, context):
+        if self.har_mode == "record":
+            # written when the context closes
+            self.har_dir.mkdir(parents=True, exist_ok=True)
+            har = self.har_dir / f"context-{self.contexts}.har.zip"
+            context.route_from_har(str(har), update=True, update_content="embed")
+            self.log(f"[BROWSER] recording to {har}")
+            return
+
+        hars = sorted(self.har_dir.glob("*.har.zip"))
+        if not hars:
+            raise FileNotFoundError(f"no recorded pages in {self.har_dir}")
+        # later routes are tried first: every HAR, then the catch-all
+        context.route("**/*", lambda route: route.abort())
+        for har in hars:
+            context.route_from_har(str(har), not_found="fallback")
+
+    def new_context(self, **kwargs):
+        """A context with overlays hidden and cookie consent already given."""
+        self.contexts += 1
+        if self.profile:
+            if kwargs:
+                raise ValueError("context options are fixed for a persistent profile")
+            return _ProfileContext(self.profile)
+
+        context = self.browser.new_context(**kwargs)
+        self._configure(context)
+        return context
+
+
+@contextmanager
+def browser_session(session=None, log=print):
+    """`session` as is, or a new one closed on exit."""
+    if session is not None:
+        yield session
+        return
+
+    with BrowserSession.from_env(log=log) as session:
+        yield session
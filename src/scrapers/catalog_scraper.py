@@ -1,135 +1,176 @@
-from playwright.sync_api import sync_playwright
 from datetime import datetime
 import uuid
 from urllib.parse import urljoin
 import re
 
+from src import metrics
+from src.scrapers.browser import SITE_URL, browser_session
+from src.scrapers.politeness import PolitenessController, check_response
+
 CATALOG_URLS = {
-    "men": "https://www.uniqlo.com/uk/en/feature/sale/men",
-    "women": "https://www.uniqlo.com/uk/en/feature/sale/women",
+    "men": f"{SITE_URL}/uk/en/feature/sale/men",
+    "women": f"{SITE_URL}/uk/en/feature/sale/women",
 }
 
 VARIANT_ID_RE = re.compile(r"(E\d{6}-\d{3})")
-def extract_product_name_from_tile(a):
-    return a.evaluate("""
-        (a) => {
-            const tile = a.closest('[class*="product-tile"]');
-            if (!tile) return null;
 
-            const nodes = Array.from(
+TILE_LINK_SELECTOR = 'a[href^="/uk/en/products/E"]'
+
+
+def read_tiles(page):
+    """
+    (href, product name, sale price, discount %) for every product link
+    currently on the page, in one round trip. The name is the tile's
+    second typography node in its content area; None while the tile is
+    still rendering. Prices are None when the tile shows
+    no strike-through price.
+    """
+    return page.evaluate("""
+        (selector) => Array.from(document.querySelectorAll(selector)).map(a => {
+            const tile = a.closest('[class*="product-tile"]');
+            const nodes = tile ? Array.from(
                 tile.querySelectorAll(
                     '.product-tile__content-area [data-testid="ITOTypography"]'
                 )
-            );
-
-            // product name is the SECOND typography node
-            if (nodes.length < 2) return null;
-
-            const name = nodes[1].textContent.trim();
-            return name || null;
-        }
-    """, a)
-
-
-def scrape_catalog(conn, log=print):
-    conn.execute("DELETE FROM uniqlo_sale_variants")
-    conn.commit()
-
+            ) : [];
+            const name = nodes.length < 2 ? null : nodes[1].textContent.trim();
+
+            const price = sel => {
+                const el = tile && tile.querySelector(sel);
+                const v = el ? parseFloat(el.textContent.replace(/[^0-9.]/g, "")) : NaN;
+                return isNaN(v) ? null : v;
+            };
+            const sale = price('.fr-ec-price-text--color-promotional, .ito-red500');
+            const original = price('.fr-ec-price__strike-through, .strikethrough');
+            const discount = sale && original && sale < original
+                ? Math.round((original - sale) / original * 10000) / 100
+                : null;
+
+            return [a.getAttribute("href"), name || null, sale, discount];
+        })
+    """, TILE_LINK_SELECTOR)
+
+
+def iter_catalog_variants(log=print, controller=None, session=None):
+    """
+    Scroll each sale catalog and yield uniqlo_sale_variants rows as tiles
+    appear, instead of once the whole catalog has loaded, so the SKU stage
+    can start on the first variants while scrolling continues.
+
+    Catalog page loads go through `controller` (see politeness.py) like
+    the SKU scraper's requests. `session` (browser.py) is reused and left
+    open when given.
+    """
+    controller = controller or PolitenessController.from_env(max_concurrency=1, log=log)
     scrape_id = uuid.uuid4().hex
     scraped_at = datetime.utcnow().isoformat()
 
-    rows = []
     seen_variants = set()
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
-
-        for catalog, url in CATALOG_URLS.items():
-            log(f"[CATALOG] Loading {catalog}")
-            page.goto(url, timeout=30000, wait_until="domcontentloaded")
-
-            # ------------------------------------------------
-            # Infinite scroll until tile count stabilises
-            # ------------------------------------------------
-            last_count = 0
-            stable_rounds = 0
-
-            while stable_rounds < 3:
-                page.mouse.wheel(0, 5000)
-                page.wait_for_timeout(1500)
-
-                tiles = page.query_selector_all('a[href^="/uk/en/products/E"]')
-                count = len(tiles)
-
-                if count == last_count:
-                    stable_rounds += 1
-                else:
-                    stable_rounds = 0
-                    last_count = count
-
-            log(f"[CATALOG] {catalog}: {last_count} product links")
-
-            # ------------------------------------------------
-            # Extract variant + deterministic product name
-            # ------------------------------------------------
-            for a in page.query_selector_all('a[href^="/uk/en/products/E"]'):
-                href = a.get_attribute("href")
-                if not href:
-                    continue
-
-                m = VARIANT_ID_RE.search(href)
-                if not m:
-                    continue
-
-                variant_id = m.group(1)
-                product_id = variant_id[1:7]
-
-                key = (catalog, variant_id)
-                if key in seen_variants:
-                    continue
-                seen_variants.add(key)
-
-                # 🔑 deterministic product name from tile
-                name_el = a.query_selector('[data-testid="ITOTypography"]')
-                product_name = (
-                    name_el.inner_text().strip()
-                    if name_el else None
-                )
-                product_name = extract_product_name_from_tile(a)
-                # print(product_name)
-                if not product_name:
+    with browser_session(session, log) as session:
+        context = session.new_context()
+        page = context.new_page()
+        try:
+            for catalog, url in CATALOG_URLS.items():
+                log(f"[CATALOG] Loading {catalog}")
+                with controller.slot(), metrics.timer("phase_seconds", phase="catalog_goto"):
+                    check_response(
+                        page.goto(url, timeout=controller.timeout("goto"), wait_until="domcontentloaded"),
+                        url,
+                    )
+
+                unnamed = set()
+
+                def new_rows():
+                    for href, product_name, list_price, list_discount_pct in read_tiles(page):
+                        if not href:
+                            continue
+
+                        m = VARIANT_ID_RE.search(href)
+                        if not m:
+                            continue
+
+                        variant_id = m.group(1)
+                        key = (catalog, variant_id)
+                        if key in seen_variants:
+                            continue
+                        if not product_name:
+                            # may still be rendering; retried next round
+                            unnamed.add(variant_id)
+                            continue
+                        seen_variants.add(key)
+                        unnamed.discard(variant_id)
+                        metrics.incr("catalog_variants_total", catalog=catalog)
+
+                        yield (
+                            scrape_id,
+                            scraped_at,
+                            catalog,
+                            variant_id[1:7],
+                            variant_id,
+                            urljoin(SITE_URL, href.split("?")[0]),
+                            product_name,
+                            list_price,
+                            list_discount_pct,
+                        )
+
+                yield from new_rows()
+
+                # ------------------------------------------------
+                # Infinite scroll until tile count stabilises
+                # ------------------------------------------------
+                last_count = 0
+                stable_rounds = 0
+
+                while stable_rounds < 3:
+                    with metrics.timer("phase_seconds", phase="catalog_scroll"):
+                        page.mouse.wheel(0, 5000)
+                        page.wait_for_timeout(1500)
+
+                        count = len(page.query_selector_all(TILE_LINK_SELECTOR))
+
+                    if count == last_count:
+                        stable_rounds += 1
+                    else:
+                        stable_rounds = 0
+                        last_count = count
+
+                    yield from new_rows()
+
+                log(f"[CATALOG] {catalog}: {last_count} product links")
+                for variant_id in sorted(unnamed):
                     log(f"[CATALOG][SKIP] no product name for {variant_id}")
-                    continue
-
-                rows.append((
-                    scrape_id,
-                    scraped_at,
-                    catalog,
-                    product_id,
-                    variant_id,
-                    urljoin("https://www.uniqlo.com", href.split("?")[0]),
-                    product_name,
-                ))
+        finally:
+            context.close()
+
+
+INSERT_VARIANT_SQL = """
+    INSERT OR IGNORE INTO uniqlo_sale_variants (
+        scrape_id,
+        scraped_at,
+        catalog,
+        product_id,
+        variant_id,
+        variant_url,
+        name,
+        list_price,
+        list_discount_pct
+    )
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def scrape_catalog(conn, log=print, session=None):
+    conn.execute("DELETE FROM uniqlo_sale_variants")
+    conn.commit()
 
-        browser.close()
+    rows = list(iter_catalog_variants(log, session=session))
 
     if not rows:
         log("[CATALOG] No variants found")
         return
 
-    conn.executemany("""
-        INSERT INTO uniqlo_sale_variants (
-            scrape_id,
-            scraped_at,
-            catalog,
-            product_id,
-            variant_id,
-            variant_url,
-            name
-        )
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    """, rows)
+    conn.executemany(INSERT_VARIANT_SQL, rows)
 
     conn.commit()
 
@@ -139,4 +180,4 @@ def scrape_catalog(conn, log=print):
             FROM uniqlo_sale_variants
             GROUP BY catalog
         """).fetchall()
-    )
\ No newline at end of file
+    )
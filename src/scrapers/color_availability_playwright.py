@@ -1,25 +1,13 @@
 from datetime import datetime
 import sqlite3
-from playwright.sync_api import sync_playwright
+
+from src.scrapers.browser import SITE_URL, browser_session
 
 
 # --------------------------------------------------
 # Helpers
 # --------------------------------------------------
 
-def kill_overlays(page):
-    page.add_style_tag(content="""
-        #onetrust-consent-sdk,
-        .template-base-sticky-container,
-        #attentive_overlay,
-        iframe {
-            display: none !important;
-            visibility: hidden !important;
-            pointer-events: none !important;
-        }
-    """)
-
-
 def get_colors(page):
     return page.evaluate("""
         () => Array.from(
@@ -83,19 +71,12 @@ def read_sizes(page):
 # --------------------------------------------------
 
 def fetch_sku_availability_with_colors(page, product_id: str):
-    url = f"https://www.uniqlo.com/uk/en/products/E{product_id}"
+    url = f"{SITE_URL}/uk/en/products/E{product_id}"
 
-    # Hard navigation bound
+    # Hard navigation bound; overlays and the cookie banner are handled by
+    # the BrowserSession context
     page.goto(url, timeout=30000, wait_until="domcontentloaded")
 
-    kill_overlays(page)
-
-    # Accept cookies if present (best-effort)
-    try:
-        page.click("#onetrust-accept-btn-handler", timeout=3000)
-    except:
-        pass
-
     # If size chips never appear, product is non-standard → skip safely
     try:
         page.wait_for_selector("div.size-chip-wrapper", timeout=7000)
@@ -151,9 +132,8 @@ def main():
         "479764",
     ]
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        context = browser.new_context()
+    with browser_session() as session:
+        context = session.new_context()
         page = context.new_page()
 
         for pid in product_ids:
@@ -162,14 +142,14 @@ def main():
             for r in rows:
                 print(r)
 
-        browser.close()
+        context.close()
 
 
 # --------------------------------------------------
 # Orchestrated DB scraper
 # --------------------------------------------------
 
-def scrape_sku_availability(conn: sqlite3.Connection, log, max_products: int | None = None):
+def scrape_sku_availability(conn: sqlite3.Connection, log, max_products: int | None = None, session=None):
     product_ids = [
         r[0] for r in conn.execute("""
             SELECT DISTINCT product_id
@@ -186,9 +166,8 @@ def scrape_sku_availability(conn: sqlite3.Connection, log, max_products: int | N
         log("No products found for SKU availability scrape")
         return
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        context = browser.new_context()
+    with browser_session(session, log) as session:
+        context = session.new_context()
         page = context.new_page()
 
         rows_to_insert = []
@@ -223,7 +202,7 @@ def scrape_sku_availability(conn: sqlite3.Connection, log, max_products: int | N
                 log(f"[{pid}] elapsed {elapsed:.1f}s")
                 page.goto("about:blank")
 
-        browser.close()
+        context.close()
 
     if rows_to_insert:
         log(f"Persisting {len(rows_to_insert)} SKU rows")
@@ -0,0 +1,242 @@
+import os
+import threading
+import time
+from collections import deque
+
+# --------------------------------------------------
+# Adaptive concurrency / politeness (AIMD)
+#
+# Every scraper request goes through controller.slot() and reports its
+# latency and outcome. Every `window` requests the controller looks at the
+# window:
+#
+#   healthy  (few errors, p90 under target)  -> concurrency + 1, delay - step
+#   degraded (errors, blocks or p90 > 2x)    -> concurrency / 2, delay * 2
+#
+# A burst of consecutive failures, or any block (403 / 429 / 503), pauses
+# all requests at once instead of waiting for the window to fill.
+# Page timeouts scale with observed latency so a slow site is not mistaken
+# for a broken one and a fast one fails fast.
+# --------------------------------------------------
+
+# Base timeouts (ms) at LATENCY_TARGET_SEC; these were the hard-coded values
+BASE_TIMEOUTS_MS = {
+    "goto": 30000,
+    "chips": 8000,
+    "color": 3000,
+}
+TIMEOUT_SCALE = (0.5, 2.0)
+
+LATENCY_TARGET_SEC = 4.0        # p90 per variant page above this is "slow"
+ERROR_RATE_MAX = 0.1
+WINDOW = 20
+BURST_ERRORS = 3
+BURST_PAUSE_SEC = 30.0
+DELAY_STEP_SEC = 0.25
+
+BLOCK_STATUSES = {403, 429, 503}
+
+
+class Blocked(Exception):
+    """The site answered with a rate-limit / block status."""
+
+    def __init__(self, status, url=""):
+        super().__init__(f"HTTP {status} {url}".strip())
+        self.status = status
+
+
+def _percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+class PolitenessController:
+    """
+    Shared by all scraper threads. concurrency bounds requests in flight
+    (not threads: extra workers wait in slot()); delay is the minimum gap
+    between request starts across all of them.
+    """
+
+    def __init__(self, min_concurrency=1, max_concurrency=4, min_delay=0.0, max_delay=10.0,
+                 latency_target=LATENCY_TARGET_SEC, window=WINDOW, log=print):
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max(max_concurrency, min_concurrency)
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.latency_target = latency_target
+        self.window = window
+        self.log = log
+
+        # start cautiously and earn throughput
+        self.concurrency = self.min_concurrency
+        self.delay = min(max(min_delay, DELAY_STEP_SEC), max_delay)
+
+        self.samples = deque(maxlen=window)
+        self.since_decision = 0
+        self.consecutive_errors = 0
+        self.paused_until = 0.0
+        self.next_start = 0.0
+        self.in_flight = 0
+        self.decisions = 0
+
+        self.cond = threading.Condition()
+
+    @classmethod
+    def from_env(cls, max_concurrency=None, log=print):
+        return cls(
+            min_concurrency=int(os.getenv("POLITE_MIN_CONCURRENCY", 1)),
+            max_concurrency=int(os.getenv("POLITE_MAX_CONCURRENCY", max_concurrency or 4)),
+            min_delay=float(os.getenv("POLITE_MIN_DELAY", 0.0)),
+            max_delay=float(os.getenv("POLITE_MAX_DELAY", 10.0)),
+            latency_target=float(os.getenv("POLITE_LATENCY_TARGET", LATENCY_TARGET_SEC)),
+            log=log,
+        )
+
+    # ---- request gate ----
+
+    def acquire(self):
+        with self.cond:
+            while True:
+                now = time.monotonic()
+                wait = max(self.paused_until, self.next_start) - now
+                if self.in_flight < self.concurrency and wait <= 0:
+                    self.in_flight += 1
+                    self.next_start = now + self.delay
+                    return
+                self.cond.wait(timeout=wait if wait > 0 else None)
+
+    def release(self):
+        with self.cond:
+            self.in_flight -= 1
+            self.cond.notify_all()
+
+    def slot(self):
+        """with controller.slot() as request: ...; request.ok / request.blocked"""
+        return _Request(self)
+
+    def try_slot(self):
+        """
+        An already acquired slot if a request may start right now, else
+        None; for optional work such as prefetching the next page, which
+        must not wait while its caller holds a slot of its own.
+        """
+        with self.cond:
+            now = time.monotonic()
+            if self.in_flight >= self.concurrency or max(self.paused_until, self.next_start) > now:
+                return None
+            self.in_flight += 1
+            self.next_start = now + self.delay
+        return _Request(self, acquired=True)
+
+    # ---- feedback ----
+
+    def timeout(self, kind):
+        """Page timeout in ms for `kind`, scaled by recent p90 latency."""
+        with self.cond:
+            latencies = [latency for latency, _, _ in self.samples]
+        if len(latencies) < 5:
+            return BASE_TIMEOUTS_MS[kind]
+        low, high = TIMEOUT_SCALE
+        scale = min(high, max(low, _percentile(latencies, 0.9) / self.latency_target))
+        return int(BASE_TIMEOUTS_MS[kind] * scale)
+
+    def record(self, latency, ok=True, blocked=False):
+        with self.cond:
+            self.samples.append((latency, ok, blocked))
+            self.since_decision += 1
+            self.consecutive_errors = 0 if ok else self.consecutive_errors + 1
+
+            if blocked or self.consecutive_errors >= BURST_ERRORS:
+                reason = "blocked" if blocked else f"{self.consecutive_errors} errors in a row"
+                self.paused_until = time.monotonic() + BURST_PAUSE_SEC
+                self.consecutive_errors = 0
+                self._decrease(f"{reason}, pausing {BURST_PAUSE_SEC:.0f}s")
+            elif self.since_decision >= self.window:
+                self._evaluate()
+
+            self.cond.notify_all()
+
+    def _evaluate(self):
+        latencies = [latency for latency, _, _ in self.samples]
+        errors = sum(1 for _, ok, _ in self.samples if not ok)
+        p90 = _percentile(latencies, 0.9)
+        stats = f"p90 {p90:.1f}s, errors {errors}/{len(self.samples)}"
+
+        if errors / len(self.samples) > ERROR_RATE_MAX or p90 > 2 * self.latency_target:
+            self._decrease(stats)
+        elif p90 <= self.latency_target:
+            self._increase(stats)
+        else:
+            self.since_decision = 0
+
+    def _increase(self, reason):
+        self._decide(
+            min(self.max_concurrency, self.concurrency + 1),
+            max(self.min_delay, self.delay - DELAY_STEP_SEC),
+            reason,
+        )
+
+    def _decrease(self, reason):
+        self._decide(
+            max(self.min_concurrency, self.concurrency // 2),
+            min(self.max_delay, max(self.delay * 2, DELAY_STEP_SEC)),
+            reason,
+        )
+
+    def _decide(self, concurrency, delay, reason):
+        self.since_decision = 0
+        if (concurrency, delay) == (self.concurrency, self.delay):
+            return
+        self.log(
+            f"[POLITE] concurrency {self.concurrency}→{concurrency}, "
+            f"delay {self.delay:.2f}→{delay:.2f}s ({reason})"
+        )
+        self.concurrency, self.delay = concurrency, delay
+        self.decisions += 1
+
+    def summary(self):
+        with self.cond:
+            return (
+                f"concurrency {self.concurrency}, delay {self.delay:.2f}s, "
+                f"{self.decisions} adjustments"
+            )
+
+
+class _Request:
+    def __init__(self, controller, acquired=False):
+        self.controller = controller
+        self.ok = True
+        self.blocked = False
+        self.acquired = acquired
+        self.start = time.monotonic()
+
+    def __enter__(self):
+        if not self.acquired:
+            self.controller.acquire()
+            self.acquired = True
+            self.start = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self.acquired:
+            return False
+        self.acquired = False
+        if exc_type is not None:
+            self.ok = False
+            self.blocked = self.blocked or isinstance(exc, Blocked)
+        self.controller.release()
+        self.controller.record(time.monotonic() - self.start, self.ok, self.blocked)
+        return False
+
+
+def check_response(response, url=""):
+    """Raise Blocked for rate-limit / block statuses from page.goto()."""
+    if response is not None:
+        check_status(response.status, url)
+    return response
+
+
+def check_status(status, url=""):
+    if status in BLOCK_STATUSES:
+        raise Blocked(status, url)
+    return status
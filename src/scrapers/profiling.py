@@ -0,0 +1,136 @@
+import json
+import os
+import random
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from src import metrics
+
+# --------------------------------------------------
+# Slow-variant profiling
+#
+# Each SKU worker's context keeps a Playwright trace running (no
+# screenshots or DOM snapshots; network and console are always in it) and
+# every variant is one trace chunk. A chunk is saved only when the variant
+# took SKU_TRACE_SLOW_SEC or more, or was drawn in the SKU_TRACE_SAMPLE
+# sample; otherwise it is dropped. Saved traces go to
+# <METRICS_DIR>/traces/<variant>-<slow|sample>-<time>.zip (open with
+# `playwright show-trace`), and summary.jsonl next to them breaks each one
+# down by scraper phase, naming the one that took longest.
+#
+# A chunk opens before the variant's page load starts, so the trace shows
+# it. With prefetch the next variant would start loading inside the
+# current chunk, so iter_sku_rows (scrape_sku_state.py) turns prefetch off
+# while tracing is on.
+# --------------------------------------------------
+
+SLOW_SEC = 30.0
+SAMPLE_RATE = 0.01
+
+_summary_lock = threading.Lock()   # workers append to one summary.jsonl
+
+
+def phase_breakdown(captured, elapsed):
+    """
+    {phase: seconds} from a metrics.capture() of one variant; time in no
+    phase (waiting for a politeness slot, the browser) is "unaccounted".
+    """
+    phases = {}
+    for (name, labels), seconds in captured.items():
+        if name == "phase_seconds":
+            phase = dict(labels)["phase"]
+            phases[phase] = phases.get(phase, 0.0) + seconds
+    phases["unaccounted"] = max(0.0, elapsed - sum(phases.values()))
+    return {p: round(s, 3) for p, s in sorted(phases.items(), key=lambda kv: -kv[1])}
+
+
+class VariantProfiler:
+    def __init__(self, directory=None, slow_sec=SLOW_SEC, sample_rate=SAMPLE_RATE, seed=None, log=print):
+        self.directory = Path(directory or metrics.METRICS_DIR / "traces")
+        self.slow_sec = slow_sec
+        self.sample_rate = sample_rate
+        self.rng = random.Random(seed)
+        self.log = log
+        self.traced = set()     # ids of contexts with tracing started
+
+    @classmethod
+    def from_env(cls, log=print):
+        return cls(
+            directory=os.getenv("SKU_TRACE_DIR") or None,
+            slow_sec=float(os.getenv("SKU_TRACE_SLOW_SEC", SLOW_SEC)),
+            sample_rate=float(os.getenv("SKU_TRACE_SAMPLE", SAMPLE_RATE)),
+            log=log,
+        )
+
+    @property
+    def enabled(self):
+        return self.slow_sec > 0 or self.sample_rate > 0
+
+    def attach(self, context):
+        """Start tracing `context` (once; a persistent profile's context is reused)."""
+        if not self.enabled or id(context) in self.traced:
+            return
+        try:
+            context.tracing.start(screenshots=False, snapshots=False, sources=False)
+        except Exception as e:
+            self.log(f"[PROFILE][WARN] tracing unavailable: {e}")
+            return
+        self.traced.add(id(context))
+
+    def begin(self, context, variant_id):
+        if id(context) not in self.traced:
+            return
+        try:
+            context.tracing.start_chunk(title=variant_id)
+        except Exception as e:
+            self.log(f"[PROFILE][WARN] {variant_id}: could not start a trace chunk: {e}")
+
+    def reason(self, elapsed):
+        if self.slow_sec and elapsed >= self.slow_sec:
+            return "slow"
+        if self.sample_rate and self.rng.random() < self.sample_rate:
+            return "sample"
+        return None
+
+    def end(self, context, variant_id, elapsed, status, captured):
+        """Keep or drop the variant's chunk; returns the summary entry of a kept one."""
+        reason = self.reason(elapsed)
+        path = None
+        if id(context) in self.traced:
+            try:
+                if reason:
+                    self.directory.mkdir(parents=True, exist_ok=True)
+                    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+                    path = self.directory / f"{variant_id}-{reason}-{stamp}.zip"
+                    context.tracing.stop_chunk(path=str(path))
+                else:
+                    context.tracing.stop_chunk()
+            except Exception as e:
+                self.log(f"[PROFILE][WARN] {variant_id}: could not save the trace: {e}")
+                path = None
+
+        if not reason:
+            return None
+
+        phases = phase_breakdown(captured, elapsed)
+        slowest = next(iter(phases))
+        entry = {
+            "variant_id": variant_id,
+            "reason": reason,
+            "status": status,
+            "elapsed": round(elapsed, 3),
+            "slowest_phase": slowest,
+            "phases": phases,
+            "trace": str(path) if path else None,
+        }
+        metrics.incr("traces_total", reason=reason)
+        self.log(
+            f"[PROFILE] {variant_id} {elapsed:.1f}s ({reason}): {slowest} {phases[slowest]:.1f}s"
+            + "".join(f", {p} {s:.1f}s" for p, s in list(phases.items())[1:4])
+            + (f" — trace {path}" if path else "")
+        )
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with _summary_lock, open(self.directory / "summary.jsonl", "a") as f:
+            f.write(json.dumps(entry) + "\n")
+        return entry
@@ -0,0 +1,229 @@
+import json
+import random
+import sqlite3
+from datetime import datetime, timedelta
+
+from src.notifiers.rules import USER_NOTIFICATION_RULES
+
+# --------------------------------------------------
+# Variant scheduling
+#
+# Orders catalog variants by expected value so a limited run (dev's
+# max_variants, a time budget, a shard that gets cut off) reaches the deals
+# subscribers want first:
+#
+#   score = deal * (DEMAND_FLOOR + demand) + volatility + staleness
+#
+#   deal        - tile discount and price (0..1; 0.5 when the tile had none)
+#   demand      - share of subscribers whose rules could match the variant
+#   volatility  - how often its price / availability changed lately
+#   staleness   - time since it was last scraped
+#
+# A budget takes the top of the ranking plus a random, score-weighted
+# sample of the rest, so the long tail is still visited now and then;
+# staleness makes whatever was skipped rank higher next run.
+# --------------------------------------------------
+
+WEIGHTS = {
+    "discount": 0.5,
+    "price": 0.5,
+    "volatility": 0.3,
+    "staleness": 0.2,
+}
+DEMAND_FLOOR = 0.1          # variants no one subscribes to still rank by deal
+PRICE_CAP = 60.0            # £ at which the price term reaches 0
+STALE_HOURS = 72            # staleness term saturates after this long
+HISTORY_DAYS = 14
+TAIL_SHARE = 0.2            # fraction of a budget sampled from the long tail
+
+
+def _load(value):
+    return None if value is None else json.loads(value)
+
+
+def load_rules(conn):
+    """
+    Active subscription rules as (user, catalog, rule) from the subscription
+    tables; rules.py's USER_NOTIFICATION_RULES when the tables are empty
+    (e.g. a fresh shard database).
+    """
+    try:
+        rows = conn.execute("""
+            SELECT r.user_id, r.catalog, r.sizes, r.max_price, r.min_discount, r.product_ids
+            FROM uniqlo_rules r
+            JOIN uniqlo_users u ON u.user_id = r.user_id
+            WHERE r.active = 1 AND u.active = 1
+        """).fetchall()
+    except sqlite3.OperationalError:
+        rows = []
+
+    if rows:
+        return [
+            (user, catalog, {
+                "sizes": _load(sizes),
+                "max_price": max_price,
+                "min_discount": min_discount,
+                "product_ids": _load(product_ids),
+            })
+            for user, catalog, sizes, max_price, min_discount, product_ids in rows
+        ]
+
+    return [
+        (user, catalog, rule)
+        for user, cfg in USER_NOTIFICATION_RULES.items()
+        if cfg.get("chat_id") or cfg.get("channels")
+        for catalogs in cfg.get("events", {}).values()
+        for catalog, rule in catalogs.items()
+    ]
+
+
+def load_history(conn, since):
+    """
+    variant_id -> (last observed_at, runs, price changes, availability
+    changes, sizes seen) over uniqlo_sku_state since `since`.
+    """
+    history = {}
+    for variant_id, last_seen, runs, prices, availability in conn.execute("""
+        SELECT
+            source_variant_id,
+            MAX(observed_at),
+            COUNT(*),
+            COUNT(DISTINCT price),
+            COUNT(DISTINCT available)
+        FROM (
+            SELECT
+                source_variant_id,
+                observed_at,
+                MIN(sale_price) AS price,
+                SUM(is_available) AS available
+            FROM uniqlo_sku_state
+            WHERE observed_at >= ?
+            GROUP BY source_variant_id, observed_at
+        )
+        GROUP BY source_variant_id
+    """, (since,)):
+        history[variant_id] = (last_seen, runs, prices - 1, availability - 1, set())
+
+    for variant_id, size_label in conn.execute("""
+        SELECT DISTINCT source_variant_id, size_label
+        FROM uniqlo_sku_state
+        WHERE observed_at >= ?
+    """, (since,)):
+        history[variant_id][4].add(size_label)
+
+    return history
+
+
+class VariantScheduler:
+    """
+    Scores catalog variants (uniqlo_sale_variants rows from `catalog` on,
+    i.e. catalog, product_id, variant_id, url, name, list_price,
+    list_discount_pct).
+    """
+
+    def __init__(self, rules, history=None, now=None, weights=None, seed=0):
+        self.users = {user for user, _, _ in rules} or {None}
+
+        # catalog -> users with an unconditional rule, and the other rules
+        self.always = {}
+        self.conditional = {}
+        for user, catalog, rule in rules:
+            if any(rule.get(k) for k in ("sizes", "product_ids")) or any(
+                rule.get(k) is not None for k in ("max_price", "min_discount")
+            ):
+                self.conditional.setdefault(catalog, []).append((user, rule))
+            else:
+                self.always.setdefault(catalog, set()).add(user)
+
+        self.history = history or {}
+        self.now = now or datetime.utcnow()
+        self.weights = dict(WEIGHTS, **(weights or {}))
+        self.random = random.Random(seed)
+
+    @classmethod
+    def from_db(cls, conn, now=None, **kwargs):
+        now = now or datetime.utcnow()
+        since = (now - timedelta(days=HISTORY_DAYS)).isoformat()
+        return cls(load_rules(conn), load_history(conn, since), now=now, **kwargs)
+
+    # ---- terms ----
+
+    def deal(self, price, discount):
+        if price is None or discount is None:
+            return 0.5
+        w = self.weights
+        price_term = 1 - min(price, PRICE_CAP) / PRICE_CAP
+        return (w["discount"] * discount / 100 + w["price"] * price_term) / (w["discount"] + w["price"])
+
+    def demand(self, catalog, product_id, price, discount, sizes_seen):
+        """Share of subscribers with a rule that could match this variant."""
+        wanting = set(self.always.get(catalog, ()))
+        for user, rule in self.conditional.get(catalog, ()):
+            if user in wanting:
+                continue
+            if rule.get("product_ids") and product_id not in rule["product_ids"]:
+                continue
+            if rule.get("max_price") is not None and price is not None and price > rule["max_price"]:
+                continue
+            if rule.get("min_discount") is not None and discount is not None and discount < rule["min_discount"]:
+                continue
+            if rule.get("sizes") and sizes_seen and not sizes_seen & set(rule["sizes"]):
+                continue
+            wanting.add(user)
+        return len(wanting) / len(self.users)
+
+    def score(self, variant):
+        catalog, product_id, variant_id, _url, _name, price, discount = variant[:7]
+        last_seen, runs, price_changes, availability_changes, sizes = self.history.get(
+            variant_id, (None, 0, 0, 0, set())
+        )
+
+        if last_seen:
+            hours = (self.now - datetime.fromisoformat(last_seen)).total_seconds() / 3600
+            staleness = min(hours / STALE_HOURS, 1.0)
+        else:
+            staleness = 1.0
+
+        volatility = (price_changes + availability_changes) / runs if runs > 1 else 0.0
+
+        return (
+            self.deal(price, discount)
+            * (DEMAND_FLOOR + self.demand(catalog, product_id, price, discount, sizes))
+            + self.weights["volatility"] * min(volatility, 1.0)
+            + self.weights["staleness"] * staleness
+        )
+
+    # ---- planning ----
+
+    def rank(self, variants):
+        """[(score, variant)], best first."""
+        scored = [(self.score(v), v) for v in variants]
+        scored.sort(key=lambda sv: (-sv[0], sv[1][0], sv[1][2]))
+        return scored
+
+    def plan(self, variants, budget=None, tail_share=TAIL_SHARE):
+        """
+        Variants in scrape order. With a budget: the best
+        (1 - tail_share) * budget, then a score-weighted random sample of
+        the rest.
+        """
+        ranked = self.rank(variants)
+        if not budget or budget >= len(ranked):
+            return [v for _, v in ranked]
+
+        head_n = budget - int(budget * tail_share)
+        head, tail = ranked[:head_n], ranked[head_n:]
+
+        # Efraimidis-Spirakis weighted sampling without replacement
+        keyed = [(self.random.random() ** (1 / max(score, 1e-6)), v) for score, v in tail]
+        keyed.sort(key=lambda kv: kv[0], reverse=True)
+        return [v for _, v in head] + [v for _, v in keyed[:budget - head_n]]
+
+
+def schedule(conn, variants, budget=None, log=print):
+    scheduler = VariantScheduler.from_db(conn)
+    planned = scheduler.plan(variants, budget)
+    if planned:
+        top = ", ".join(f"{scheduler.score(v):.2f}" for v in planned[:3])
+        log(f"[SCHED] {len(planned)}/{len(variants)} variants scheduled, top scores {top}")
+    return planned
@@ -1,9 +1,23 @@
-from playwright.sync_api import sync_playwright
 from datetime import datetime
+import argparse
+import os
 import sqlite3
 import time
+import uuid
 from urllib.parse import urlparse
 
+from db.schema import init_db, init_shard
+from src import metrics
+from src.deadline import Deadline
+from src.runs import record_run, run_row
+from src.scrapers.browser import browser_session
+from src.scrapers.profiling import VariantProfiler
+from src.scrapers.politeness import (
+    BASE_TIMEOUTS_MS, Blocked, PolitenessController, check_response, check_status,
+)
+from src.scrapers.scheduler import schedule
+from src.scrapers.shards import copy_catalog, finish_shard, in_shard, parse_shard, start_shard
+
 # --------------------------------------------------
 # DOM helpers
 # --------------------------------------------------
@@ -12,18 +26,6 @@ def read_sku_path(page):
         () => window.location.pathname
     """)
 
-def kill_overlays(page):
-    page.add_style_tag(content="""
-        #onetrust-consent-sdk,
-        .template-base-sticky-container,
-        #attentive_overlay,
-        iframe {
-            display: none !important;
-            visibility: hidden !important;
-            pointer-events: none !important;
-        }
-    """)
-
 def get_colors(page):
     """
     Returns enabled color chips only.
@@ -47,7 +49,7 @@ def get_colors(page):
         }).filter(Boolean);
     """)
 
-def select_color(page, color_id):
+def select_color(page, color_id, timeout=3000):
     page.evaluate("""
         (id) => {
             const btn = document.getElementById(id);
@@ -58,7 +60,7 @@ def select_color(page, color_id):
 
     page.wait_for_function("""
         () => document.querySelector('.fr-ec-price-text--color-promotional')
-    """, timeout=3000)
+    """, timeout=timeout)
 
 def read_price(page):
     return page.evaluate("""
@@ -115,152 +117,453 @@ def read_sizes(page):
 # Core scraper
 # --------------------------------------------------
 
-def scrape_sku_state(conn: sqlite3.Connection, log=print, max_variants=None):
+INSERT_SKU_STATE_SQL = """
+        INSERT OR REPLACE INTO uniqlo_sku_state (
+            observed_at,
+            catalog,
+            product_id,
+            source_variant_id,
+            product_name,
+            sku_path,
+            color_code,
+            color_label,
+            size_code,
+            size_label,
+            sale_price,
+            original_price,
+            discount_pct,
+            is_available
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def scrape_variant(page, variant, observed_at, rows, log=print, timeout=None, loaded=False):
     """
-    Canonical SKU truth scraper.
+    Read every color / size of one variant page into `rows` (appended as
+    they are read, so a failure part-way keeps what was scraped).
 
-    Populates uniqlo_sku_state with:
-    - price per (variant, color)
-    - availability per (variant, color, size)
+    timeout(kind) gives page timeouts in ms (PolitenessController.timeout);
+    raises Blocked if the site answers with a rate-limit status. loaded:
+    the page is already on the variant (prefetched).
+    """
+    catalog, product_id, source_variant_id, url, product_name = variant
+    timeout = timeout or BASE_TIMEOUTS_MS.get
+
+    if not loaded:
+        with metrics.timer("phase_seconds", phase="goto"):
+            check_response(
+                page.goto(url, timeout=timeout("goto"), wait_until="domcontentloaded"),
+                url,
+            )
+    with metrics.timer("phase_seconds", phase="chip_wait"):
+        page.wait_for_selector(
+            "button[data-testid='ITOChip'] img",
+            timeout=timeout("chips")
+        )
+    with metrics.timer("phase_seconds", phase="color_chip_wait"):
+        page.wait_for_selector(
+            "button[data-testid='ITOChip'] img[src*='/chip/goods_']",
+            timeout=timeout("chips")
+        )
+        colors = get_colors(page)
+
+    if not colors:
+        log(f"[SKU] {source_variant_id}: no colors found")
+        return
+
+    for color in colors:
+        with metrics.timer("phase_seconds", phase="color_select"):
+            select_color(page, color["id"], timeout("color"))
+        # sku_path = read_sku_path(page)
+        sku_path = urlparse(url).path
+        if not sku_path or "/products/" not in sku_path:
+            log(f"[WARN] unresolved SKU for {source_variant_id}")
+            continue
+
+        with metrics.timer("phase_seconds", phase="price_read"):
+            price = read_price(page)
+        log(
+            f"[DEBUG] PRICE {source_variant_id} "
+            f"{color['color_label']} → {price}"
+        )
+        if not price:
+            continue  # HARD SKIP: no discounted price
+
+        with metrics.timer("phase_seconds", phase="size_read"):
+            sizes = read_sizes(page)
+        if not sizes:
+            continue
+
+        for s in sizes:
+            log(f"[DEBUG] INSERT → "
+                f"{source_variant_id} "
+                f"{color['color_label']} "
+                f"{s['size_label']} "
+                f"£{price}")
+            rows.append((
+                observed_at,
+                catalog,
+                product_id,
+                source_variant_id,
+                product_name,
+                sku_path,
+                color["color_code"],
+                color["color_label"],
+                s["size_code"],
+                s["size_label"],
+                price["sale_price"],
+                price["original_price"],
+                price["discount_pct"],
+                s["is_available"],
+            ))
+
+
+# --------------------------------------------------
+# Prefetch
+#
+# With prefetch on, a worker drives two pages in its one context: while
+# variant i's colors are read on one page, variant i+1 is already loading
+# on the other. At most one navigation per worker is ahead of the page
+# being read, and only when the politeness controller has a free slot for
+# it right now; otherwise the next variant loads after this one, as
+# without prefetch.
+# --------------------------------------------------
+
+PREFETCH = os.getenv("SKU_PREFETCH", "0") == "1"
+
+
+class Navigation:
+    """A page load started without waiting for it (see wait())."""
+
+    def __init__(self, page, url):
+        self.page = page
+        self.url = url
+        self.path = urlparse(url).path
+        if urlparse(page.url).path == self.path:
+            # same variant again: wait() could not tell the old load from the new
+            page.goto("about:blank")
+        # location.href returns at once, unlike page.goto
+        page.evaluate("(url) => { window.location.href = url; }", url)
+
+    def wait(self, timeout):
+        """Block until the page is at DOMContentLoaded; raise Blocked on a block status."""
+        with metrics.timer("phase_seconds", phase="prefetch_wait"):
+            self.page.wait_for_url(
+                lambda u: urlparse(u).path == self.path,
+                wait_until="domcontentloaded",
+                timeout=timeout,
+            )
+        check_status(self.page.evaluate("""
+            () => {
+                const nav = performance.getEntriesByType("navigation")[0];
+                return nav ? nav.responseStatus : null;
+            }
+        """), self.url)
+
+
+def _named(variants, log, total):
+    """Variants that have a catalog product name."""
+    for idx, variant in enumerate(variants, 1):
+        log(f"[SKU] [{idx}/{total or '?'}] {variant[2]}")
+        if not variant[4]:
+            log(f"[SKU][DROP] missing catalog product name for {variant[2]}")
+            continue
+        yield variant
+
+
+def _run_variant(page, variant, observed_at, request, log, timeout, navigation=None, deadline=None,
+                 profiler=None):
+    """
+    Scrape one variant inside its politeness slot and release the slot;
+    returns its rows (the ones read before a failure, if it failed).
+    The time it took feeds the deadline's per-variant estimate; profiler
+    keeps a trace of it if it was slow or sampled.
+    """
+    source_variant_id = variant[2]
+    start = time.time()
+    # latency counts from when this variant is worked on, not from when
+    # its prefetch started
+    request.start = time.monotonic()
+    rows = []
+    status = "ok"
+
+    if profiler:
+        profiler.begin(page.context, source_variant_id)
+
+    with request, metrics.capture() as captured:
+        try:
+            if navigation:
+                navigation.wait(timeout("goto"))
+            scrape_variant(page, variant, observed_at, rows, log, timeout, loaded=navigation is not None)
+        except Exception as e:
+            log(f"[WARN] {source_variant_id} failed: {e}")
+            request.ok = False
+            request.blocked = isinstance(e, Blocked)
+            status = "blocked" if request.blocked else "failed"
+        finally:
+            elapsed = time.time() - start
+            log(f"[SKU] {source_variant_id} elapsed {elapsed:.1f}s")
+            metrics.observe("variant_seconds", elapsed, status=status)
+            metrics.incr("variants_total", status=status)
+            metrics.incr("sku_rows_total", len(rows))
+            if deadline:
+                deadline.observe(elapsed)
+            if profiler:
+                profiler.end(page.context, source_variant_id, elapsed, status, captured)
+
+    return rows
+
+
+class _Failed:
+    def __init__(self, error):
+        self.error = error
+
+    def wait(self, timeout):
+        raise self.error
+
+
+def _start(page, variant, log):
+    """Start loading `variant` on `page`; a failure surfaces in wait()."""
+    try:
+        return Navigation(page, variant[3])
+    except Exception as e:
+        log(f"[SKU][WARN] could not start {variant[2]}: {e}")
+        return _Failed(e)
+
+
+def _iter_prefetched(pages, variants, observed_at, log, total, controller, deadline=None):
+    page, spare = pages
+    pending = _named(variants, log, total)
+
+    current = next(pending, None)
+    if current is None:
+        return
+    request = controller.slot()
+    request.__enter__()
+    navigation = _start(page, current, log)
+    ahead = None
+
+    try:
+        while current:
+            upcoming = next(pending, None)
+            if upcoming:
+                ahead_request = controller.try_slot()
+                if ahead_request:
+                    metrics.incr("prefetch_total", status="ahead")
+                    ahead = (upcoming, ahead_request, _start(spare, upcoming, log))
+                else:
+                    metrics.incr("prefetch_total", status="no_slot")
+
+            rows = _run_variant(
+                page, current, observed_at, request, log, controller.timeout, navigation, deadline,
+            )
+            if rows:
+                yield rows
+
+            if ahead:
+                (current, request, navigation), ahead = ahead, None
+                page, spare = spare, page
+            elif upcoming:
+                current, request = upcoming, controller.slot()
+                request.__enter__()
+                navigation = _start(page, current, log)
+            else:
+                current = None
+    finally:
+        # closed early (pipeline abort, daemon stop): free held slots
+        request.__exit__(None, None, None)
+        if ahead:
+            ahead[1].__exit__(None, None, None)
+
+
+def iter_sku_rows(variants, observed_at, log=print, total=None, controller=None, session=None,
+                  prefetch=None, deadline=None, profiler=None):
+    """
+    Scrape (catalog, product_id, variant_id, url, name) variants in one
+    browser and yield each variant's rows as soon as it is done.
+
+    `variants` may be any iterable, including one fed by another thread
+    (the pipelined orchestrator); total is only used for progress logs.
+    Each variant page is one request through `controller`, which paces
+    them and sets their timeouts; pass a shared one when several threads
+    scrape at once. `session` (browser.py) is reused and left open when
+    given; its contexts already hide overlays and carry cookie consent.
+
+    prefetch (default SKU_PREFETCH, off unless it is "1") loads the next
+    variant on a second page of the same context while the current one is
+    read.
+
+    deadline (src/deadline.py): no new variant is taken once one more would
+    not finish within the run's time budget; the one in hand is completed.
+
+    profiler (default VariantProfiler.from_env(), see profiling.py) saves
+    Playwright traces of slow and sampled variants. Tracing turns prefetch
+    off, so each variant's trace chunk holds its own page load and nothing
+    of its neighbour's; set SKU_TRACE_SLOW_SEC=0 and SKU_TRACE_SAMPLE=0
+    to prefetch.
+    """
+    prefetch = PREFETCH if prefetch is None else prefetch
+    if deadline:
+        variants = deadline.take(variants)
+    profiler = profiler or VariantProfiler.from_env(log=log)
+    if prefetch and profiler.enabled:
+        # a context has one trace and its chunks cannot overlap: a
+        # prefetched load would land in the previous variant's chunk
+        log("[PROFILE] tracing is on: variants load one at a time (no prefetch)")
+        prefetch = False
+    # a prefetch needs a second slot, which the controller grants once the
+    # site has shown it copes
+    controller = controller or PolitenessController.from_env(max_concurrency=2 if prefetch else 1, log=log)
+
+    with browser_session(session, log) as session:
+        context = session.new_context()
+        try:
+            if prefetch:
+                pages = (context.new_page(), context.new_page())
+                yield from _iter_prefetched(pages, variants, observed_at, log, total, controller, deadline)
+                return
+
+            page = context.new_page()
+            profiler.attach(page.context)
+            for variant in _named(variants, log, total):
+                variant_rows = _run_variant(
+                    page, variant, observed_at, controller.slot(), log, controller.timeout,
+                    deadline=deadline, profiler=profiler,
+                )
+                with metrics.timer("phase_seconds", phase="reset"):
+                    page.goto("about:blank")
+
+                if variant_rows:
+                    yield variant_rows
+        finally:
+            context.close()
+
+
+def load_variants(conn, max_variants=None, shard=None, log=print):
+    """
+    Variants to scrape from uniqlo_sale_variants, best first (see
+    src/scrapers/scheduler.py); max_variants is a budget for the
+    scheduler, not a truncation. shard=(i, N) keeps only the variants that
+    hash to shard i.
     """
-    log(conn.execute(
-        "SELECT name FROM sqlite_master WHERE type='table'"
-    ).fetchall())
     variants = conn.execute("""
                 SELECT
                     catalog,
                     product_id,
                     variant_id,
                     variant_url,
-                    name
+                    name,
+                    list_price,
+                    list_discount_pct
                 FROM uniqlo_sale_variants
                 ORDER BY catalog, variant_id
     """).fetchall()
 
-    if max_variants:
-        variants = variants[:max_variants]
+    if shard:
+        variants = [v for v in variants if in_shard(v[2], shard)]
+
+    return [v[:5] for v in schedule(conn, variants, max_variants, log)]
+
+
+def scrape_sku_state(conn: sqlite3.Connection, log=print, max_variants=None, on_rows=None, shard=None, session=None,
+                     deadline=None, variants=None):
+    """
+    Canonical SKU truth scraper.
+
+    Populates uniqlo_sku_state with:
+    - price per (variant, color)
+    - availability per (variant, color, size)
+
+    on_rows, if given, is called with each variant's rows (uniqlo_sku_state
+    column order) as soon as all its colors are read, so detection can run
+    while the rest of the catalog is still being scraped.
+
+    shard=(i, N) scrapes only the variants hashing to shard i (see
+    src/scrapers/shards.py), so N processes can split one catalog.
+
+    session: a BrowserSession to reuse, e.g. the one scrape_catalog used.
+
+    deadline: a Deadline (src/deadline.py); once it cuts the run short the
+    variants not yet started are skipped. Rows are committed per variant,
+    so whatever was scraped is kept either way.
+
+    variants: the list load_variants already returned, e.g. the one a shard
+    recorded with start_shard; the scheduler orders by staleness against
+    now, so loading again could pick a different set.
+    """
+    log(conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='table'"
+    ).fetchall())
+    if variants is None:
+        variants = load_variants(conn, max_variants, shard, log)
 
     if not variants:
         log("[SKU] No variants to scrape")
         return
 
-    log(f"[SKU] Starting SKU STATE scrape — variants: {len(variants)}")
+    shard_text = f" (shard {shard[0]}/{shard[1]})" if shard else ""
+    log(f"[SKU] Starting SKU STATE scrape — variants: {len(variants)}{shard_text}")
 
-    rows = []
+    written = 0
     observed_at = datetime.utcnow().isoformat()
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True) ##
-        context = browser.new_context()
-        page = context.new_page()
-
-        for idx, (catalog, product_id, source_variant_id, url, product_name) in enumerate(variants, 1):
-            log(f"[SKU] [{idx}/{len(variants)}] {source_variant_id}")
-            if not product_name:
-                log(f"[SKU][DROP] missing catalog product name for {source_variant_id}")
-                continue
-            start = time.time()
-
-            try:
-                page.goto(url, timeout=30000, wait_until="domcontentloaded")
-                page.wait_for_selector(
-                    "button[data-testid='ITOChip'] img",
-                    timeout=8000
-                )
-                kill_overlays(page)
-
-                try:
-                    page.click("#onetrust-accept-btn-handler", timeout=3000)
-                except:
-                    pass
-                page.wait_for_selector(
-                    "button[data-testid='ITOChip'] img[src*='/chip/goods_']",
-                    timeout=8000
-                )
-                colors = get_colors(page)
-
-                if not colors:
-                    log(f"[SKU] {source_variant_id}: no colors found")
-                    continue
-
-                for color in colors:
-                    select_color(page, color["id"])
-                    # sku_path = read_sku_path(page)
-                    sku_path = urlparse(url).path
-                    if not sku_path or "/products/" not in sku_path:
-                        log(f"[WARN] unresolved SKU for {source_variant_id}")
-                        continue
-
-                    price = read_price(page)
-                    log(
-                        f"[DEBUG] PRICE {source_variant_id} "
-                        f"{color['color_label']} → {price}"
-                    )
-                    if not price:
-                        continue  # HARD SKIP: no discounted price
-
-                    sizes = read_sizes(page)
-                    if not sizes:
-                        continue
-
-                    for s in sizes:
-                        log(f"[DEBUG] INSERT → "
-                            f"{source_variant_id} "
-                            f"{color['color_label']} "
-                            f"{s['size_label']} "
-                            f"£{price}")
-                        rows.append((
-                            observed_at,
-                            catalog,
-                            product_id,
-                            source_variant_id,
-                            product_name,
-                            sku_path,
-                            color["color_code"],
-                            color["color_label"],
-                            s["size_code"],
-                            s["size_label"],
-                            price["sale_price"],
-                            price["original_price"],
-                            price["discount_pct"],
-                            s["is_available"],
-                        ))
-
-            except Exception as e:
-                log(f"[WARN] {source_variant_id} failed: {e}")
-
-            finally:
-                elapsed = time.time() - start
-                log(f"[SKU] {source_variant_id} elapsed {elapsed:.1f}s")
-                page.goto("about:blank")
-
-        browser.close()
-
-    if not rows:
+    for variant_rows in iter_sku_rows(variants, observed_at, log, total=len(variants), session=session,
+                                      deadline=deadline):
+        with metrics.timer("db_write_seconds", table="uniqlo_sku_state"):
+            conn.executemany(INSERT_SKU_STATE_SQL, variant_rows)
+            conn.commit()
+        written += len(variant_rows)
+        if on_rows:
+            on_rows(variant_rows)
+
+    if not written:
         log("[SKU] No SKU rows collected")
-        return
+    elif deadline and deadline.cut:
+        log(f"[SKU] SKU STATE scrape stopped at its time budget: {written} SKU rows persisted")
+    else:
+        log(f"[SKU] SKU STATE scrape complete: {written} SKU rows persisted")
 
-    log(f"[SKU] Persisting {len(rows)} SKU rows")
 
-    conn.executemany("""
-            INSERT OR REPLACE INTO uniqlo_sku_state (
-                observed_at,
-                catalog,
-                product_id,
-                source_variant_id,
-                product_name,
-                sku_path,
-                color_code,
-                color_label,
-                size_code,
-                size_label,
-                sale_price,
-                original_price,
-                discount_pct,
-                is_available
-            )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, rows)
+# --------------------------------------------------
+# CLI: one shard of a horizontally split scrape
+# --------------------------------------------------
 
-    conn.commit()
-    log("[SKU] SKU STATE scrape complete")
\ No newline at end of file
+def main():
+    parser = argparse.ArgumentParser(description="Scrape SKU state, optionally one shard of it")
+    parser.add_argument("--db", required=True, help="database to write (one per shard)")
+    parser.add_argument("--catalog-db", help="copy uniqlo_sale_variants from here first")
+    parser.add_argument("--shard", type=parse_shard, help="i/N, e.g. 0/4")
+    parser.add_argument("--max-variants", type=int)
+    parser.add_argument("--time-budget", type=float, metavar="MINUTES",
+                        help="stop taking variants in time to finish within this (default TIME_BUDGET_MIN)")
+    args = parser.parse_args()
+    deadline = Deadline.from_env(args.time_budget)
+
+    conn = sqlite3.connect(args.db)
+    init_db(conn)
+    init_shard(conn)
+    if args.catalog_db:
+        copy_catalog(conn, args.catalog_db)
+
+    shard = args.shard or (0, 1)
+    spec = f"{shard[0]}/{shard[1]}"
+    run_id = uuid.uuid4().hex
+    started_at = datetime.utcnow().isoformat()
+    status = "failed"
+    try:
+        # the variants recorded as assigned are exactly the ones scraped
+        variants = load_variants(conn, args.max_variants, shard)
+        start_shard(conn, shard, variants, args.max_variants)
+        scrape_sku_state(conn, max_variants=args.max_variants, shard=shard, deadline=deadline, variants=variants)
+        finish_shard(conn, partial=deadline.cut)
+        status = deadline.status
+    finally:
+        # the ledger row travels to the canonical database with the merge
+        record_run(conn, run_row(run_id, "sku", started_at, datetime.utcnow().isoformat(), status, shard=spec))
+        conn.close()
+        metrics.write_reports(f"run-shard-{shard[0]}", run_id=run_id, stage="sku", shard=spec, status=status)
+
+
+if __name__ == "__main__":
+    main()
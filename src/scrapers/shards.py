@@ -0,0 +1,254 @@
+import argparse
+import sqlite3
+import sys
+import zlib
+from datetime import datetime
+from pathlib import Path
+
+from db.schema import init_db
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+DB_PATH = BASE_DIR / "db" / "uniqlo.sqlite"
+
+# --------------------------------------------------
+# Shard specs
+#
+# A variant belongs to shard crc32(variant_id) % N. crc32 is stable across
+# processes and Python versions (unlike hash()), so every job computes the
+# same partition without talking to the others. Keying on variant_id alone
+# keeps a variant listed in both catalogs on one shard.
+# --------------------------------------------------
+
+def parse_shard(spec):
+    """'2/8' -> (2, 8); shards are numbered from 0."""
+    try:
+        index, count = (int(x) for x in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"shard spec must look like i/N, got {spec!r}")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"shard index out of range: {spec!r}")
+    return index, count
+
+
+def shard_of(variant_id, count):
+    return zlib.crc32(variant_id.encode()) % count
+
+
+def in_shard(variant_id, shard):
+    index, count = shard
+    return shard_of(variant_id, count) == index
+
+
+# --------------------------------------------------
+# Shard databases (written by scrape_sku_state --shard)
+# --------------------------------------------------
+
+VARIANT_COLUMNS = (
+    "scrape_id, scraped_at, catalog, product_id, variant_id, variant_url, name, "
+    "list_price, list_discount_pct"
+)
+
+
+def copy_catalog(conn, catalog_db):
+    """Load uniqlo_sale_variants from the database the catalog job wrote."""
+    conn.execute("ATTACH DATABASE ? AS src", (str(catalog_db),))
+    try:
+        conn.execute("DELETE FROM uniqlo_sale_variants")
+        conn.execute(f"""
+            INSERT INTO uniqlo_sale_variants ({VARIANT_COLUMNS})
+            SELECT {VARIANT_COLUMNS} FROM src.uniqlo_sale_variants
+        """)
+        conn.commit()
+    finally:
+        conn.execute("DETACH DATABASE src")
+
+
+def start_shard(conn, shard, variants, max_variants=None):
+    """Record the shard's spec and the variants it is about to scrape."""
+    conn.execute("DELETE FROM uniqlo_shard")
+    conn.execute("DELETE FROM uniqlo_shard_variants")
+    conn.execute(
+        "INSERT INTO uniqlo_shard (shard_index, shard_count, max_variants, started_at) VALUES (?, ?, ?, ?)",
+        (*shard, max_variants, datetime.utcnow().isoformat()),
+    )
+    conn.executemany(
+        "INSERT INTO uniqlo_shard_variants (catalog, variant_id) VALUES (?, ?)",
+        [(v[0], v[2]) for v in variants],
+    )
+    conn.commit()
+
+
+def finish_shard(conn, partial=False):
+    """partial: the shard stopped at its time budget before every assigned variant."""
+    conn.execute(
+        "UPDATE uniqlo_shard SET completed_at = ?, partial = ?",
+        (datetime.utcnow().isoformat(), int(partial)),
+    )
+    conn.commit()
+
+
+# --------------------------------------------------
+# Merge
+# --------------------------------------------------
+
+class MergeError(Exception):
+    pass
+
+
+def read_shard(path):
+    """(meta, assigned variants, SKU rows) of one shard database."""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        meta = conn.execute("""
+            SELECT shard_index, shard_count, max_variants, completed_at, partial
+            FROM uniqlo_shard
+        """).fetchone()
+        assigned = conn.execute(
+            "SELECT catalog, variant_id FROM uniqlo_shard_variants"
+        ).fetchall()
+        rows = conn.execute("""
+            SELECT * FROM uniqlo_sku_state
+            ORDER BY catalog, source_variant_id, color_code, size_code
+        """).fetchall()
+    except sqlite3.OperationalError:
+        raise MergeError(f"{path}: not a shard database")
+    finally:
+        conn.close()
+
+    if not meta:
+        raise MergeError(f"{path}: not a shard database")
+    return meta, assigned, rows
+
+
+def check_shards(shards):
+    """
+    shards: [(meta, assigned, rows, path)]. Returns (errors, gaps):
+    errors can never be merged; gaps (missing or unfinished shards) only
+    with allow_missing.
+    """
+    errors, gaps = [], []
+
+    counts = {meta[1] for meta, *_ in shards}
+    if len(counts) > 1:
+        errors.append(f"shards disagree on N: {sorted(counts)}")
+
+    indexes = sorted(meta[0] for meta, *_ in shards)
+    duplicated = sorted({i for i in indexes if indexes.count(i) > 1})
+    if duplicated:
+        errors.append(f"shards given more than once: {duplicated}")
+
+    for (index, count, _, completed_at, _), assigned, _, path in shards:
+        wrong = [v for _, v in assigned if shard_of(v, count) != index]
+        if wrong:
+            errors.append(f"shard {index}/{count} scraped {len(wrong)} variants of other shards, e.g. {wrong[0]}")
+        if not completed_at:
+            gaps.append(f"shard {index}/{count} did not finish ({path})")
+
+    if len(counts) == 1:
+        missing = sorted(set(range(counts.pop())) - set(indexes))
+        if missing:
+            gaps.append(f"missing shards: {missing}")
+
+    return errors, gaps
+
+
+def merge_shards(conn, paths, log=print, allow_missing=False):
+    """
+    Append shard databases' SKU rows to conn (the canonical uniqlo.sqlite,
+    which holds the catalog the shards were cut from).
+
+    Checks before anything is written:
+    - every shard 0..N-1 is present exactly once and finished (a shard
+      that stopped at its time budget counts as finished: it is merged
+      and reported as partial)
+    - no variant was scraped by a shard it does not hash to
+    - no SKU (catalog, variant, color, size) came back from two shards
+    - every catalog variant was assigned to some shard
+    - the shards have not been merged already
+
+    Rows go in in shard order, so the result does not depend on the order
+    the files were given in. Raises MergeError if a check fails;
+    allow_missing lets a partial run (missing / unfinished shards,
+    unassigned variants) through with a warning.
+    """
+    shards = sorted(
+        (read_shard(path) + (path,) for path in paths),
+        key=lambda s: s[0][0],
+    )
+
+    errors, gaps = check_shards(shards)
+    if errors or (gaps and not allow_missing):
+        raise MergeError("; ".join(errors + gaps))
+    for gap in gaps:
+        log(f"[MERGE][WARN] {gap}")
+
+    rows = [r for _, _, shard_rows, _ in shards for r in shard_rows]
+
+    seen, dupes = set(), []
+    for r in rows:
+        key = (r[1], r[3], r[6], r[8])
+        if key in seen:
+            dupes.append(key)
+        seen.add(key)
+    if dupes:
+        raise MergeError(f"{len(dupes)} SKUs came from more than one shard, e.g. {dupes[:3]}")
+
+    observed = sorted({r[0] for r in rows})
+    if observed and conn.execute(
+        f"SELECT 1 FROM uniqlo_sku_state WHERE observed_at IN ({', '.join('?' * len(observed))}) LIMIT 1",
+        observed,
+    ).fetchone():
+        raise MergeError("these shards are already merged")
+
+    assigned = {(c, v) for _, shard_assigned, _, _ in shards for c, v in shard_assigned}
+    catalog = set(conn.execute("SELECT catalog, variant_id FROM uniqlo_sale_variants"))
+    unassigned = sorted(catalog - assigned)
+    limited = any(meta[2] is not None for meta, *_ in shards)
+
+    if unassigned and limited:
+        log(f"[MERGE] {len(unassigned)} variants not scraped (shards ran with max_variants)")
+    elif unassigned and not allow_missing:
+        raise MergeError(f"{len(unassigned)} catalog variants in no shard, e.g. {unassigned[:5]}")
+    elif unassigned:
+        log(f"[MERGE][WARN] {len(unassigned)} catalog variants in no shard")
+
+    conn.executemany(f"""
+        INSERT INTO uniqlo_sku_state
+        VALUES ({', '.join('?' * 14)})
+    """, rows)
+    conn.commit()
+
+    for (index, count, _, _, partial), shard_assigned, shard_rows, path in shards:
+        scraped = len({(r[1], r[3]) for r in shard_rows})
+        log(
+            f"[MERGE] shard {index}/{count}: {len(shard_assigned)} variants, {len(shard_rows)} rows ({path})"
+            + (f" — partial, stopped at its time budget with rows for {scraped} variants" if partial else "")
+        )
+    log(f"[MERGE] {len(rows)} SKU rows from {len(shards)} shards")
+    return rows
+
+
+# --------------------------------------------------
+# CLI
+# --------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge shard databases into uniqlo.sqlite")
+    parser.add_argument("shards", nargs="+", help="shard database files")
+    parser.add_argument("--db", default=str(DB_PATH), help="canonical database (holds the catalog)")
+    parser.add_argument("--allow-missing", action="store_true")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    init_db(conn)
+    try:
+        merge_shards(conn, args.shards, allow_missing=args.allow_missing)
+    except MergeError as e:
+        print(f"[MERGE][FAIL] {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
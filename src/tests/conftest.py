@@ -0,0 +1,14 @@
+import sqlite3
+
+import pytest
+
+from db.schema import init_db
+
+
+@pytest.fixture
+def conn():
+    """A fresh in-memory database with every table."""
+    conn = sqlite3.connect(":memory:")
+    init_db(conn)
+    yield conn
+    conn.close()
@@ -0,0 +1,237 @@
+import json
+import re
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --------------------------------------------------
+# Local stand-in for the Telegram Bot API
+# --------------------------------------------------
+
+SEND_MESSAGE_RE = re.compile(r"^/bot(?P<token>[^/]+)/sendMessage$")
+
+
+class FakeTelegramServer:
+    """
+    Serves POST /bot<token>/sendMessage on localhost and records messages.
+
+    Failure injection:
+    - rate_limit_every=n: every n-th request gets a 429 with retry_after
+    - fail_chats: chat ids that always get a 400 "chat not found"
+    - latency: seconds to sleep before answering
+
+    Use as a context manager; `api_base` is what TelegramSender expects.
+    """
+
+    def __init__(self, rate_limit_every=None, retry_after=1, fail_chats=(), latency=0.0):
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.fail_chats = {str(c) for c in fail_chats}
+        self.latency = latency
+
+        self.messages = []
+        self.requests = 0
+        self.lock = threading.Lock()
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def api_base(self):
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                if not SEND_MESSAGE_RE.match(self.path):
+                    return self._reply(404, {"ok": False, "error_code": 404, "description": "Not Found"})
+
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+
+                if server.latency:
+                    time.sleep(server.latency)
+
+                with server.lock:
+                    server.requests += 1
+                    n = server.requests
+
+                if server.rate_limit_every and n % server.rate_limit_every == 0:
+                    return self._reply(429, {
+                        "ok": False,
+                        "error_code": 429,
+                        "description": f"Too Many Requests: retry after {server.retry_after}",
+                        "parameters": {"retry_after": server.retry_after},
+                    })
+
+                if str(body.get("chat_id")) in server.fail_chats:
+                    return self._reply(400, {
+                        "ok": False,
+                        "error_code": 400,
+                        "description": "Bad Request: chat not found",
+                    })
+
+                with server.lock:
+                    server.messages.append(body)
+                    message_id = len(server.messages)
+
+                self._reply(200, {
+                    "ok": True,
+                    "result": {"message_id": message_id, "text": body.get("text")},
+                })
+
+        return Handler
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+# --------------------------------------------------
+# Local webhook receiver
+# --------------------------------------------------
+
+class FakeWebhookServer:
+    """
+    Accepts JSON POSTs on any path and records (path, body).
+    Paths listed in fail_paths get a 500.
+    """
+
+    def __init__(self, fail_paths=()):
+        self.fail_paths = set(fail_paths)
+        self.posts = []
+        self.lock = threading.Lock()
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def url(self, path="/hook"):
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}{path}"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+
+                status = 500 if self.path in server.fail_paths else 204
+                if status == 204:
+                    with server.lock:
+                        server.posts.append((self.path, body))
+
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+        return Handler
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+# --------------------------------------------------
+# Local SMTP sink
+# --------------------------------------------------
+
+class FakeSmtpServer:
+    """
+    Just enough SMTP (EHLO/HELO, MAIL, RCPT, DATA, RSET, NOOP, QUIT) for
+    smtplib to send through. Records (recipients, raw message) and the
+    number of connections opened.
+    """
+
+    def __init__(self):
+        self.messages = []
+        self.connections = 0
+        self.lock = threading.Lock()
+
+        self.server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def host(self):
+        return self.server.server_address[0]
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def _handler(self):
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line):
+                self.wfile.write(f"{line}\r\n".encode())
+
+            def handle(self):
+                with server.lock:
+                    server.connections += 1
+
+                rcpts = []
+                self.reply("220 fake ESMTP")
+                for raw in self.rfile:
+                    cmd = raw.decode().strip().upper()
+                    if cmd.startswith(("EHLO", "HELO")):
+                        self.reply("250 fake")
+                    elif cmd.startswith("MAIL"):
+                        rcpts = []
+                        self.reply("250 OK")
+                    elif cmd.startswith("RCPT"):
+                        rcpts.append(raw.decode().split(":", 1)[1].strip().strip("<>"))
+                        self.reply("250 OK")
+                    elif cmd == "DATA":
+                        self.reply("354 end with .")
+                        lines = []
+                        for data in self.rfile:
+                            if data in (b".\r\n", b".\n"):
+                                break
+                            lines.append(data)
+                        with server.lock:
+                            server.messages.append((rcpts, b"".join(lines).decode()))
+                        self.reply("250 queued")
+                    elif cmd == "QUIT":
+                        self.reply("221 bye")
+                        return
+                    else:
+                        self.reply("250 OK")
+
+        return Handler
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,75 @@
+import sqlite3
+
+import pytest
+
+from db.schema import init_db
+from src.backtest import load_rules, sweep
+from src.notifiers.subscriptions import add_rule, add_user
+from src.scrapers.scrape_sku_state import INSERT_SKU_STATE_SQL
+
+
+def _row(observed_at, product_id, size, sale, discount, available=1):
+    return (
+        observed_at, "men", product_id, f"E{product_id}-000", "Tee", f"/uk/en/products/E{product_id}-000/00",
+        "09", "BLACK", size, size, sale, 30.0, discount, available,
+    )
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = tmp_path / "backtest.sqlite"
+    conn = sqlite3.connect(path)
+    init_db(conn)
+    conn.executemany(INSERT_SKU_STATE_SQL, [
+        _row("2026-10-18T09:00:00", "000001", "M", 9.0, 70),
+        _row("2026-10-18T09:00:00", "000002", "M", 15.0, 50),
+        _row("2026-10-19T09:00:00", "000001", "M", 9.0, 70),
+        _row("2026-10-19T09:00:00", "000001", "L", 9.0, 70),
+        _row("2026-10-19T09:00:00", "000003", "M", 5.0, 80, available=0),
+    ])
+    add_user(conn, "any_m", [("webhook", "http://127.0.0.1:9/a")])
+    add_rule(conn, "any_m", "RARE_DEEP_DISCOUNT", "men", sizes=["M"])
+    add_user(conn, "cheap", [("webhook", "http://127.0.0.1:9/b")])
+    add_rule(conn, "cheap", "RARE_DEEP_DISCOUNT", "men", max_price=10)
+    add_user(conn, "watcher", [("webhook", "http://127.0.0.1:9/c")])
+    add_rule(conn, "watcher", "RARE_DEEP_DISCOUNT", "men", product_ids=["000002"], min_discount=40)
+    add_user(conn, "no_channel")
+    add_rule(conn, "no_channel", "RARE_DEEP_DISCOUNT", "men")
+    conn.commit()
+    conn.close()
+    return path
+
+
+def _per_user(result):
+    return result["per_user"].groupby("user")["events"].sum().to_dict()
+
+
+def test_rules_come_from_the_subscription_tables(db):
+    rules = load_rules(db)
+    assert set(rules["user"]) == {"any_m", "cheap", "watcher"}
+    assert rules.loc[rules["user"] == "cheap", "max_price"].tolist() == [10]
+
+
+def test_rule_conditions_apply(db):
+    [result] = sweep(db, [40], [20], workers=1)
+
+    assert result["events"] == 4
+    assert _per_user(result) == {"any_m": 3, "cheap": 3, "watcher": 1}
+
+
+def test_sweeps_in_one_process_do_not_share_filtered_history(db):
+    [strict] = sweep(db, [70], [20], workers=1)
+    [loose] = sweep(db, [50], [20], workers=1)
+
+    assert strict["events"] == 3
+    assert loose["events"] == 4
+    assert _per_user(loose)["watcher"] == 1
+
+
+def test_falls_back_to_rules_py_before_subscriptions_are_seeded(tmp_path):
+    path = tmp_path / "empty.sqlite"
+    sqlite3.connect(path).close()
+
+    rules = load_rules(path)
+    assert not rules.empty
+    assert set(rules["event_type"]) == {"RARE_DEEP_DISCOUNT"}
@@ -0,0 +1,68 @@
+import sqlite3
+
+import pytest
+
+from src.benchmarks.bench_db import baseline_scale, compare, env_differences, environment, run
+from src.benchmarks.gen_data import generate
+
+
+def _quiet(m):
+    pass
+
+
+def test_generated_history_changes_between_runs():
+    conn = sqlite3.connect(":memory:")
+    catalog = generate(conn, 20_000, seed=1, log=_quiet)
+
+    count, runs, variants = conn.execute("""
+        SELECT COUNT(*), COUNT(DISTINCT observed_at), COUNT(DISTINCT source_variant_id)
+        FROM uniqlo_sku_state
+    """).fetchone()
+    assert count == 20_000
+    assert variants == len(catalog) and runs > 1
+    assert {c for (c,) in conn.execute("SELECT DISTINCT catalog FROM uniqlo_sku_state")} == {"men", "women"}
+
+    # some SKUs were marked down or sold out along the way
+    changed = conn.execute("""
+        SELECT COUNT(*) FROM (
+            SELECT 1 FROM uniqlo_sku_state
+            GROUP BY source_variant_id, color_code, size_code
+            HAVING COUNT(DISTINCT sale_price) > 1 OR COUNT(DISTINCT is_available) > 1
+        )
+    """).fetchone()[0]
+    assert changed > 0
+    assert conn.execute("SELECT COUNT(*) FROM uniqlo_sale_variants").fetchone()[0] == len(catalog)
+    assert conn.execute("SELECT COUNT(*) FROM uniqlo_sale_observations").fetchone()[0] == len(catalog) * runs
+
+
+def test_benchmark_runs_and_compares():
+    result = run(5_000, users=20, log=_quiet)
+
+    assert result["rows"] == 5_000
+    assert result["merge_rows"] > 0
+    assert compare(result, result) == []
+
+    slower = dict(result, merge_s=result["merge_s"] * 2 + 1, generate_s=result["generate_s"] + 60)
+    assert [f.split()[2] for f in compare(slower, result)] == ["merge_s"]
+
+
+def test_baseline_timings_scale_with_the_calibration():
+    baseline = {"rows": 1000, "merge_s": 1.0, "history_s": 0.01, "db_mb": 10.0}
+    result = dict(baseline, merge_s=2.0, db_mb=20.0)
+
+    assert [f.split()[2] for f in compare(result, baseline)] == ["merge_s", "db_mb"]
+    # a machine twice as slow on the calibration query: merge_s is in line, sizes are not scaled
+    assert [f.split()[2] for f in compare(result, baseline, scale=2.0)] == ["db_mb"]
+
+
+def test_environment_differences_ignore_the_calibration():
+    env = environment()
+    assert env["calibration_s"] > 0 and env["sqlite"]
+
+    assert env_differences(env, dict(env, calibration_s=env["calibration_s"] * 3)) == []
+    assert env_differences(env, dict(env, sqlite="3.0.0")) == [f"sqlite {env['sqlite']} vs 3.0.0"]
+
+    logs = []
+    assert baseline_scale(env, dict(env, calibration_s=env["calibration_s"] / 2), log=logs.append) == pytest.approx(2.0)
+    assert baseline_scale(env, None, log=logs.append) == 1.0
+    assert "does not record its environment" in logs[-1]
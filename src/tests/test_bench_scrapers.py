@@ -0,0 +1,84 @@
+import json
+import zipfile
+from pathlib import Path
+
+import pytest
+from playwright.sync_api import sync_playwright
+
+from src.benchmarks.bench_scrapers import MOCK_FIXTURES_DIR, MOCK_SITE, compare, run, write_mock_fixture
+from src.benchmarks.mock_site import MockSite
+
+MOCK_BASELINE = Path(__file__).resolve().parents[1] / "benchmarks" / "baselines" / "scrapers-mock.json"
+
+BASELINE = {
+    "mode": "replay",
+    "catalog_variants": 120,
+    "sku_variants": 40,
+    "sku_rows": 310,
+    "catalog_seconds": 20.0,
+    "sku_seconds": 30.0,
+    "sku_variants_per_s": 1.33,
+    "goto_p50_s": 0.2,
+    "goto_p95_s": 0.4,
+    "chip_wait_p95_s": 0.05,
+}
+
+
+def test_same_result_passes():
+    assert compare(dict(BASELINE), BASELINE) == []
+
+
+def test_changed_rows_and_slow_phases_fail():
+    result = dict(
+        BASELINE,
+        sku_rows=300,               # the same pages read differently
+        sku_seconds=60.0,
+        sku_variants_per_s=0.66,
+        goto_p50_s=0.9,             # p50s are reported, not compared
+        goto_p95_s=1.0,
+        chip_wait_p95_s=0.2,        # 4x, but within MIN_CHANGE_S
+    )
+
+    failed = [f.split(":")[0] for f in compare(result, BASELINE)]
+
+    assert failed == ["sku_rows", "sku_seconds", "sku_variants_per_s", "goto_p95_s"]
+
+
+def test_timings_are_scaled_by_the_calibration_counts_are_not():
+    result = dict(BASELINE, sku_seconds=55.0, sku_variants_per_s=0.73, goto_p95_s=0.7)
+
+    failed = [f.split(":")[0] for f in compare(result, BASELINE)]
+    assert failed == ["sku_seconds", "sku_variants_per_s", "goto_p95_s"]
+    # a runner twice as slow on the calibration query
+    assert compare(result, BASELINE, scale=2.0) == []
+    assert [f.split(":")[0] for f in compare(dict(result, sku_rows=300), BASELINE, scale=2.0)] == ["sku_rows"]
+
+
+def _har(path):
+    with zipfile.ZipFile(path) as z:
+        return json.loads(z.read("mock-site.har"))
+
+
+def _have_chromium():
+    with sync_playwright() as p:
+        return Path(p.chromium.executable_path).exists()
+
+
+def test_committed_mock_fixture_is_current(tmp_path):
+    committed = _har(MOCK_FIXTURES_DIR / "mock-site.har.zip")
+    assert committed == _har(write_mock_fixture(tmp_path))
+
+
+def test_mock_baseline_counts_the_fixture():
+    baseline = json.loads(MOCK_BASELINE.read_text())
+    site = MockSite(**MOCK_SITE)
+    skus = sum(len(c["sizes"]) for n in range(site.variants) for c in site.product(n)["colors"].values())
+
+    assert baseline["catalog_variants"] == baseline["sku_variants"] == site.variants
+    assert baseline["sku_rows"] == skus
+
+
+@pytest.mark.skipif(not _have_chromium(), reason="needs Playwright's Chromium")
+def test_replay_of_the_mock_fixture_matches_the_baseline():
+    result = run(MOCK_FIXTURES_DIR, log=lambda m: None)
+    assert compare(result, json.loads(MOCK_BASELINE.read_text())) == []
@@ -0,0 +1,189 @@
+import json
+import os
+from datetime import datetime
+from urllib.parse import unquote
+
+import pytest
+
+from src.metrics import Metrics
+from src.scrapers.browser import (
+    OVERLAY_CSS, BrowserSession, CacheStats, browser_session, consent_cookies, prune_profiles,
+)
+
+
+class FakeContext:
+    def __init__(self):
+        self.scripts = []
+        self.cookies = []
+        self.handlers = {}
+        self.routes = []
+
+    def add_init_script(self, script):
+        self.scripts.append(script)
+
+    def add_cookies(self, cookies):
+        self.cookies.extend(cookies)
+
+    def on(self, event, handler):
+        self.handlers[event] = handler
+
+    def route(self, url, handler):
+        self.routes.append(("route", url))
+
+    def route_from_har(self, har, **kwargs):
+        self.routes.append(("har", har, kwargs))
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.contexts = []
+
+    def new_context(self, **kwargs):
+        context = FakeContext()
+        context.kwargs = kwargs
+        self.contexts.append(context)
+        return context
+
+
+def test_consent_cookies_accept_only_necessary():
+    cookies = {c["name"]: c for c in consent_cookies(datetime(2026, 1, 2, 3, 4, 5))}
+
+    assert cookies["OptanonAlertBoxClosed"]["value"] == "2026-01-02T03:04:05.000Z"
+    consent = dict(kv.split("=", 1) for kv in cookies["OptanonConsent"]["value"].split("&"))
+    assert unquote(consent["groups"]) == "C0001:1,C0002:0,C0003:0,C0004:0"
+    assert all(c["domain"] == ".uniqlo.com" and c["path"] == "/" for c in cookies.values())
+
+
+def test_contexts_are_preconfigured():
+    session = BrowserSession()
+    session.browser = FakeBrowser()
+
+    context = session.new_context(locale="en-GB")
+
+    assert context.kwargs == {"locale": "en-GB"}
+    [script] = context.scripts
+    assert json.dumps(OVERLAY_CSS) in script
+    assert "#onetrust-consent-sdk" in script
+    assert {c["name"] for c in context.cookies} == {"OptanonAlertBoxClosed", "OptanonConsent"}
+    assert context.handlers["page"] == session.cache.attach
+    assert session.contexts == 1
+
+
+def test_given_session_is_reused_and_left_open():
+    session = BrowserSession()
+    session.browser = FakeBrowser()
+
+    with browser_session(session) as s:
+        s.new_context()
+    with browser_session(session) as s:
+        s.new_context()
+
+    assert s is session
+    assert session.browser is not None
+    assert len(session.browser.contexts) == 2
+
+
+def _profile(base, name, mb, mtime):
+    p = base / name / "Default" / "Cache"
+    p.mkdir(parents=True)
+    (p / "data_1").write_bytes(b"x" * (mb * 1024 * 1024))
+    os.utime(base / name, (mtime, mtime))
+    return base / name
+
+
+def test_prune_profiles_evicts_least_recently_used(tmp_path):
+    _profile(tmp_path, "sku-0", 3, 100)
+    _profile(tmp_path, "sku-1", 3, 300)
+    locked = _profile(tmp_path, "sku-2", 3, 50)
+    (locked / "SingletonLock").symlink_to("host-123")
+    _profile(tmp_path, "MainThread", 3, 10)
+
+    removed = prune_profiles(tmp_path, max_mb=7, keep="MainThread", log=lambda m: None)
+
+    # the running (locked) and kept profiles survive even though older
+    assert removed == ["sku-0", "sku-1"]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["MainThread", "sku-2"]
+    assert prune_profiles(tmp_path / "missing") == []
+
+
+def test_cache_stats_count_hits_and_network_bytes(monkeypatch):
+    m = Metrics()
+    monkeypatch.setattr("src.scrapers.browser.metrics", m)
+    stats = CacheStats()
+
+    def load(rid, kind, size, disk=False, memory=False):
+        if memory:
+            stats.on_served({"requestId": rid})
+        stats.on_response({"requestId": rid, "type": kind, "response": {"fromDiskCache": disk}})
+        stats.on_finished({"requestId": rid, "encodedDataLength": size})
+
+    load("1", "Document", 50_000)
+    load("2", "Script", 400_000)
+    load("3", "Script", 0, disk=True)
+    load("4", "Image", 0, memory=True)
+    stats.on_response({"requestId": "5", "type": "Font", "response": {}})
+    stats.on_failed({"requestId": "5"})
+
+    counters = {
+        (c["name"], tuple(sorted(c["labels"].items()))): c["value"]
+        for c in m.summary()["counters"]
+    }
+    assert counters == {
+        ("http_responses_total", (("cache", "miss"), ("type", "other"))): 1,
+        ("http_responses_total", (("cache", "miss"), ("type", "static"))): 1,
+        ("http_responses_total", (("cache", "hit"), ("type", "static"))): 2,
+        ("http_bytes_total", (("type", "other"),)): 50_000,
+        ("http_bytes_total", (("type", "static"),)): 400_000,
+    }
+    assert stats.requests == {} and stats.served == set()
+
+
+def test_persistent_profile_contexts_share_one_context():
+    class FakePage:
+        closed = False
+
+        def close(self):
+            self.closed = True
+
+    class FakeProfile:
+        def new_page(self):
+            return FakePage()
+
+    session = BrowserSession()
+    session.profile = FakeProfile()
+
+    context = session.new_context()
+    pages = [context.new_page(), context.new_page()]
+    context.close()
+
+    assert all(p.closed for p in pages)
+    with pytest.raises(ValueError):
+        session.new_context(locale="en-GB")
+
+
+def test_contexts_record_and_replay_hars(tmp_path):
+    recorder = BrowserSession(har_dir=tmp_path, har_mode="record", log=lambda m: None)
+    recorder.browser = FakeBrowser()
+    recorded = [recorder.new_context(), recorder.new_context()]
+
+    assert [c.routes for c in recorded] == [
+        [("har", str(tmp_path / f"context-{i}.har.zip"), {"update": True, "update_content": "embed"})]
+        for i in (1, 2)
+    ]
+
+    for i in (1, 2):
+        (tmp_path / f"context-{i}.har.zip").write_bytes(b"")
+    player = BrowserSession(har_dir=tmp_path)
+    player.browser = FakeBrowser()
+
+    # every recording is tried before the catch-all that cuts the network
+    assert player.new_context().routes == [
+        ("route", "**/*"),
+        ("har", str(tmp_path / "context-1.har.zip"), {"not_found": "fallback"}),
+        ("har", str(tmp_path / "context-2.har.zip"), {"not_found": "fallback"}),
+    ]
+
+    empty = BrowserSession(har_dir=tmp_path / "none")
+    empty.browser = FakeBrowser()
+    with pytest.raises(FileNotFoundError):
+        empty.new_context()
@@ -0,0 +1,93 @@
+import json
+
+import pytest
+
+from src.notifiers.channels import EmailChannel, WebhookChannel
+from src.notifiers.matcher import compile_rules
+from src.notifiers.messages import Message
+from src.notifiers.notify_events import notify_events
+from src.notifiers.subscriptions import seed_from_rules
+from src.tests.fakes import FakeSmtpServer, FakeWebhookServer
+
+
+def _quiet(m):
+    pass
+
+
+def test_webhook_posts_json_and_reports_failures():
+    with FakeWebhookServer(fail_paths=["/broken"]) as server:
+        m = Message("subj", "body", {"type": "deal", "deals": []})
+        results = WebhookChannel(log=_quiet).send_all([
+            (server.url("/a"), m),
+            (server.url("/broken"), m),
+            (server.url("/b"), m),
+        ])
+
+    assert [bool(r) for r in results] == [True, False, True]
+    assert results[1].error.startswith("HTTP 500")
+    assert sorted(path for path, _ in server.posts) == ["/a", "/b"]
+    assert server.posts[0][1] == {"subject": "subj", "text": "body", "type": "deal", "deals": []}
+
+
+def test_email_reuses_connections():
+    with FakeSmtpServer() as server:
+        channel = EmailChannel(server.host, server.port, concurrency=2, log=_quiet)
+        results = channel.send_all([
+            (f"u{i}@example.com", Message(f"s{i}", f"text {i}", {})) for i in range(5)
+        ])
+
+    assert results == [True] * 5
+    assert server.connections == 2
+    assert sorted(r[0] for r, _ in server.messages) == [f"u{i}@example.com" for i in range(5)]
+    assert all("Subject: s" in raw for _, raw in server.messages)
+
+
+def _event(size_label, size_code):
+    payload = {
+        "product_name": "Fleece Jacket",
+        "sale_price": 9.9,
+        "original_price": 39.9,
+        "discount_pct": 75,
+    }
+    return (
+        "2026-01-01T10:00:00", "men", "RARE_DEEP_DISCOUNT", "E1", "/uk/en/products/E1/00",
+        "v1", "09", "BLACK", size_code, size_label, json.dumps(payload),
+    )
+
+
+def test_one_render_fans_out_to_every_channel(conn, monkeypatch):
+    monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "TEST")
+    monkeypatch.setenv("SMTP_HOST", "localhost")
+
+    rule = {"RARE_DEEP_DISCOUNT": {"men": {"sizes": None, "colors": None}}}
+    index = compile_rules({
+        f"u{i}": {
+            "chat_id": str(i),
+            "channels": [("webhook", f"http://hooks/{i}"), ("email", f"u{i}@example.com")],
+            "events": rule,
+        }
+        for i in range(20)
+    })
+
+    logs = []
+    notify_events(conn, [_event("M", "003"), _event("L", "004")], log=logs.append, index=index)
+
+    rows = conn.execute("SELECT channel, address, text, payload FROM uniqlo_outbox").fetchall()
+    assert len(rows) == 60
+    assert {channel for channel, *_ in rows} == {"telegram", "webhook", "email"}
+    assert len({text for _, _, text, _ in rows}) == 1
+    assert json.loads(rows[0][3])["deals"][0]["sizes"] == ["L", "M"]
+    assert "(1 rendered)" in logs[-1]
+
+    # the cooldown is per destination: a re-run queues nothing
+    notify_events(conn, [_event("M", "003")], log=logs.append, index=index)
+    assert conn.execute("SELECT COUNT(*) FROM uniqlo_outbox").fetchone()[0] == 60
+
+
+def test_an_empty_index_is_not_replaced_by_the_stored_one(conn, monkeypatch):
+    monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "TEST")
+    seed_from_rules(conn, log=_quiet)      # stored subscribers that would match
+
+    notify_events(conn, [_event("M", "003")], log=_quiet, index=compile_rules({}))
+
+    assert conn.execute("SELECT COUNT(*) FROM uniqlo_outbox").fetchone()[0] == 0
@@ -0,0 +1,32 @@
+from datetime import datetime, timedelta
+
+from db.schema import init_db
+from src.notifiers.cooldown import filter_cooled_down, record_notifications
+
+NOW = datetime(2026, 1, 10, 12, 0, 0)
+KEY = ("chat", "RARE_DEEP_DISCOUNT", "/uk/en/products/E1-000/00", "09", "003")
+
+
+def test_recent_notification_is_suppressed(conn):
+    record_notifications(conn, [KEY], notified_at=(NOW - timedelta(hours=2)).isoformat())
+
+    assert filter_cooled_down(conn, [KEY + (24,)], now=NOW) == set()
+    assert filter_cooled_down(conn, [KEY + (1,)], now=NOW) == {KEY}
+
+
+def test_other_size_and_other_chat_are_fresh(conn):
+    record_notifications(conn, [KEY], notified_at=NOW.isoformat())
+
+    other_size = KEY[:4] + ("004",)
+    other_chat = ("chat2",) + KEY[1:]
+
+    assert filter_cooled_down(
+        conn, [KEY + (24,), other_size + (24,), other_chat + (24,)], now=NOW
+    ) == {other_size, other_chat}
+
+
+def test_log_survives_init_db(conn):
+    record_notifications(conn, [KEY], notified_at=NOW.isoformat())
+    init_db(conn)
+
+    assert filter_cooled_down(conn, [KEY + (24,)], now=NOW) == set()
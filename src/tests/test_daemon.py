@@ -0,0 +1,96 @@
+import signal
+import sqlite3
+
+import pytest
+
+from src.daemon import Daemon
+from db.schema import init_runs
+from src.runs import load_runs
+
+
+class FakeClock:
+    """Time only moves when the daemon waits or a task runs."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.stopped = False
+
+    def __call__(self):
+        return self.now
+
+    # stands in for Daemon.stop
+    def is_set(self):
+        return self.stopped
+
+    def set(self):
+        self.stopped = True
+
+    def wait(self, seconds):
+        self.now += seconds
+
+
+def _daemon(tmp_path, until):
+    clock = FakeClock()
+    daemon = Daemon(db_path=tmp_path / "d.sqlite", log=lambda m: None)
+    daemon.stop = clock
+    daemon.conn = sqlite3.connect(":memory:")
+    init_runs(daemon.conn)
+
+    ran = []
+
+    def task(name, seconds):
+        def fn():
+            ran.append((name, clock.now))
+            clock.now += seconds
+            if clock.now >= until:
+                clock.set()
+        return fn
+
+    return daemon, clock, ran, task
+
+
+def test_tasks_run_on_their_own_intervals(tmp_path, monkeypatch):
+    monkeypatch.setattr("src.metrics.METRICS_DIR", tmp_path / "reports")
+    daemon, clock, ran, task = _daemon(tmp_path, until=1000)
+
+    daemon.loop([
+        ("catalog", 600, task("catalog", 60)),
+        ("sweep", 100, task("sweep", 20)),
+    ], clock=clock)
+
+    assert ran[:2] == [("catalog", 0.0), ("sweep", 60.0)]
+    # sweeps every 100s after the previous one ended; the catalog waits
+    # for the sweep in progress
+    assert [t for name, t in ran if name == "sweep"] == [60.0, 180.0, 300.0, 420.0, 540.0, 720.0, 840.0, 960.0, 1080.0]
+    assert [t for name, t in ran if name == "catalog"] == [0.0, 660.0]
+
+    runs = load_runs(daemon.conn)
+    assert len(runs) == len(ran)
+    assert {r["stage"] for r in runs} == {"daemon-catalog", "daemon-sweep"}
+    assert runs[0]["status"] == "stopped"
+    assert (tmp_path / "reports" / "daemon-sweep.json").exists()
+
+
+def test_failing_task_is_logged_and_retried(tmp_path, monkeypatch):
+    monkeypatch.setattr("src.metrics.METRICS_DIR", tmp_path / "reports")
+    daemon, clock, ran, task = _daemon(tmp_path, until=250)
+    ok = task("sweep", 10)
+
+    def flaky():
+        if len(ran) == 0:
+            ran.append(("boom", clock.now))
+            raise RuntimeError("page crashed")
+        ok()
+
+    daemon.loop([("sweep", 100, flaky)], clock=clock)
+
+    assert ran == [("boom", 0.0), ("sweep", 100.0), ("sweep", 210.0), ("sweep", 320.0)]
+    assert [r["status"] for r in load_runs(daemon.conn)][::-1] == ["failed", "ok", "ok", "stopped"]
+
+
+def test_second_signal_exits():
+    daemon = Daemon(log=lambda m: None)
+    daemon.handle_signal(signal.SIGTERM, None)
+    assert daemon.stop.is_set()
+    with pytest.raises(KeyboardInterrupt):
+        daemon.handle_signal(signal.SIGTERM, None)
@@ -0,0 +1,68 @@
+from src.deadline import Deadline
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _deadline(budget, reserve=60, **kwargs):
+    clock = FakeClock()
+    logs = []
+    deadline = Deadline(budget, reserve_sec=reserve, clock=clock, log=logs.append, **kwargs)
+    return deadline, clock, logs
+
+
+def test_no_budget_never_cuts():
+    deadline, clock, _ = _deadline(None)
+    clock.now = 10 ** 9
+
+    assert list(deadline.take(range(5))) == [0, 1, 2, 3, 4]
+    assert deadline.status == "ok"
+
+
+def test_estimate_follows_observed_variants():
+    deadline, _, _ = _deadline(600, alpha=0.5, initial_estimate=15.0)
+
+    deadline.observe(10.0)      # the first observation replaces the guess
+    assert deadline.estimate == 10.0
+    deadline.observe(20.0)
+    assert deadline.estimate == 15.0
+    assert deadline.observed == 2
+
+
+def test_take_stops_when_one_more_variant_would_eat_the_reserve():
+    deadline, clock, logs = _deadline(600, reserve=60, initial_estimate=100.0)
+    pulled = []
+
+    def variants():
+        for i in range(100):
+            pulled.append(i)
+            yield i
+
+    taken = []
+    for i in deadline.take(variants()):
+        taken.append(i)
+        clock.now += 100.0
+        deadline.observe(100.0)
+
+    # 600s budget - 60s reserve: five 100s variants fit, a sixth would not
+    assert taken == [0, 1, 2, 3, 4]
+    assert pulled == taken      # nothing is pulled (and dropped) past the cut
+    assert deadline.status == "partial"
+    assert len(logs) == 1 and "[DEADLINE]" in logs[0]
+
+
+def test_discovery_runs_until_the_reserve():
+    deadline, clock, _ = _deadline(600, reserve=60, initial_estimate=100.0)
+
+    taken = []
+    for i in deadline.take(range(1000), need=0):
+        taken.append(i)
+        clock.now += 1.0
+
+    assert len(taken) == 541
+    assert deadline.cut
@@ -0,0 +1,99 @@
+import json
+from datetime import datetime, timedelta
+
+from src.notifiers import digest
+from src.notifiers.digest import TELEGRAM_MAX_CHARS, deal_url, digest_config, is_due, next_due, render_digest
+from src.notifiers.matcher import compile_rules
+from src.notifiers.notify_events import notify_events
+from src.notifiers.outbox import claim
+
+
+def _group(i, sale, discount):
+    return {
+        "catalog": "men",
+        "product_name": f"Product {i} " + "x" * 60,
+        "color_label": "BLACK",
+        "color_code": "09",
+        "sku_path": f"/uk/en/products/E{i:06d}-000/00",
+        "sizes": {"M": "003", "L": "004"},
+        "sale": sale,
+        "original": 39.9,
+        "discount": discount,
+    }
+
+
+def test_all_deals_fit_in_few_messages_under_limit():
+    groups = [_group(i, 5 + i % 10, 50 + i % 40) for i in range(60)]
+
+    messages = render_digest(groups, max_messages=None)
+
+    assert 1 < len(messages) <= 3
+    assert all(len(text) <= TELEGRAM_MAX_CHARS for text, _ in messages)
+    assert sum(len(gs) for _, gs in messages) == 60
+
+
+def test_links_point_at_the_scraped_site(monkeypatch):
+    monkeypatch.setattr(digest, "SITE_URL", "http://127.0.0.1:8765")
+
+    url = deal_url(_group(1, 9.9, 75))
+
+    assert url == "http://127.0.0.1:8765/uk/en/products/E000001-000/00?colorDisplayCode=09"
+    assert url in render_digest([_group(1, 9.9, 75)])[0][0]
+
+
+def test_ranking_and_overflow():
+    groups = [_group(i, 5 + i % 10, 50 + i % 40) for i in range(200)]
+
+    messages = render_digest(groups, rank_by="discount", max_messages=1)
+
+    text, shown = messages[0]
+    assert len(messages) == 1
+    assert shown[0]["discount"] == max(g["discount"] for g in groups)
+    assert text.endswith(f"…and {200 - len(shown)} more")
+
+    cheapest = render_digest(groups, rank_by="price", max_messages=1)[0][1]
+    assert cheapest[0]["sale"] == min(g["sale"] for g in groups)
+
+
+def test_schedule():
+    assert digest_config({}) is None
+    assert is_due(digest_config({"digest": True}))
+
+    cfg = digest_config({"digest": {"hours": [8]}})
+    assert is_due(cfg, datetime(2026, 1, 1, 8, 30))
+    assert not is_due(cfg, datetime(2026, 1, 1, 9, 0))
+
+    assert next_due(cfg, datetime(2026, 1, 1, 8, 30)) == datetime(2026, 1, 1, 8, 30)
+    assert next_due(cfg, datetime(2026, 1, 1, 9, 10)) == datetime(2026, 1, 2, 8, 0)
+    assert next_due(digest_config({"digest": {"hours": [8, 20]}}), datetime(2026, 1, 1, 9)) == datetime(2026, 1, 1, 20)
+
+
+def _event(product, size_label, discount):
+    payload = {"product_name": f"Item {product}", "sale_price": 9.9, "original_price": 39.9, "discount_pct": discount}
+    return (
+        datetime.utcnow().isoformat(), "men", "RARE_DEEP_DISCOUNT", product, f"/uk/en/products/E{product}-000/00",
+        f"E{product}-000", "09", "BLACK", size_label, size_label, json.dumps(payload),
+    )
+
+
+def test_held_digest_waits_in_the_outbox_and_absorbs_later_deals(conn):
+    later = (datetime.utcnow() + timedelta(hours=3)).hour
+    index = compile_rules({"u": {
+        "channels": [("webhook", "http://hooks/u")],
+        "digest": {"hours": [later]},
+        "events": {"RARE_DEEP_DISCOUNT": {"men": {"sizes": None, "colors": None}}},
+    }})
+
+    notify_events(conn, [_event("000001", "M", 70)], log=lambda m: None, index=index)
+    # a later run, still outside the hours: one digest with both deals
+    notify_events(conn, [_event("000002", "S", 80)], log=lambda m: None, index=index)
+
+    rows = conn.execute("SELECT next_attempt_at, payload, held_groups FROM uniqlo_outbox").fetchall()
+    assert len(rows) == 1
+    not_before, payload, held = rows[0]
+    assert datetime.fromisoformat(not_before).hour == later
+    assert [d["product_id"] for d in json.loads(payload)["deals"]] == ["000002", "000001"]
+    assert len(json.loads(held)) == 2
+
+    # not deliverable before its hour
+    assert claim(conn) == []
@@ -0,0 +1,139 @@
+import pytest
+
+from src.history import price_history, product_id_of, query_series
+from src.scrapers.scrape_sku_state import INSERT_SKU_STATE_SQL
+
+
+def _row(observed_at, color, size, sale, discount, available, product_id="465185"):
+    return (
+        observed_at, "men", product_id, f"E{product_id}-000", "Test Tee", f"/uk/en/products/E{product_id}-000/00",
+        color, {"09": "BLACK", "00": "WHITE"}[color], size, {"003": "S", "004": "M"}[size],
+        sale, 20.0, discount, available,
+    )
+
+
+def _add_run(conn, run_id, finished_at):
+    conn.execute("""
+        INSERT INTO uniqlo_runs (run_id, stage, status, started_at, finished_at, wall_seconds)
+        VALUES (?, 'all', 'ok', ?, ?, 1)
+    """, (run_id, finished_at, finished_at))
+    conn.commit()
+
+
+@pytest.fixture
+def conn(conn):
+    conn.executemany(INSERT_SKU_STATE_SQL, [
+        # Monday 2026-10-12
+        _row("2026-10-12T08:00:00.000001", "09", "004", 15.0, 25, 1),
+        _row("2026-10-12T08:30:00.000001", "09", "004", 12.0, 40, 1),
+        _row("2026-10-12T20:00:00.000001", "09", "004", 14.0, 30, 0),
+        _row("2026-10-12T20:00:00.000001", "09", "003", 14.0, 30, 1),
+        # Sunday, same week
+        _row("2026-10-18T09:00:00.000001", "09", "004", 10.0, 50, 1),
+        _row("2026-10-18T09:00:00.000001", "09", "003", 10.0, 50, 0),
+        # next Monday
+        _row("2026-10-19T09:00:00.000001", "09", "004", 10.0, 50, 0),
+        _row("2026-10-19T09:00:00.000001", "00", "004", 16.0, 20, 1),
+        # another product
+        _row("2026-10-19T09:00:00.000001", "09", "004", 1.0, 95, 1, product_id="400000"),
+    ])
+    conn.commit()
+    return conn
+
+
+def test_sku_series_in_day_buckets(conn):
+    [series] = query_series(conn, "E465185-000", "09", "004", bucket="day")["series"]
+
+    assert (series["color_label"], series["size_label"], series["product_name"]) == ("BLACK", "M", "Test Tee")
+    assert [p["bucket"] for p in series["points"]] == ["2026-10-12", "2026-10-18", "2026-10-19"]
+    first = series["points"][0]
+    assert first["observations"] == 3
+    assert (first["price_min"], first["price_max"], first["price_last"]) == (12.0, 15.0, 14.0)
+    assert (first["discount_min"], first["discount_max"], first["discount_last"]) == (25, 40, 30)
+    assert first["available_share"] == round(2 / 3, 3)
+    assert first["available_last"] is False
+
+
+def test_hour_and_week_buckets(conn):
+    [series] = query_series(conn, "465185", "09", "004", bucket="hour")["series"]
+    assert [p["bucket"] for p in series["points"]][:2] == ["2026-10-12T08:00", "2026-10-12T20:00"]
+    assert series["points"][0]["price_last"] == 12.0
+
+    [series] = query_series(conn, "465185", "09", "004", bucket="week")["series"]
+    assert [(p["bucket"], p["observations"]) for p in series["points"]] == [("2026-10-12", 4), ("2026-10-19", 1)]
+    assert series["points"][0]["price_min"] == 10.0 and series["points"][0]["price_last"] == 10.0
+
+
+def test_grouping_and_range(conn):
+    skus = query_series(conn, "465185", bucket="day")["series"]
+    assert [(s["color_code"], s["size_code"]) for s in skus] == [("00", "004"), ("09", "003"), ("09", "004")]
+
+    colors = query_series(conn, "465185", bucket="week", by="color")["series"]
+    assert [s["color_label"] for s in colors] == ["WHITE", "BLACK"]
+    black = colors[1]["points"][0]
+    assert black["observations"] == 6 and black["available_share"] == 0.667
+    assert black["available_last"] is None
+
+    [product] = query_series(
+        conn, "465185", bucket="day", by="product", since="2026-10-13", until="2026-10-19",
+    )["series"]
+    assert [p["bucket"] for p in product["points"]] == ["2026-10-18"]
+
+    assert query_series(conn, "465185", "65")["series"] == []
+    with pytest.raises(ValueError):
+        query_series(conn, "465185", bucket="month")
+
+
+def test_last_values_come_from_the_latest_observation(conn):
+    # out of time order, and the latest is neither the min nor the max
+    conn.executemany(INSERT_SKU_STATE_SQL, [
+        _row("2026-10-20T18:00:00.000001", "09", "004", 11.0, 45, 1),
+        _row("2026-10-20T09:00:00.000001", "09", "004", 8.0, 60, 0),
+        _row("2026-10-20T12:00:00.000001", "09", "004", 13.0, 35, 0),
+    ])
+    [series] = query_series(conn, "465185", "09", "004", bucket="day", since="2026-10-20")["series"]
+    [point] = series["points"]
+    assert (point["price_last"], point["discount_last"], point["available_last"]) == (11.0, 45, True)
+
+    # several SKUs at the bucket's last observation: the best of them
+    [product] = query_series(
+        conn, "465185", bucket="day", by="product", since="2026-10-19", until="2026-10-20",
+    )["series"]
+    [point] = product["points"]
+    assert (point["price_last"], point["discount_last"], point["available_last"]) == (10.0, 50, None)
+
+
+def test_series_read_from_the_covering_index(conn):
+    plan = " ".join(r[3] for r in conn.execute("""
+        EXPLAIN QUERY PLAN
+        SELECT MIN(sale_price), MAX(discount_pct), AVG(is_available)
+        FROM uniqlo_sku_state
+        WHERE product_id = ? AND color_code = ? AND size_code = ?
+        GROUP BY substr(observed_at, 1, 10)
+    """, ("465185", "09", "004")))
+    assert "COVERING INDEX idx_sku_state_history" in plan
+
+
+def test_cached_until_the_next_run(conn):
+    assert price_history(conn, "465185")["run_id"] is None      # no ledger yet: not cached
+
+    _add_run(conn, "run-1", "2026-10-19T10:00:00")
+    first = price_history(conn, "465185", "09", "004")
+    assert first["cached"] is False and first["run_id"] == "run-1"
+
+    # rows written under the same run id are not seen until a new run lands
+    conn.execute(INSERT_SKU_STATE_SQL, _row("2026-10-19T11:00:00.000001", "09", "004", 9.0, 55, 1))
+    again = price_history(conn, "465185", "09", "004")
+    assert again["cached"] is True and again["series"] == first["series"]
+
+    _add_run(conn, "run-2", "2026-10-19T12:00:00")
+    fresh = price_history(conn, "465185", "09", "004")
+    assert fresh["cached"] is False
+    assert fresh["series"][0]["points"][-1]["price_last"] == 9.0
+    assert {r for (r,) in conn.execute("SELECT DISTINCT run_id FROM uniqlo_history_cache")} == {"run-2"}
+
+
+def test_product_id_of():
+    assert product_id_of("E465185-000") == product_id_of("E465185") == product_id_of(" 465185 ") == "465185"
+    with pytest.raises(ValueError):
+        product_id_of("shirt")
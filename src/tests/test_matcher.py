@@ -0,0 +1,81 @@
+from src.benchmarks.bench_matcher import run
+from src.notifiers.matcher import compile_rules
+
+RULES = {
+    "a": {
+        "chat_id": "1",
+        "events": {
+            "RARE_DEEP_DISCOUNT": {
+                "men": {"sizes": ["M", "L"], "colors": None},
+                "women": {"sizes": ["S"], "colors": ["BLACK"]},
+            }
+        }
+    },
+    "b": {
+        "chat_id": "2",
+        "events": {
+            "RARE_DEEP_DISCOUNT": {
+                "men": {"sizes": None, "colors": ["NAVY"]},
+            }
+        }
+    },
+    "no_chat": {
+        "chat_id": None,
+        "events": {
+            "RARE_DEEP_DISCOUNT": {
+                "men": {"sizes": None, "colors": None},
+            }
+        }
+    },
+}
+
+
+def test_size_and_color_filters():
+    index = compile_rules(RULES)
+
+    assert index.match("RARE_DEEP_DISCOUNT", "men", "M", "BLACK") == {"a"}
+    assert index.match("RARE_DEEP_DISCOUNT", "men", "M", "NAVY") == {"a", "b"}
+    assert index.match("RARE_DEEP_DISCOUNT", "men", "XL", "NAVY") == {"b"}
+    assert index.match("RARE_DEEP_DISCOUNT", "men", "XL", "BLACK") == set()
+    assert index.match("RARE_DEEP_DISCOUNT", "women", "S", "BLACK") == {"a"}
+    assert index.match("RARE_DEEP_DISCOUNT", "women", "S", "NAVY") == set()
+
+
+def test_unknown_event_type_and_missing_chat_id():
+    index = compile_rules(RULES)
+
+    assert index.match("ITEM_COUNT_INCREASE", "men", "M", "BLACK") == set()
+    assert set(index.channels) == {"a", "b"}
+
+
+def test_price_discount_and_watchlist_conditions():
+    index = compile_rules({
+        "cheap": {
+            "chat_id": "1",
+            "events": {"RARE_DEEP_DISCOUNT": {"men": {"sizes": ["M"], "max_price": 10}}},
+        },
+        "deep": {
+            "chat_id": "2",
+            "events": {"RARE_DEEP_DISCOUNT": {"men": {"sizes": ["M"], "min_discount": 70}}},
+        },
+        "watcher": {
+            "chat_id": "3",
+            "events": {"RARE_DEEP_DISCOUNT": {"men": {"product_ids": ["478578"]}}},
+        },
+    })
+
+    def match(product_id, sale, discount):
+        return index.match("RARE_DEEP_DISCOUNT", "men", "M", "BLACK", product_id, sale, discount)
+
+    assert match("111111", 9.9, 60) == {"cheap"}
+    assert match("111111", 12.9, 75) == {"deep"}
+    assert match("478578", 9.9, 75) == {"cheap", "deep", "watcher"}
+    assert match("111111", 19.9, 50) == set()
+
+
+def test_benchmark_times_notify_events_end_to_end():
+    result = run(200, 1000, notify_n=50)
+
+    assert result["matches"] > 0
+    assert result["notify_events"] == 50
+    assert result["messages_queued"] > 0 and result["notify_s"] > 0
@@ -0,0 +1,65 @@
+import json
+import threading
+
+from src.metrics import Metrics
+
+
+def test_counters_and_timer_quantiles():
+    m = Metrics()
+    for i in range(1, 101):
+        m.observe("phase_seconds", i / 100, phase="goto")
+    m.observe("phase_seconds", 5.0, phase="size_read")
+    m.incr("variants_total", status="ok")
+    m.incr("variants_total", 2, status="ok")
+    m.incr("variants_total", status="error")
+
+    summary = m.summary()
+    counters = {(c["name"], c["labels"]["status"]): c["value"] for c in summary["counters"]}
+    assert counters == {("variants_total", "ok"): 3, ("variants_total", "error"): 1}
+
+    goto = next(t for t in summary["timers"] if t["labels"] == {"phase": "goto"})
+    assert goto["count"] == 100
+    assert (goto["min"], goto["max"]) == (0.01, 1.0)
+    assert (goto["p50"], goto["p95"], goto["p99"]) == (0.5, 0.95, 0.99)
+
+
+def test_timer_records_on_exception_and_across_threads():
+    m = Metrics()
+    try:
+        with m.timer("stage_seconds", stage="scrape"):
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+
+    def work():
+        for _ in range(100):
+            m.incr("sku_rows_total")
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    summary = m.summary()
+    assert summary["timers"][0]["count"] == 1
+    assert summary["counters"][0]["value"] == 400
+
+
+def test_json_report_and_prometheus_text(tmp_path):
+    m = Metrics()
+    m.incr("variants_total", status="ok")
+    m.observe("stage_seconds", 2.0, stage="merge")
+
+    report = m.write_json(tmp_path / "run.json", stage="merge", status="ok")
+    on_disk = json.loads((tmp_path / "run.json").read_text())
+    assert on_disk == report
+    assert on_disk["status"] == "ok"
+    assert on_disk["timers"][0]["p99"] == 2.0
+
+    text = m.prometheus()
+    assert "# TYPE uniqlo_variants_total counter" in text
+    assert 'uniqlo_variants_total{status="ok"} 1' in text
+    assert "# TYPE uniqlo_stage_seconds summary" in text
+    assert 'uniqlo_stage_seconds{quantile="0.95",stage="merge"} 2.000000' in text
+    assert 'uniqlo_stage_seconds_count{stage="merge"} 1' in text
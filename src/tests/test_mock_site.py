@@ -0,0 +1,85 @@
+import json
+import re
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import pytest
+
+from src.benchmarks.mock_site import MockSite
+from src.scrapers.browser import cookie_domain
+from src.scrapers.catalog_scraper import TILE_LINK_SELECTOR, VARIANT_ID_RE
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(**kwargs):
+        server = MockSite(**kwargs).serve()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+def _get(url):
+    with urlopen(url) as resp:
+        return resp.read().decode()
+
+
+def test_catalog_pages_until_exhausted(serve):
+    server = serve(variants=25, page_size=5)
+
+    first = _get(f"{server.url}/uk/en/feature/sale/men")
+    prefix = re.search(r'\^="([^"]+)"', TILE_LINK_SELECTOR).group(1)
+    hrefs = re.findall(r'href="([^"]+)"', first)
+    assert len(hrefs) == 5
+    assert all(h.startswith(prefix) and VARIANT_ID_RE.search(h) for h in hrefs)
+
+    seen, offset, done = len(hrefs), 5, False
+    while not done:
+        page = json.loads(_get(f"{server.url}/mock/catalog/men?offset={offset}"))
+        seen += page["html"].count('class="product-tile"')
+        offset, done = page["next"], page["done"]
+
+    # men get the even variants
+    assert seen == 13
+    assert server.site.requests == {"catalog": 1, "catalog_api": 2}
+
+
+def test_product_pages_are_stable_and_discounted(serve):
+    server = serve(variants=10, colors=4, sizes=3, seed=7)
+
+    page = _get(f"{server.url}/uk/en/products/E400003-000/00")
+    assert page == _get(f"{server.url}/uk/en/products/E400003-000/00")
+    assert page.count('data-testid="ITOChip"') == 4
+    assert page.count("/chip/goods_") == 4
+
+    colors = json.loads(re.search(r"const COLORS = (\{.*\});", page).group(1))
+    for c in colors.values():
+        assert c["sale"] < c["original"]
+        assert [s["code"] for s in c["sizes"]] == ["001", "002", "003"]
+
+    with pytest.raises(HTTPError) as e:
+        urlopen(f"{server.url}/uk/en/products/E400010-000/00")
+    assert e.value.code == 404
+
+
+def test_error_injection_and_telegram(serve):
+    server = serve(variants=10, block_rate=1.0)
+
+    with pytest.raises(HTTPError) as e:
+        urlopen(f"{server.url}/uk/en/products/E400001-000/00")
+    assert e.value.code == 429
+
+    req = Request(f"{server.url}/botTOKEN/sendMessage", data=b'{"chat_id": 1}', method="POST")
+    with urlopen(req) as resp:
+        assert json.loads(resp.read())["ok"] is True
+    assert server.site.messages == 1
+
+
+def test_cookie_domain():
+    assert cookie_domain("https://www.uniqlo.com") == ".uniqlo.com"
+    assert cookie_domain("http://127.0.0.1:8765") == "127.0.0.1"
@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import src.notifiers.telegram as telegram
+from src.notifiers.messages import Message
+from src.notifiers.outbox import claim, drain, enqueue, idempotency_key, status
+from src.tests.fakes import FakeTelegramServer
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "TEST")
+    with FakeTelegramServer(fail_chats=["bad"]) as server:
+        monkeypatch.setattr(telegram, "TELEGRAM_API_BASE", server.api_base)
+        yield server
+
+
+def _msg(chat_id, text, event_keys=(("t0", "RARE_DEEP_DISCOUNT", "/p", "09", "003"),)):
+    return idempotency_key("telegram", chat_id, event_keys), "telegram", chat_id, Message("s", text, {})
+
+
+def test_enqueue_is_idempotent(conn):
+    assert enqueue(conn, [_msg("1", "a"), _msg("2", "b")]) == 2
+    assert enqueue(conn, [_msg("1", "a again"), _msg("2", "b")]) == 0
+    assert enqueue(conn, [_msg("1", "a", [("t1", "RARE_DEEP_DISCOUNT", "/p", "09", "003")])]) == 1
+
+
+def test_drain_delivers_and_schedules_retries(conn, server):
+    enqueue(conn, [_msg("1", "a"), _msg("bad", "b"), _msg("2", "c")])
+
+    assert drain(conn, log=lambda m: None) == 3
+
+    assert sorted(m["text"] for m in server.messages) == ["a", "c"]
+    counts = {s: n for s, n, *_ in status(conn)}
+    assert counts == {"sent": 2, "pending": 1}
+    # the channel's own reason is kept for diagnosis
+    [(error,)] = conn.execute("SELECT last_error FROM uniqlo_outbox WHERE status = 'pending'").fetchall()
+    assert error.startswith("HTTP 400") and "chat not found" in error
+
+    # the failed one is backed off, not immediately due again
+    assert drain(conn, log=lambda m: None) == 0
+
+
+def test_expired_lease_is_reclaimed(conn):
+    enqueue(conn, [_msg("1", "a")])
+
+    assert len(claim(conn, lease_seconds=60)) == 1
+    assert claim(conn) == []
+
+    conn.execute(
+        "UPDATE uniqlo_outbox SET locked_until = ?",
+        ((datetime.utcnow() - timedelta(seconds=1)).isoformat(),),
+    )
+    conn.commit()
+    assert len(claim(conn)) == 1
@@ -0,0 +1,158 @@
+import sqlite3
+import time
+
+import src.pipeline as pipeline
+from db.schema import SKU_STATE_COLUMNS, init_db
+from src.events.rare_deep_discount import DeepDiscountDetector
+from src.notifiers.subscriptions import add_rule, add_user
+from src.pipeline import EventStream, NotifierWorker, run_pipeline
+from src.scrapers.scrape_sku_state import INSERT_SKU_STATE_SQL
+
+
+def _variant(i):
+    return ("scrape", "t0", "men", f"{i:06d}", f"E{i:06d}-000", f"https://x/{i}", f"P{i}")
+
+
+def _quiet(m):
+    pass
+
+
+def test_stages_overlap_and_every_variant_is_written():
+    def discover():
+        for i in range(20):
+            time.sleep(0.01)
+            yield _variant(i)
+
+    def scrape(variants):
+        for catalog, product_id, variant_id, url, name in variants:
+            time.sleep(0.02)
+            yield [(variant_id, "M"), (variant_id, "L")]
+
+    written, variants = [], []
+    started = time.perf_counter()
+    stats = run_pipeline(discover, scrape, variants.append, written.append,
+                         workers=2, queue_size=4, log=_quiet)
+    wall = time.perf_counter() - started
+
+    assert len(variants) == 20
+    assert sorted(rows[0][0] for rows in written) == sorted(v[4] for v in variants)
+    # sequential would be 20 * (0.01 + 0.02); two workers overlap with discovery
+    assert wall < 0.5
+    assert {s.name: s.items for s in stats} == {"catalog": 20, "sku": 20, "writer": 20}
+
+
+def test_bounded_queue_blocks_fast_producer():
+    produced = []
+
+    def discover():
+        for i in range(30):
+            produced.append(i)
+            yield _variant(i)
+
+    def scrape(variants):
+        for v in variants:
+            time.sleep(0.01)
+            yield [v]
+
+    stats = run_pipeline(discover, scrape, lambda row: None, lambda rows: None,
+                         workers=1, queue_size=2, log=_quiet)
+
+    catalog = stats[0]
+    assert catalog.items == 30
+    assert catalog.blocked > 0.1
+
+
+def test_max_variants_and_failing_catalog_still_finish():
+    def discover():
+        yield from (_variant(i) for i in range(5))
+        raise RuntimeError("page crashed")
+
+    def scrape(variants):
+        for v in variants:
+            yield [v]
+
+    written = []
+    logs = []
+    run_pipeline(discover, scrape, lambda row: None, written.append,
+                 workers=3, max_variants=10, log=logs.append)
+
+    assert len(written) == 5
+    assert any("catalog stage failed after 5 variants" in m for m in logs)
+
+    written = []
+    run_pipeline(lambda: (_variant(i) for i in range(50)), scrape,
+                 lambda row: None, written.append, workers=2, max_variants=7, log=_quiet)
+    assert len(written) == 7
+
+
+def test_budget_goes_to_the_planned_variants_not_the_first_discovered():
+    def scrape(variants):
+        for catalog, product_id, variant_id, url, name in variants:
+            yield [(variant_id,)]
+
+    def plan(rows, budget):
+        assert len(rows) == 50      # the whole catalog, not the first `budget`
+        return [row[2:] for row in rows[::-1]][:budget]
+
+    variants, written = [], []
+    stats = run_pipeline(lambda: (_variant(i) for i in range(50)), scrape,
+                         variants.append, written.append,
+                         workers=1, max_variants=7, plan=plan, log=_quiet)
+
+    assert len(variants) == 50
+    assert [rows[0][0] for rows in written] == [f"E{i:06d}-000" for i in range(49, 42, -1)]
+    assert {s.name: s.items for s in stats} == {"catalog": 50, "sku": 7, "writer": 7}
+
+
+def _sku_row(variant_id, size, sale, discount, available=1):
+    return (
+        "2026-10-19T09:00:00", "men", variant_id[1:7], variant_id, "Tee", f"/uk/en/products/{variant_id}/00",
+        "09", "BLACK", size, size, sale, 30.0, discount, available,
+    )
+
+
+def test_sku_row_order_matches_the_table(conn):
+
+    assert tuple(c[1] for c in conn.execute("PRAGMA table_info(uniqlo_sku_state)")) == SKU_STATE_COLUMNS
+    insert = INSERT_SKU_STATE_SQL.split("(")[1].split(")")[0]
+    assert tuple(c.strip() for c in insert.split(",")) == SKU_STATE_COLUMNS
+
+
+def test_rows_become_events_and_batched_notifications(tmp_path, monkeypatch):
+    db = tmp_path / "pipe.sqlite"
+    conn = sqlite3.connect(db)
+    init_db(conn)
+    add_user(conn, "u", [("webhook", "http://127.0.0.1:9/hook")])
+    add_rule(conn, "u", "RARE_DEEP_DISCOUNT", "men", sizes=["M"])
+    conn.commit()
+
+    batches = []
+    notify_events = pipeline.notify_events
+
+    def recording_notify(conn, rows, log=print, mode="all"):
+        batches.append((mode, len(rows)))
+        return notify_events(conn, rows, log, mode=mode)
+
+    monkeypatch.setattr(pipeline, "notify_events", recording_notify)
+
+    notifier = NotifierWorker(db, log=_quiet)
+    stream = EventStream(conn, [DeepDiscountDetector()], sink=notifier.submit, log=_quiet)
+
+    # queued before the worker starts: drained as one batch
+    assert len(stream([
+        _sku_row("E000001-000", "M", 9.9, 67),
+        _sku_row("E000001-000", "L", 9.9, 67, available=0),    # sold out
+        _sku_row("E000001-000", "S", 25.0, 60),                # too expensive
+    ])) == 1
+    assert stream([_sku_row("E000002-000", "M", 19.0, 40)]) == []     # not discounted enough
+    assert len(stream([_sku_row("E000003-000", "M", 5.0, 80), _sku_row("E000003-000", "S", 5.0, 80)])) == 2
+
+    notifier.start()
+    notifier.close()
+
+    assert stream.emitted == 3
+    assert conn.execute("SELECT COUNT(*) FROM uniqlo_events").fetchone()[0] == 3
+    assert batches == [("instant", 3), ("digest", 3)]
+    # the rule only wants size M: one message per (product, color) group
+    outbox = conn.execute("SELECT channel, address FROM uniqlo_outbox ORDER BY id").fetchall()
+    assert outbox == [("webhook", "http://127.0.0.1:9/hook")] * 2
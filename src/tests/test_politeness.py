@@ -0,0 +1,91 @@
+import threading
+import time
+
+from src.scrapers.politeness import BASE_TIMEOUTS_MS, Blocked, PolitenessController
+
+
+def _controller(**kwargs):
+    logs = []
+    kwargs.setdefault("log", logs.append)
+    return PolitenessController(**kwargs), logs
+
+
+def test_additive_increase_and_multiplicative_decrease():
+    c, logs = _controller(max_concurrency=8, min_delay=0.0, latency_target=1.0, window=10)
+    assert (c.concurrency, c.delay) == (1, 0.25)
+
+    for _ in range(30):
+        c.record(0.5)
+    assert c.concurrency == 4
+    assert c.delay == 0.0
+
+    # a window with 20% errors halves concurrency and backs off the delay
+    for i in range(10):
+        c.record(0.5, ok=i % 5 != 0)
+    assert c.concurrency == 2
+    assert c.delay == 0.25
+    assert any("concurrency 4→2" in m for m in logs)
+
+    # slow but error-free holds steady until p90 passes 2x target
+    for _ in range(10):
+        c.record(1.5)
+    assert c.concurrency == 2
+    for _ in range(10):
+        c.record(3.0)
+    assert c.concurrency == 1
+
+
+def test_bursts_and_blocks_pause_immediately():
+    c, logs = _controller(max_concurrency=4, window=100)
+    c.concurrency = 4
+
+    for _ in range(3):
+        c.record(0.1, ok=False)
+    assert c.concurrency == 2
+    assert c.paused_until > time.monotonic()
+    assert "3 errors in a row" in logs[-1]
+
+    c.paused_until = 0
+    try:
+        with c.slot():
+            raise Blocked(429)
+    except Blocked:
+        pass
+    assert c.concurrency == 1
+    assert "blocked" in logs[-1]
+
+
+def test_timeouts_follow_latency():
+    c, _ = _controller(latency_target=2.0)
+    assert c.timeout("goto") == BASE_TIMEOUTS_MS["goto"]
+
+    for _ in range(10):
+        c.samples.append((8.0, True, False))
+    assert c.timeout("goto") == 2 * BASE_TIMEOUTS_MS["goto"]
+
+    c.samples.clear()
+    for _ in range(10):
+        c.samples.append((0.1, True, False))
+    assert c.timeout("chips") == BASE_TIMEOUTS_MS["chips"] // 2
+
+
+def test_slot_bounds_requests_in_flight():
+    c, _ = _controller(min_concurrency=2, max_concurrency=2, max_delay=0.0, window=1000)
+    peak = 0
+    lock = threading.Lock()
+
+    def request():
+        nonlocal peak
+        with c.slot():
+            with lock:
+                peak = max(peak, c.in_flight)
+            time.sleep(0.02)
+
+    threads = [threading.Thread(target=request) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert peak == 2
+    assert len(c.samples) == 8
@@ -0,0 +1,103 @@
+from urllib.parse import urlparse
+
+import pytest
+
+from src.scrapers import scrape_sku_state
+from src.scrapers.politeness import PolitenessController
+from src.scrapers.scrape_sku_state import _iter_prefetched
+
+
+class FakePage:
+    def __init__(self, name, events, statuses):
+        self.name = name
+        self.events = events
+        self.statuses = statuses
+        self.url = "about:blank"
+
+    def goto(self, url, **kwargs):
+        self.url = url
+
+    def evaluate(self, script, arg=None):
+        if "location.href" in script:
+            self.url = arg
+            self.events.append(("load", self.name, urlparse(arg).path))
+            return None
+        return self.statuses.get(urlparse(self.url).path, 200)
+
+    def wait_for_url(self, predicate, wait_until=None, timeout=None):
+        assert predicate(self.url)
+
+
+def _variants(n):
+    return [
+        ("men", f"{i:06d}", f"E{i:06d}-000", f"https://www.uniqlo.com/uk/en/products/E{i:06d}-000/00", f"Item {i}")
+        for i in range(1, n + 1)
+    ]
+
+
+@pytest.fixture
+def pages(monkeypatch):
+    events, statuses = [], {}
+
+    def fake_scrape(page, variant, observed_at, rows, log=print, timeout=None, loaded=False):
+        assert loaded and urlparse(page.url).path == urlparse(variant[3]).path
+        events.append(("read", page.name, variant[2]))
+        rows.append((observed_at, variant[2]))
+
+    monkeypatch.setattr(scrape_sku_state, "scrape_variant", fake_scrape)
+    return (FakePage("A", events, statuses), FakePage("B", events, statuses)), events, statuses
+
+
+def _controller(concurrency):
+    return PolitenessController(
+        min_concurrency=concurrency, max_concurrency=concurrency,
+        min_delay=0.0, max_delay=0.0, log=lambda m: None,
+    )
+
+
+def test_next_variant_loads_while_current_is_read(pages):
+    (a, b), events, _ = pages
+    controller = _controller(2)
+
+    rows = list(_iter_prefetched((a, b), _variants(3), "t0", lambda m: None, 3, controller))
+
+    assert [r[0][1] for r in rows] == ["E000001-000", "E000002-000", "E000003-000"]
+    assert events == [
+        ("load", "A", "/uk/en/products/E000001-000/00"),
+        ("load", "B", "/uk/en/products/E000002-000/00"),
+        ("read", "A", "E000001-000"),
+        ("load", "A", "/uk/en/products/E000003-000/00"),
+        ("read", "B", "E000002-000"),
+        ("read", "A", "E000003-000"),
+    ]
+    assert controller.in_flight == 0
+
+
+def test_without_a_free_slot_pages_load_one_at_a_time(pages):
+    (a, b), events, _ = pages
+
+    list(_iter_prefetched((a, b), _variants(2), "t0", lambda m: None, 2, _controller(1)))
+
+    assert [e[:2] for e in events] == [("load", "A"), ("read", "A"), ("load", "A"), ("read", "A")]
+
+
+def test_blocked_prefetch_and_early_close_release_slots(pages):
+    (a, b), events, statuses = pages
+    statuses["/uk/en/products/E000002-000/00"] = 429
+    controller = _controller(2)
+    logs = []
+
+    rows = list(_iter_prefetched((a, b), _variants(2), "t0", logs.append, 2, controller))
+
+    assert len(rows) == 1
+    assert ("read", "B", "E000002-000") not in events
+    assert any("HTTP 429" in m for m in logs)
+    assert controller.in_flight == 0
+    assert controller.paused_until > 0
+
+    controller = _controller(2)
+    it = _iter_prefetched((a, b), _variants(5), "t0", lambda m: None, 5, controller)
+    next(it)
+    assert controller.in_flight == 1    # variant 2 is loading ahead
+    it.close()
+    assert controller.in_flight == 0
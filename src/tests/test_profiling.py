@@ -0,0 +1,135 @@
+import json
+
+from src import metrics
+from src.scrapers import scrape_sku_state
+from src.scrapers.politeness import PolitenessController
+from src.scrapers.profiling import VariantProfiler, phase_breakdown
+from src.scrapers.scrape_sku_state import _run_variant
+
+
+class FakeTracing:
+    def __init__(self):
+        self.calls = []
+
+    def start(self, **kwargs):
+        self.calls.append(("start", kwargs))
+
+    def start_chunk(self, title=None):
+        self.calls.append(("start_chunk", title))
+
+    def stop_chunk(self, path=None):
+        self.calls.append(("stop_chunk", path))
+        if path:
+            open(path, "wb").close()
+
+
+class FakeContext:
+    def __init__(self):
+        self.tracing = FakeTracing()
+
+
+class FakePage:
+    def __init__(self):
+        self.context = FakeContext()
+
+
+VARIANT = ("men", "400001", "E400001-000", "https://x/E400001-000", "Item")
+
+
+def test_capture_totals_this_threads_observations():
+    m = metrics.Metrics()
+    m.observe("phase_seconds", 1.0, phase="goto")
+    with m.capture() as outer:
+        m.observe("phase_seconds", 2.0, phase="goto")
+        with m.capture() as inner:
+            m.observe("phase_seconds", 3.0, phase="goto")
+    m.observe("phase_seconds", 4.0, phase="goto")
+
+    key = ("phase_seconds", (("phase", "goto"),))
+    assert inner == {key: 3.0}
+    assert outer == {key: 5.0}
+    assert phase_breakdown(outer, 6.0) == {"goto": 5.0, "unaccounted": 1.0}
+
+
+def _scrape(monkeypatch, profiler, chip_wait):
+    def fake_scrape(page, variant, observed_at, rows, log=print, timeout=None, loaded=False):
+        metrics.observe("phase_seconds", 0.5, phase="goto")
+        metrics.observe("phase_seconds", chip_wait, phase="chip_wait")
+        rows.append((observed_at, variant[2]))
+
+    monkeypatch.setattr(scrape_sku_state, "scrape_variant", fake_scrape)
+    controller = PolitenessController(min_delay=0.0, max_delay=0.0, log=lambda m: None)
+    page = FakePage()
+    profiler.attach(page.context)
+    rows = _run_variant(page, VARIANT, "t0", controller.slot(), lambda m: None, controller.timeout,
+                        profiler=profiler)
+    return page.context.tracing.calls, rows
+
+
+def test_slow_variant_trace_is_saved_with_its_slowest_phase(tmp_path, monkeypatch):
+    logs = []
+    profiler = VariantProfiler(tmp_path, slow_sec=1e-9, sample_rate=0, log=logs.append)
+
+    calls, rows = _scrape(monkeypatch, profiler, chip_wait=25.0)
+
+    assert rows == [("t0", "E400001-000")]
+    [(_, path)] = [c for c in calls if c[0] == "stop_chunk"]
+    assert calls[0] == ("start", {"screenshots": False, "snapshots": False, "sources": False})
+    assert calls[1] == ("start_chunk", "E400001-000")
+    assert path.startswith(str(tmp_path / "E400001-000-slow-"))
+
+    [entry] = [json.loads(line) for line in (tmp_path / "summary.jsonl").read_text().splitlines()]
+    assert entry["slowest_phase"] == "chip_wait"
+    assert entry["trace"] == path
+    assert any("[PROFILE] E400001-000" in m and "chip_wait 25.0s" in m for m in logs)
+
+
+def test_fast_unsampled_variant_trace_is_dropped(tmp_path, monkeypatch):
+    profiler = VariantProfiler(tmp_path, slow_sec=60, sample_rate=0, log=lambda m: None)
+
+    calls, _ = _scrape(monkeypatch, profiler, chip_wait=0.1)
+
+    assert ("stop_chunk", None) in calls
+    assert not (tmp_path / "summary.jsonl").exists()
+
+
+class FakeBrowserContext(FakeContext):
+    def __init__(self):
+        super().__init__()
+        self.pages = []
+
+    def new_page(self):
+        page = FakePage()
+        page.context = self
+        page.goto = lambda url, **kwargs: None
+        self.pages.append(page)
+        return page
+
+    def close(self):
+        pass
+
+
+class FakeSession:
+    def __init__(self):
+        self.context = FakeBrowserContext()
+
+    def new_context(self):
+        return self.context
+
+
+def test_tracing_turns_prefetch_off(monkeypatch):
+    monkeypatch.setattr(scrape_sku_state, "scrape_variant",
+                        lambda page, variant, observed_at, rows, *a, **kw: rows.append(variant[2]))
+    session, logs = FakeSession(), []
+    profiler = VariantProfiler(slow_sec=60, sample_rate=0, log=logs.append)
+
+    rows = list(scrape_sku_state.iter_sku_rows(
+        [VARIANT], "t0", logs.append, session=session, prefetch=True, profiler=profiler,
+        controller=PolitenessController(min_delay=0.0, max_delay=0.0, log=lambda m: None),
+    ))
+
+    assert rows == [["E400001-000"]]
+    assert len(session.context.pages) == 1
+    calls = session.context.tracing.calls
+    assert [c for c, _ in calls] == ["start", "start_chunk", "stop_chunk"]
+    assert any("no prefetch" in m for m in logs)
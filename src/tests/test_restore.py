@@ -0,0 +1,88 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from db.schema import init_db
+from src.notifiers.cooldown import filter_cooled_down, record_notifications
+from src.notifiers.messages import Message
+from src.notifiers.outbox import claim, enqueue, idempotency_key
+from src.notifiers.rules import USER_NOTIFICATION_RULES
+from src.notifiers.subscriptions import add_rule, add_user, load_index
+from src.restore import restore
+
+RECENT = ("chat", "RARE_DEEP_DISCOUNT", "/uk/en/products/E1-000/00", "09", "003")
+STALE = ("chat", "RARE_DEEP_DISCOUNT", "/uk/en/products/E2-000/00", "09", "003")
+
+
+def _quiet(m):
+    pass
+
+
+def _msg(text):
+    return idempotency_key("telegram", "chat", [(text,)]), "telegram", "chat", Message(None, text, {})
+
+
+@pytest.fixture
+def previous(tmp_path):
+    """Yesterday's published snapshot."""
+    path = tmp_path / "previous.sqlite"
+    conn = sqlite3.connect(path)
+    init_db(conn)
+    now = datetime.utcnow()
+    record_notifications(conn, [RECENT], notified_at=(now - timedelta(hours=3)).isoformat())
+    record_notifications(conn, [STALE], notified_at=(now - timedelta(days=30)).isoformat())
+
+    # left undelivered when the merge job ended: due, sent, held for a digest
+    enqueue(conn, [_msg("pending"), _msg("sent")])
+    enqueue(conn, [_msg("held")], not_before=now + timedelta(hours=8), held_groups=[["g"]])
+    conn.execute("UPDATE uniqlo_outbox SET status = 'sent' WHERE text = 'sent'")
+
+    # added with the subscriptions CLI, not in rules.py
+    add_user(conn, "cli_user", [("webhook", "http://127.0.0.1:9/hook")], cooldown_hours=72)
+    add_rule(conn, "cli_user", "RARE_DEEP_DISCOUNT", "men", sizes=["M"])
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_cooldowns_hold_across_runs(tmp_path, previous):
+    conn = sqlite3.connect(tmp_path / "uniqlo.sqlite")
+
+    counts = restore(conn, previous, log=_quiet)
+
+    assert counts["notifications"] == 1
+    assert filter_cooled_down(conn, [RECENT + (24,), STALE + (24,)]) == {STALE}
+
+    # the next run's restore is a no-op for what is already there
+    assert restore(conn, previous, log=_quiet)["notifications"] == 0
+
+
+def test_undelivered_messages_survive_the_restore(tmp_path, previous):
+    conn = sqlite3.connect(tmp_path / "uniqlo.sqlite")
+
+    assert restore(conn, previous, log=_quiet)["outbox"] == 2
+    assert [r[3] for r in claim(conn)] == ["pending"]
+    held = conn.execute("SELECT text, status, held_groups FROM uniqlo_outbox WHERE text = 'held'").fetchone()
+    assert held == ("held", "pending", '[["g"]]')
+
+    assert restore(conn, previous, log=_quiet)["outbox"] == 0
+
+
+def test_subscriptions_come_from_the_snapshot(tmp_path, previous):
+    conn = sqlite3.connect(tmp_path / "uniqlo.sqlite")
+    restore(conn, previous, log=_quiet)
+
+    index = load_index(conn)
+    assert set(index.channels) == {"cli_user"}
+    assert index.match("RARE_DEEP_DISCOUNT", "men", "M", "BLACK") == {"cli_user"}
+    assert index.longest_cooldown_hours() == 72
+
+
+def test_rules_py_seeds_a_first_run(tmp_path):
+    empty = tmp_path / "empty.sqlite"
+    sqlite3.connect(empty).close()
+    conn = sqlite3.connect(tmp_path / "uniqlo.sqlite")
+
+    assert restore(conn, empty, log=_quiet) == {"users": 0, "runs": 0, "notifications": 0, "outbox": 0}
+    assert set(load_index(conn).channels) == set(USER_NOTIFICATION_RULES)
@@ -0,0 +1,75 @@
+import json
+import sqlite3
+
+from src.metrics import Metrics
+from src.runs import check, import_runs, load_runs, record_run, regressions, run_row
+
+
+def _summary(variant_seconds, failed=0):
+    m = Metrics()
+    for s in variant_seconds:
+        m.observe("variant_seconds", s, status="ok")
+        m.incr("variants_total", status="ok")
+    m.incr("variants_total", failed, status="failed")
+    m.incr("sku_rows_total", 10 * len(variant_seconds))
+    m.incr("events_total", 3)
+    m.incr("messages_total", 2, channel="telegram", status="sent")
+    m.incr("messages_total", channel="email", status="failed")
+    m.observe("stage_seconds", 60.0, stage="scrape")
+    return m.summary()
+
+
+def _row(run_id, day, variant_seconds, failed=0, minutes=10):
+    return run_row(
+        run_id, "all", f"2026-01-{day:02d}T21:00:00", f"2026-01-{day:02d}T21:{minutes:02d}:00",
+        "ok", summary=_summary(variant_seconds, failed),
+    )
+
+
+def test_run_row_counts_and_rates():
+    row = _row("r1", 1, [2.0, 4.0, 6.0], failed=1)
+
+    assert (row["variants_attempted"], row["variants_ok"], row["variants_failed"]) == (4, 3, 1)
+    assert (row["rows_written"], row["events_emitted"]) == (30, 3)
+    assert (row["messages_sent"], row["messages_failed"]) == (2, 1)
+    assert row["wall_seconds"] == 600
+    assert json.loads(row["stage_seconds"]) == {"scrape": 60.0}
+    assert row["seconds_per_variant"] == 4.0
+    assert row["variant_p95_seconds"] == 6.0
+    assert row["variants_per_minute"] == 0.3
+    assert row["failure_rate"] == 0.25
+    assert row["peak_memory_mb"] > 0
+
+
+def test_regression_against_median_baseline():
+    previous = [_row(f"r{d}", d, [4.0] * 20) for d in range(1, 6)]
+    assert regressions(_row("same", 6, [4.2] * 20), previous) == []
+
+    slow = regressions(_row("slow", 6, [9.0] * 20, minutes=25), previous)
+    assert {m for m, _, _ in slow} == {"seconds_per_variant", "variant_p95_seconds", "variants_per_minute", "wall_seconds"}
+
+    # a failure rate going from 0 to 20% is flagged; noise around 0 is not
+    assert [m for m, _, _ in regressions(_row("flaky", 6, [4.0] * 16, failed=4), previous)] == ["failure_rate"]
+    assert regressions(_row("one", 6, [4.0] * 99, failed=1), previous) == []
+
+
+def test_ledger_check_and_import(tmp_path):
+    shard_db = tmp_path / "shard-0.sqlite"
+    shard = sqlite3.connect(shard_db)
+    record_run(shard, dict(_row("shard", 9, [4.0]), stage="sku", shard="0/1"))
+    shard.close()
+
+    conn = sqlite3.connect(":memory:")
+    for d in range(1, 5):
+        record_run(conn, _row(f"r{d}", d, [4.0] * 20))
+    record_run(conn, _row("r5", 5, [12.0] * 20, minutes=40))
+
+    assert import_runs(conn, shard_db) == 1
+    assert import_runs(conn, shard_db) == 0
+    assert [r["run_id"] for r in load_runs(conn, limit=2)] == ["shard", "r5"]
+
+    logs = []
+    found = check(conn, log=logs.append)
+    assert {(stage, metric) for stage, metric, _, _ in found} >= {("all", "seconds_per_variant")}
+    assert all(stage == "all" for stage, *_ in found)
+    assert any("[RUNS][REGRESSION] all r5: seconds_per_variant 12.00 vs median 4.00" in m for m in logs)
@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+
+from src.scrapers.scheduler import VariantScheduler
+
+NOW = datetime(2026, 1, 10, 12, 0)
+
+RULES = [
+    ("a", "men", {"sizes": ["M"], "max_price": None, "min_discount": None, "product_ids": None}),
+    ("b", "men", {"sizes": None, "max_price": 15, "min_discount": None, "product_ids": None}),
+]
+
+
+def _variant(i, catalog="men", price=9.9, discount=70.0):
+    v = f"E{i:06d}-000"
+    return (catalog, v[1:7], v, f"https://x/{v}", f"P{i}", price, discount)
+
+
+def _history(last_seen, runs=2, price_changes=0, availability_changes=0, sizes=("M",)):
+    return (last_seen.isoformat(), runs, price_changes, availability_changes, set(sizes))
+
+
+def test_wanted_deals_rank_first():
+    scheduler = VariantScheduler(RULES, now=NOW)
+    wanted = _variant(1)
+    unwanted_catalog = _variant(2, catalog="women")
+    too_expensive = _variant(3, price=35.0, discount=70.0)
+    shallow = _variant(4, price=9.9, discount=10.0)
+
+    ranked = [v for _, v in scheduler.rank([shallow, unwanted_catalog, too_expensive, wanted])]
+
+    assert ranked[0] == wanted
+    assert ranked[-1] == unwanted_catalog
+    assert scheduler.demand("men", "000003", 35.0, 70.0, {"M"}) == 0.5
+    assert scheduler.demand("men", "000003", 35.0, 70.0, {"XL"}) == 0.0
+
+
+def test_stale_and_volatile_variants_are_revisited_first():
+    fresh, stale, volatile = _variant(1), _variant(2), _variant(3)
+    history = {
+        fresh[2]: _history(NOW - timedelta(hours=1)),
+        stale[2]: _history(NOW - timedelta(days=5)),
+        volatile[2]: _history(NOW - timedelta(hours=1), runs=4, price_changes=2, availability_changes=2),
+    }
+    scheduler = VariantScheduler(RULES, history, now=NOW)
+
+    ranked = [v for _, v in scheduler.rank([fresh, stale, volatile])]
+    assert ranked[-1] == fresh
+    assert set(ranked[:2]) == {stale, volatile}
+
+
+def test_budget_keeps_the_head_and_samples_the_tail():
+    variants = [_variant(i, price=5 + i % 50, discount=40 + i % 50) for i in range(200)]
+    scheduler = VariantScheduler(RULES, now=NOW, seed=1)
+    ranked = [v for _, v in scheduler.rank(variants)]
+
+    plan = scheduler.plan(variants, budget=50, tail_share=0.2)
+
+    assert len(plan) == len(set(plan)) == 50
+    assert plan[:40] == ranked[:40]
+    assert set(plan[40:]) <= set(ranked[40:])
+    assert plan == VariantScheduler(RULES, now=NOW, seed=1).plan(variants, budget=50, tail_share=0.2)
+    assert scheduler.plan(variants) == ranked
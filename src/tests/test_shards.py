@@ -0,0 +1,202 @@
+import argparse
+import sqlite3
+
+import pytest
+
+from db.schema import init_db, init_shard
+from src import metrics, orchestrator
+from src.scrapers import scrape_sku_state
+from src.scrapers.scrape_sku_state import INSERT_SKU_STATE_SQL, load_variants
+from src.scrapers.shards import (
+    MergeError,
+    copy_catalog,
+    finish_shard,
+    merge_shards,
+    parse_shard,
+    shard_of,
+    start_shard,
+)
+
+VARIANTS = [f"E{i:06d}-000" for i in range(40)]
+
+
+def _quiet(m):
+    pass
+
+
+@pytest.fixture
+def catalog_db(tmp_path):
+    path = tmp_path / "uniqlo.sqlite"
+    conn = sqlite3.connect(path)
+    init_db(conn)
+    conn.executemany(
+        """
+        INSERT INTO uniqlo_sale_variants
+        (scrape_id, scraped_at, catalog, product_id, variant_id, variant_url, name)
+        VALUES ('s', 't', ?, ?, ?, ?, ?)
+        """,
+        [(catalog, v[1:7], v, f"https://x/{v}", f"P {v}")
+         for v in VARIANTS for catalog in ("men", "women")],
+    )
+    conn.commit()
+    conn.close()
+    return path
+
+
+def _scrape_shard(tmp_path, catalog_db, shard, finish=True, extra_rows=(), scraped=None, partial=False):
+    path = tmp_path / f"shard-{shard[0]}.sqlite"
+    conn = sqlite3.connect(path)
+    init_db(conn)
+    init_shard(conn)
+    copy_catalog(conn, catalog_db)
+
+    variants = load_variants(conn, shard=shard)
+    start_shard(conn, shard, variants)
+    rows = [
+        (f"2026-01-01T00:00:0{shard[0]}", catalog, product_id, variant_id, name, f"/p/{variant_id}",
+         "09", "BLACK", "003", "M", 9.9, 29.9, 66.9, 1)
+        for catalog, product_id, variant_id, _url, name in variants[:scraped]
+    ]
+    conn.executemany(INSERT_SKU_STATE_SQL, rows + list(extra_rows))
+    conn.commit()
+    if finish:
+        finish_shard(conn, partial=partial)
+    conn.close()
+    return path
+
+
+def test_shard_spec_and_partition():
+    assert parse_shard("2/8") == (2, 8)
+    for bad in ("8/8", "-1/2", "1", "a/b"):
+        with pytest.raises(ValueError):
+            parse_shard(bad)
+
+    # stable and covering: every variant lands on exactly one of N shards
+    assert [shard_of(v, 4) for v in VARIANTS] == [shard_of(v, 4) for v in VARIANTS]
+    assert {shard_of(v, 4) for v in VARIANTS} == {0, 1, 2, 3}
+
+
+def test_merge_is_complete_and_order_independent(tmp_path, catalog_db):
+    paths = [_scrape_shard(tmp_path, catalog_db, (i, 3)) for i in range(3)]
+
+    conn = sqlite3.connect(catalog_db)
+    rows = merge_shards(conn, list(reversed(paths)), log=_quiet)
+
+    assert len(rows) == 2 * len(VARIANTS)
+    assert [r[0] for r in rows] == sorted(r[0] for r in rows)
+    assert conn.execute("SELECT COUNT(*) FROM uniqlo_sku_state").fetchone()[0] == len(rows)
+
+    with pytest.raises(MergeError, match="already merged"):
+        merge_shards(conn, paths, log=_quiet)
+
+
+def test_merge_rejects_missing_and_duplicate(tmp_path, catalog_db):
+    conn = sqlite3.connect(catalog_db)
+
+    paths = [_scrape_shard(tmp_path, catalog_db, (i, 3)) for i in range(2)]
+    with pytest.raises(MergeError, match=r"missing shards: \[2\]"):
+        merge_shards(conn, paths, log=_quiet)
+
+    # a partial run can still be merged on purpose
+    assert merge_shards(conn, paths, log=_quiet, allow_missing=True)
+
+    conn = sqlite3.connect(tmp_path / "empty.sqlite")
+    init_db(conn)
+    copy_catalog(conn, catalog_db)
+    stray = next(v for v in VARIANTS if shard_of(v, 2) == 0)
+    paths = [
+        _scrape_shard(tmp_path, catalog_db, (0, 2)),
+        _scrape_shard(tmp_path, catalog_db, (1, 2), extra_rows=[
+            ("2026-01-01T00:00:01", "men", stray[1:7], stray, "P", f"/p/{stray}",
+             "09", "BLACK", "003", "M", 9.9, 29.9, 66.9, 1),
+        ]),
+    ]
+    with pytest.raises(MergeError, match="more than one shard"):
+        merge_shards(conn, paths, log=_quiet)
+
+    paths[1] = _scrape_shard(tmp_path, catalog_db, (1, 2), finish=False)
+    with pytest.raises(MergeError, match="did not finish"):
+        merge_shards(conn, paths, log=_quiet)
+
+
+def test_shard_stopped_at_its_time_budget_is_merged_as_partial(tmp_path, catalog_db):
+    paths = [
+        _scrape_shard(tmp_path, catalog_db, (0, 2)),
+        _scrape_shard(tmp_path, catalog_db, (1, 2), scraped=3, partial=True),
+    ]
+    logs = []
+
+    conn = sqlite3.connect(catalog_db)
+    rows = merge_shards(conn, paths, log=logs.append)
+
+    assert len({(r[1], r[3]) for r in rows if shard_of(r[3], 2) == 1}) == 3
+    assert any("shard 1/2" in m and "partial" in m for m in logs)
+    assert not any("shard 0/2" in m and "partial" in m for m in logs)
+
+
+class _Worker:
+    """Stands in for the notifier / outbox threads: nothing is sent."""
+
+    def __init__(self, db_path, log=print):
+        self.events = []
+
+    def start(self):
+        pass
+
+    def submit(self, events):
+        self.events.extend(events)
+
+    def close(self):
+        pass
+
+    def stop(self):
+        pass
+
+
+def test_merge_stage_with_a_missing_shard_still_detects(tmp_path, catalog_db, monkeypatch):
+    monkeypatch.setattr(orchestrator, "NotifierWorker", _Worker)
+    monkeypatch.setattr(orchestrator, "OutboxWorker", _Worker)
+    paths = [_scrape_shard(tmp_path, catalog_db, (i, 3)) for i in range(2)]    # shard 2 crashed
+    args = argparse.Namespace(stage="merge", shards=paths, db=catalog_db, allow_missing=False)
+
+    with pytest.raises(MergeError, match=r"missing shards: \[2\]"):
+        orchestrator.run(args)
+
+    args.allow_missing = True
+    orchestrator.run(args)
+
+    conn = sqlite3.connect(catalog_db)
+    merged = conn.execute("SELECT COUNT(*) FROM uniqlo_sku_state").fetchone()[0]
+    events = conn.execute("SELECT COUNT(*) FROM uniqlo_events").fetchone()[0]
+    assert 0 < merged < 2 * len(VARIANTS)
+    assert events > 0
+
+
+def test_shard_scrapes_the_variants_it_recorded(tmp_path, catalog_db, monkeypatch):
+    loads = []
+
+    def load_reordered(conn, max_variants=None, shard=None, log=print):
+        # a second load may order (and so budget) near-tied variants differently
+        loads.append(shard)
+        return load_variants(conn, max_variants, shard, log)[::(-1) ** len(loads)]
+
+    def fake_rows(variants, observed_at, log, **kwargs):
+        for catalog, product_id, variant_id, _url, name in variants:
+            yield [(observed_at, catalog, product_id, variant_id, name, f"/p/{variant_id}",
+                    "09", "BLACK", "003", "M", 9.9, 29.9, 66.9, 1)]
+
+    monkeypatch.setattr(scrape_sku_state, "load_variants", load_reordered)
+    monkeypatch.setattr(scrape_sku_state, "iter_sku_rows", fake_rows)
+    monkeypatch.setattr(metrics, "METRICS_DIR", tmp_path)
+    path = tmp_path / "shard-1.sqlite"
+    monkeypatch.setattr("sys.argv", ["scrape_sku_state", "--db", str(path), "--catalog-db", str(catalog_db),
+                                     "--shard", "1/3", "--max-variants", "5"])
+
+    scrape_sku_state.main()
+
+    assert loads == [(1, 3)]
+    conn = sqlite3.connect(path)
+    assigned = conn.execute("SELECT catalog, variant_id FROM uniqlo_shard_variants ORDER BY 1, 2").fetchall()
+    scraped = conn.execute("SELECT catalog, source_variant_id FROM uniqlo_sku_state ORDER BY 1, 2").fetchall()
+    assert len(assigned) == 5
+    assert scraped == assigned
@@ -0,0 +1,41 @@
+from src.notifiers.subscriptions import SubscriptionStore, add_rule, add_user, seed_from_rules
+
+RULES = {
+    "a": {
+        "chat_id": "1",
+        "digest": True,
+        "events": {"RARE_DEEP_DISCOUNT": {"men": {"sizes": ["M"], "colors": None}}},
+    },
+    "no_chat": {
+        "chat_id": None,
+        "events": {"RARE_DEEP_DISCOUNT": {"men": {"sizes": None, "colors": None}}},
+    },
+}
+
+
+def test_seed_is_one_time_and_compiles(conn):
+
+    assert seed_from_rules(conn, RULES, log=lambda m: None) == 2
+    assert seed_from_rules(conn, RULES, log=lambda m: None) == 0
+
+    index = SubscriptionStore(log=lambda m: None).get(conn)
+    assert index.channels == {"a": [("telegram", "1")]}
+    assert "a" in index.digests
+    assert index.match("RARE_DEEP_DISCOUNT", "men", "M", "BLACK") == {"a"}
+
+
+def test_store_reloads_when_rules_change(conn):
+    store = SubscriptionStore(log=lambda m: None)
+    seed_from_rules(conn, RULES, log=lambda m: None)
+
+    first = store.get(conn)
+    assert store.get(conn) is first
+
+    add_user(conn, "b", [("telegram", "2")])
+    add_rule(conn, "b", "RARE_DEEP_DISCOUNT", "men", sizes=["M"], max_price=10)
+    conn.commit()
+
+    second = store.get(conn)
+    assert second is not first
+    assert second.match("RARE_DEEP_DISCOUNT", "men", "M", "BLACK", "1", 9.9, 60) == {"a", "b"}
+    assert second.match("RARE_DEEP_DISCOUNT", "men", "M", "BLACK", "1", 12.9, 60) == {"a"}
@@ -0,0 +1,74 @@
+import time
+
+from src.notifiers.channels import TelegramChannel
+from src.notifiers.messages import Message
+from src.notifiers.telegram import TelegramSender
+from src.tests.fakes import FakeTelegramServer
+
+
+def _sender(server, **kwargs):
+    return TelegramSender("TEST", api_base=server.api_base, log=lambda m: None, **kwargs)
+
+
+def test_fan_out_is_concurrent():
+    messages = [(str(i), f"deal {i}") for i in range(60)]
+
+    with FakeTelegramServer(latency=0.05) as server, _sender(server, rate=1000) as sender:
+        start = time.monotonic()
+        results = sender.send_all(messages)
+        elapsed = time.monotonic() - start
+
+    assert all(results)
+    assert len(server.messages) == 60
+    # sequential would be 60 * 50ms = 3s
+    assert elapsed < 1.5
+
+
+def test_429_honours_retry_after():
+    with FakeTelegramServer(rate_limit_every=2, retry_after=0.2) as server, _sender(server) as sender:
+        results = sender.send_all([("1", "a"), ("2", "b"), ("3", "c")])
+
+    assert results == [True, True, True]
+    assert sorted(m["chat_id"] for m in server.messages) == ["1", "2", "3"]
+
+
+def test_failed_chat_does_not_abort_others():
+    with FakeTelegramServer(fail_chats=["bad"]) as server, _sender(server) as sender:
+        results = sender.send_all([("bad", "x"), ("ok", "y")])
+
+    assert [bool(r) for r in results] == [False, True]
+    assert "HTTP 400" in results[0].error
+    assert [m["chat_id"] for m in server.messages] == ["ok"]
+
+
+def test_per_chat_spacing():
+    with FakeTelegramServer() as server, _sender(server, per_chat_interval=0.2) as sender:
+        start = time.monotonic()
+        sender.send_all([("1", "a"), ("1", "b"), ("1", "c")])
+        elapsed = time.monotonic() - start
+
+    assert elapsed >= 0.4
+
+
+def test_per_chat_spacing_holds_across_batches():
+    with FakeTelegramServer() as server, _sender(server, per_chat_interval=0.2) as sender:
+        start = time.monotonic()
+        for text in "abc":
+            sender.send_all([("1", text)])
+        elapsed = time.monotonic() - start
+
+    assert elapsed >= 0.4
+
+
+def test_channel_keeps_one_sender():
+    with FakeTelegramServer() as server:
+        channel = TelegramChannel("TEST", api_base=server.api_base, log=lambda m: None)
+        sender = channel.sender
+        try:
+            for text in "ab":
+                assert channel.send_all([("1", Message(None, text, {}))]) == [True]
+        finally:
+            channel.close()
+
+    assert channel.sender is sender
+    assert [m["text"] for m in server.messages] == ["a", "b"]